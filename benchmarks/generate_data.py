@@ -0,0 +1,357 @@
+import argparse
+import json
+import os
+from numpy import add, subtract, arange, argsort, asarray, repeat, \
+    cumsum, float64, minimum, searchsorted, nan
+from numpy.random import default_rng
+from pandas import DataFrame
+from FeedRecommender.common.config import SYNTHETIC_POSTS_PER_INTERACTION, \
+    SYNTHETIC_INTERACTIONS_PER_USER, SYNTHETIC_POPULARITY_SKEW, \
+    SYNTHETIC_MISSING_LANGUAGE_RATE, SYNTHETIC_BATCH_SIZE
+from FeedRecommender.common.constants import POST_ID, CONTENT, \
+    DESCRIPTION, CAPTION, TITLE, ML_LANGUAGE, ML_INTERESTS, \
+    USER_ID, REACTIONS, LANGUAGE
+
+# Words of the languages the generated texts are written in
+WORDS = {
+    "en": "the a of and to in is you that it for on with this funny "
+          "video watch new best today love life people world time "
+          "game music movie news happy friends family dance song "
+          "amazing cute dog cat food beautiful girl boy day night "
+          "story real never always what when".split(),
+    "hi": "और का की के है में यह से को पर भी नहीं एक हम आप "
+          "वीडियो मजेदार गाना प्यार दोस्त जिंदगी खबर आज नया देखो "
+          "सबसे अच्छा दिन रात लड़की लड़का परिवार खाना".split(),
+    "fr": "le la les de des et est un une pour pas que qui dans "
+          "avec sur vidéo drôle nouveau amour vie monde jour nuit "
+          "chanson musique film meilleur aujourd'hui regarde".split(),
+    "es": "el la los las de que y en un una por con para es no "
+          "video gracioso nuevo amor vida mundo día noche canción "
+          "música película mejor hoy mira familia amigos".split(),
+    "de": "der die das und ist nicht ein eine zu mit auf für von "
+          "lustig neues liebe leben welt tag nacht lied musik "
+          "film beste heute schau familie freunde".split(),
+    "pt": "o a os as de que e em um uma para com não é vídeo "
+          "engraçado novo amor vida mundo dia noite música filme "
+          "melhor hoje olha família amigos".split(),
+}
+
+# Share of the contents written in each language
+TEXT_LANGUAGES = {"en": 0.45, "hi": 0.25, "es": 0.1,
+                  "pt": 0.08, "fr": 0.06, "de": 0.06}
+
+# Languages the contents and users are tagged with
+ML_LANGUAGES = ["en", "hi", "bn", "ta", "te", "mr", "kn", "ml", "gu",
+                "pa", "fr", "pl", "nb", "pt", "de", "sq", "ro", "es"]
+
+INTERESTS = ["comedy", "news", "sports", "music", "food", "movies",
+             "dance", "devotional", "fashion", "travel", "gaming",
+             "education", "pets", "romance", "motivation"]
+
+SOURCES = {"9gag": 0.35, "yt": 0.3, "ig": 0.2, "sc": 0.1, "tw": 0.05}
+
+APPS = ["1035438645", "199639326", "864995365", "1186255453",
+        "174517858", "2401714926"]
+
+
+class SyntheticDataGenerator:
+    """
+    Generate the raw input files of the pipelines at a given
+    scale, with a realistic shape: post popularity follows a
+    power law, and the number of reactions per user, of
+    languages and interests per content and of words per text
+    are heavily skewed towards small values. The files are
+    laid out like the data directory of the project, i.e.
+    raw/reacted_posts.json, raw/user_post_interaction.json and
+    complete_user_info.pkl, and are written in batches so that
+    large scales never have to be held in memory at once.
+    """
+
+    def __init__(
+            self,
+            interactions: int,
+            seed: int = 0,
+            posts_per_interaction: float = SYNTHETIC_POSTS_PER_INTERACTION,
+            interactions_per_user: float = SYNTHETIC_INTERACTIONS_PER_USER,
+            popularity_skew: float = SYNTHETIC_POPULARITY_SKEW,
+            missing_language_rate: float = SYNTHETIC_MISSING_LANGUAGE_RATE,
+            batch_size: int = SYNTHETIC_BATCH_SIZE
+    ):
+        """
+        Initialize data members of the class
+        :param interactions: number of user-content interactions
+        :param seed: seed of the random generator
+        :param posts_per_interaction: number of contents
+        generated per interaction
+        :param interactions_per_user: average number of
+        interactions per user
+        :param popularity_skew: exponent of the power law
+        of content popularity
+        :param missing_language_rate: share of the users
+        without language information
+        :param batch_size: number of records generated at once
+        """
+        self.interactions = interactions
+        self.posts = max(1, int(interactions * posts_per_interaction))
+        self.users = max(1, int(interactions / interactions_per_user))
+        self.popularity_skew = popularity_skew
+        self.missing_language_rate = missing_language_rate
+        self.batch_size = batch_size
+        self.rng = default_rng(seed)
+        self.post_ids = None
+
+    def get_list_lengths(
+            self,
+            mean: float,
+            size: int,
+            minimum_length: int = 0,
+            maximum_length: int = None
+    ):
+        """
+        Draw heavily skewed list lengths
+        :param mean: average list length
+        :param size: number of lengths to draw
+        :param minimum_length: smallest list length
+        :param maximum_length: optional largest list length
+        :return: array of list lengths
+        """
+        lengths = minimum_length + self.rng.geometric(
+            p=1 / (1 + mean - minimum_length), size=size) - 1
+        return lengths if maximum_length is None \
+            else minimum(lengths, maximum_length)
+
+    def sample_lists(
+            self,
+            values: list,
+            counts,
+            weights=None
+    ) -> list:
+        """
+        Draw lists of distinct values, optionally weighted
+        :param values: list of values to draw from
+        :param counts: array of the number of values of every list
+        :param weights: optional array of the weight of every value
+        :return: list of lists of values
+        """
+        keys = self.rng.random((len(counts), len(values)))
+        if weights is not None:
+            # Weighted sampling without replacement, by
+            # keeping the largest keys u ** (1 / weight)
+            keys = -keys ** (1 / asarray(weights, dtype=float64))
+        order = argsort(keys, axis=1)
+        return [[values[index] for index in row[:count]]
+                for row, count in zip(order, counts)]
+
+    def get_texts(
+            self,
+            languages,
+            share: float,
+            mean: float
+    ) -> list:
+        """
+        Generate texts drawing words with a Zipf distribution.
+        A share of the texts hold a link or an HTML entity
+        :param languages: array of the language of every text
+        :param share: share of the contents holding a text
+        :param mean: average number of words per text
+        :return: list of texts, None for the contents without text
+        """
+        lengths = self.get_list_lengths(
+            mean=mean, size=len(languages), minimum_length=1)
+        lengths[self.rng.random(len(languages)) >= share] = 0
+        vocabulary_sizes = asarray([len(WORDS[language])
+                                    for language in languages])
+        ranks = minimum(self.rng.zipf(a=1.5, size=int(lengths.sum())),
+                        repeat(vocabulary_sizes, lengths)) - 1
+        offsets = cumsum(lengths) - lengths
+        noise = self.rng.random(len(languages))
+        links = self.rng.integers(0, 2 ** 32, size=len(languages))
+
+        texts = []
+        for index, (language, offset, length) in enumerate(
+                zip(languages, offsets, lengths)):
+            if not length:
+                texts.append(None)
+                continue
+            words = WORDS[language]
+            text = " ".join(words[rank]
+                            for rank in ranks[offset:offset + length])
+            if noise[index] < 0.05:
+                text += " https://t.co/{:08x}".format(links[index])
+            elif noise[index] < 0.08:
+                text += " &amp; #" + words[0]
+            texts.append(text)
+        return texts
+
+    def generate_posts(self):
+        """
+        Generate the contents, each content holding a random
+        subset of the textual attributes
+        :return: generator of content records
+        """
+        for start in range(0, self.posts, self.batch_size):
+            size = min(self.batch_size, self.posts - start)
+            text_languages = self.rng.choice(
+                list(TEXT_LANGUAGES), size=size,
+                p=list(TEXT_LANGUAGES.values()))
+            texts = {feature: self.get_texts(
+                languages=text_languages, share=share, mean=mean)
+                for feature, share, mean in [(DESCRIPTION, 0.9, 12),
+                                             (CAPTION, 0.5, 6),
+                                             (TITLE, 0.6, 5)]}
+            ml_languages = self.sample_lists(
+                values=ML_LANGUAGES,
+                counts=self.get_list_lengths(
+                    mean=1.5, size=size, minimum_length=1,
+                    maximum_length=len(ML_LANGUAGES)))
+            interests = self.sample_lists(
+                values=INTERESTS,
+                counts=self.get_list_lengths(
+                    mean=1.2, size=size, maximum_length=len(INTERESTS)))
+
+            for index in range(size):
+                # The language of the texts is always tagged
+                language = text_languages[index]
+                ml_language = ml_languages[index]
+                if language not in ml_language:
+                    ml_language[-1] = language
+                yield {
+                    POST_ID: self.post_ids[start + index],
+                    CONTENT: {feature: values[index]
+                              for feature, values in texts.items()
+                              if values[index] is not None},
+                    ML_LANGUAGE: ml_language,
+                    ML_INTERESTS: interests[index]
+                }
+
+    def get_user_ids(self) -> list:
+        """
+        Generate the user ids, formatted as app and device ids
+        :return: list of user ids
+        """
+        apps = self.rng.choice(APPS, size=self.users)
+        return ["{}_{:016x}".format(app, device) for app, device in zip(
+            apps, self.rng.integers(0, 2 ** 63, size=self.users))]
+
+    def generate_interactions(self, user_ids: list):
+        """
+        Generate the reactions of every user. Users react to
+        contents drawn from a power law of popularity, so that a
+        few contents gather most of the reactions
+        :param user_ids: list of user ids
+        :return: generator of interaction records
+        """
+        popularity = 1 / arange(1, self.posts + 1,
+                                dtype=float64) ** self.popularity_skew
+        popularity = cumsum(popularity / popularity.sum())
+        ranking = self.rng.permutation(self.posts)
+
+        counts = self.get_list_lengths(
+            mean=self.interactions / self.users, size=self.users,
+            minimum_length=1)
+        # Matching the requested number of interactions
+        difference = self.interactions - int(counts.sum())
+        if difference > 0:
+            add.at(counts, self.rng.choice(
+                self.users, size=difference), 1)
+        elif difference < 0:
+            subtract.at(counts, self.rng.choice(
+                repeat(arange(self.users), counts),
+                size=-difference, replace=False), 1)
+
+        for start in range(0, self.users, self.batch_size):
+            batch = counts[start:start + self.batch_size]
+            posts = ranking[minimum(searchsorted(
+                popularity, self.rng.random(int(batch.sum()))),
+                self.posts - 1)]
+            offsets = cumsum(batch) - batch
+            for index, (offset, count) in enumerate(zip(offsets, batch)):
+                yield {
+                    USER_ID: user_ids[start + index],
+                    REACTIONS: [{POST_ID: self.post_ids[post]}
+                                for post in posts[offset:offset + count]]
+                }
+
+    def get_user_info(self, user_ids: list) -> DataFrame:
+        """
+        Generate the language preferences of the users, a share
+        of the users having no language information
+        :param user_ids: list of user ids
+        :return: dataframe object pandas
+        """
+        languages = []
+        for start in range(0, len(user_ids), self.batch_size):
+            size = min(self.batch_size, len(user_ids) - start)
+            missing = self.rng.random(size) < self.missing_language_rate
+            lists = self.sample_lists(
+                values=ML_LANGUAGES,
+                counts=self.get_list_lengths(
+                    mean=1.3, size=size, minimum_length=1,
+                    maximum_length=len(ML_LANGUAGES)),
+                weights=1 / arange(1, len(ML_LANGUAGES) + 1))
+            languages += [nan if is_missing else values
+                          for values, is_missing in zip(lists, missing)]
+        return DataFrame({USER_ID: user_ids, LANGUAGE: languages})
+
+    @staticmethod
+    def write_json_array(
+            records,
+            path: str
+    ) -> int:
+        """
+        Write records as a JSON array, one record at a time
+        :param records: iterable of JSON serializable records
+        :param path: string valued path to file
+        :return: number of written records
+        """
+        count = 0
+        with open(path + ".tmp", "w", encoding="utf-8") as json_file:
+            json_file.write("[")
+            for record in records:
+                json_file.write(",\n" if count else "\n")
+                json_file.write(json.dumps(record, ensure_ascii=False))
+                count += 1
+            json_file.write("\n]")
+        os.replace(path + ".tmp", path)
+        return count
+
+    def controller(self, data_dir: str) -> dict:
+        """
+        Driver function to generate all the raw input files
+        :param data_dir: string valued path to the data directory
+        :return: dictionary of the number of generated records
+        """
+        os.makedirs(os.path.join(data_dir, "raw"), exist_ok=True)
+        sources = self.rng.choice(list(SOURCES), size=self.posts,
+                                  p=list(SOURCES.values()))
+        self.post_ids = ["{}_{:08x}".format(source, index) for source, index
+                         in zip(sources, self.rng.permutation(self.posts))]
+
+        posts = self.write_json_array(
+            records=self.generate_posts(),
+            path=os.path.join(data_dir, "raw", "reacted_posts.json"))
+        user_ids = self.get_user_ids()
+        self.write_json_array(
+            records=self.generate_interactions(user_ids=user_ids),
+            path=os.path.join(data_dir, "raw",
+                              "user_post_interaction.json"))
+        self.get_user_info(user_ids=user_ids).to_pickle(
+            os.path.join(data_dir, "complete_user_info.pkl"))
+        return {"posts": posts, "users": self.users,
+                "interactions": self.interactions}
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(
+        description="Generate synthetic raw input files")
+    parser.add_argument("--interactions", type=int, default=10000,
+                        help="number of user-content interactions")
+    parser.add_argument("--output", required=True,
+                        help="path to the data directory to write")
+    parser.add_argument("--seed", type=int, default=0,
+                        help="seed of the random generator")
+    arguments = parser.parse_args()
+
+    print(SyntheticDataGenerator(
+        interactions=arguments.interactions,
+        seed=arguments.seed).controller(data_dir=arguments.output))
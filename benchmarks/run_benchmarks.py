@@ -0,0 +1,367 @@
+import argparse
+import json
+import os
+import platform
+import shutil
+import subprocess
+import tempfile
+import time
+from datetime import datetime, timezone
+from statistics import median
+import numpy
+import pandas
+import sklearn
+from pandas import DataFrame
+from FeedRecommender.common.artifacts import Artifacts
+from FeedRecommender.common.config import BENCHMARK_SCALES, \
+    BENCHMARK_REPEAT, BENCHMARK_RESULTS_DIR
+from FeedRecommender.common.constants import POST_ID, REACTIONS
+from FeedRecommender.common.instrumentation import RunReport
+from FeedRecommender.benchmarks.generate_data import SyntheticDataGenerator
+from FeedRecommender.content.main import contentProfile
+from FeedRecommender.recsys.artifact_store import ArtifactStore
+from FeedRecommender.recsys.common import FetchData
+from FeedRecommender.recsys.get_trending_scores import GetTrendingScores
+from FeedRecommender.recsys.preformatting import PreFormatting
+from FeedRecommender.recsys.trending_recommendations import GetTrendingRecs
+from FeedRecommender.user.main import userProfile
+
+# Controllers whose scaling is tracked across runs
+CONTROLLERS = ["FetchAttributes.controller",
+               "MergeAttributes.controller",
+               "ProcessAttributes.controller",
+               "PrepareFeatureSet.controller",
+               "PrepareClusterLabels.controller",
+               "PrepareUserFeatureSet.controller",
+               "GetTrendingScores.controller",
+               "GetTrendingRecs.controller"]
+
+
+class BenchmarkSuite:
+    """
+    Time the pipelines over synthetic data generated at several
+    scales. For every scale, the raw input files are generated
+    in a workspace laid out like the project, and the content
+    profile, user profile and recommendation pre-computations
+    run from scratch within a run report. The measures of every
+    stage and controller are aggregated over the runs, and saved
+    along with the environment so that the results of different
+    commits can be compared.
+    """
+
+    def __init__(
+            self,
+            scales: list = BENCHMARK_SCALES,
+            repeat: int = BENCHMARK_REPEAT,
+            workspace: str = None,
+            results_dir: str = BENCHMARK_RESULTS_DIR
+    ):
+        """
+        Initialize data members of the class
+        :param scales: list of the numbers of interactions to
+        generate the data with
+        :param repeat: number of runs per scale
+        :param workspace: optional string valued path to the
+        directory the data is generated in. If None, a temporary
+        directory is used and removed once done
+        :param results_dir: string valued path to the
+        directory the results are saved in
+        """
+        self.scales = scales
+        self.repeat = repeat
+        self.workspace = os.path.abspath(workspace) if workspace else None
+        self.results_dir = results_dir
+        self.results = {}
+
+    @staticmethod
+    def get_environment() -> dict:
+        """
+        Describe the environment the benchmarks run in
+        :return: dictionary of environment attributes
+        """
+        try:
+            commit = subprocess.run(
+                ["git", "rev-parse", "--short", "HEAD"],
+                cwd=os.path.dirname(os.path.abspath(__file__)),
+                capture_output=True, text=True, check=True).stdout.strip()
+        except (OSError, subprocess.CalledProcessError):
+            commit = None
+
+        return {
+            "commit": commit,
+            "platform": platform.platform(),
+            "processor": platform.processor(),
+            "cpu_count": os.cpu_count(),
+            "python": platform.python_version(),
+            "numpy": numpy.__version__,
+            "pandas": pandas.__version__,
+            "sklearn": sklearn.__version__
+        }
+
+    @staticmethod
+    def prepare_workspace(workspace: str):
+        """
+        Remove the results of the previous run, keeping
+        the generated raw input files
+        :param workspace: string valued path to workspace
+        :return: None, the workspace is reset
+        """
+        for directory in ["content/intermediates", "user/intermediates",
+                          "recsys/data", "data/ids"]:
+            path = os.path.join(workspace, directory)
+            shutil.rmtree(path, ignore_errors=True)
+            os.makedirs(path)
+
+    @staticmethod
+    def run_recommendations():
+        """
+        Pre-compute the recommendation results and prepare
+        trending recommendations, from the recsys directory
+        :return: None, the measures are kept by the active run report
+        """
+        GetTrendingScores.controller(save_results=True)
+        # Serving the published results of this workspace
+        ArtifactStore.publish()
+        ArtifactStore.reset()
+        # The trending scores are keyed by the reacted contents
+        trending = FetchData.get_trending().rename(
+            columns={REACTIONS: POST_ID})
+        with RunReport.track(name="GetTrendingRecs.controller",
+                             rows_in=len(trending)) as record:
+            record["rows_out"] = len(FetchData.get_external_ids(
+                result=GetTrendingRecs.controller(
+                    trending=trending, result=None)))
+
+    def run_pipelines(self, workspace: str) -> dict:
+        """
+        Run all the pipelines from scratch over the workspace
+        :param workspace: string valued path to workspace
+        :return: dictionary of the records of the run
+        """
+        self.prepare_workspace(workspace=workspace)
+        cwd = os.getcwd()
+        try:
+            with RunReport(name="benchmark") as report:
+                os.chdir(os.path.join(workspace, "content"))
+                contentProfile.create_profile(force=True)
+
+                os.chdir(os.path.join(workspace, "user"))
+                userProfile.create_profile(force=True)
+
+                os.chdir(os.path.join(workspace, "recsys"))
+                PreFormatting(
+                    content_vectors=Artifacts.load_vector_frame(
+                        path="../content/intermediates/all_data_vectors"),
+                    content_clusters=Artifacts.load_table(
+                        path="../content/intermediates/"
+                             "all_cluster_labels.parquet"),
+                    user_vectors=Artifacts.load_table(
+                        path="../user/intermediates/input_features.parquet"),
+                    user_interaction=Artifacts.load_table(
+                        path="../user/intermediates/"
+                             "user_interaction.parquet")
+                ).controller()
+                self.run_recommendations()
+        finally:
+            os.chdir(cwd)
+
+        return {"records": [report.summary] + report.records}
+
+    @staticmethod
+    def aggregate(runs: list) -> dict:
+        """
+        Aggregate the measures of every stage and controller.
+        Within a run, the measures of a controller called several
+        times are summed. Across runs, the median is kept
+        :param runs: list of lists of records, one list per run
+        :return: dictionary of names to aggregated measures
+        """
+        measures = {}
+        for records in runs:
+            totals = {}
+            for record in records:
+                total = totals.setdefault(record["name"], {
+                    "calls": 0, "wall_time": 0.0, "cpu_time": 0.0,
+                    "peak_rss": 0, "rows_in": None, "rows_out": None})
+                total["calls"] += 1
+                total["wall_time"] += record["wall_time"]
+                total["cpu_time"] += record["cpu_time"]
+                total["peak_rss"] = max(total["peak_rss"],
+                                        record["peak_rss"] or 0)
+                for key in ["rows_in", "rows_out"]:
+                    if record[key] is not None:
+                        total[key] = (total[key] or 0) + record[key]
+            for name, total in totals.items():
+                measures.setdefault(name, []).append(total)
+
+        aggregated = {}
+        for name, totals in measures.items():
+            wall_time = median(total["wall_time"] for total in totals)
+            rows = totals[0]["rows_out"] if totals[0]["rows_out"] \
+                is not None else totals[0]["rows_in"]
+            aggregated[name] = {
+                "calls": totals[0]["calls"],
+                "wall_time": wall_time,
+                "cpu_time": median(total["cpu_time"] for total in totals),
+                "peak_rss": max(total["peak_rss"] for total in totals),
+                "rows_in": totals[0]["rows_in"],
+                "rows_out": totals[0]["rows_out"],
+                "throughput": rows / wall_time
+                if rows is not None and wall_time > 0 else None
+            }
+        return aggregated
+
+    def run_scale(self, scale: int) -> dict:
+        """
+        Generate the data at a given scale and benchmark it
+        :param scale: number of interactions
+        :return: dictionary of the results of the scale
+        """
+        workspace = os.path.join(self.workspace, str(scale))
+        started = time.perf_counter()
+        generated = SyntheticDataGenerator(interactions=scale).controller(
+            data_dir=os.path.join(workspace, "data"))
+        generation_time = time.perf_counter() - started
+
+        runs = [self.run_pipelines(workspace=workspace)
+                for _ in range(self.repeat)]
+        measures = self.aggregate(
+            runs=[run["records"] for run in runs])
+        return {
+            "data": generated,
+            "generation_time": generation_time,
+            "controllers": {name: measures.get(name)
+                            for name in CONTROLLERS},
+            "measures": measures
+        }
+
+    def save(self) -> str:
+        """
+        Save the results, named after the time and commit
+        :return: string valued path to the results file
+        """
+        os.makedirs(self.results_dir, exist_ok=True)
+        path = os.path.join(self.results_dir, "{}-{}.json".format(
+            self.results["started"].replace(":", "").split(".")[0],
+            self.results["environment"]["commit"] or "unknown"))
+        with open(path, "w") as json_file:
+            json.dump(self.results, json_file, indent=1)
+        return path
+
+    @staticmethod
+    def get_latest_results(results_dir: str, exclude: str = None) -> str:
+        """
+        Return the most recent results file
+        :param results_dir: string valued path to results directory
+        :param exclude: optional path to a results file to ignore
+        :return: string valued path to the results file,
+        None if there are no results
+        """
+        if not os.path.isdir(results_dir):
+            return None
+        paths = sorted(os.path.join(results_dir, name)
+                       for name in os.listdir(results_dir)
+                       if name.endswith(".json"))
+        paths = [path for path in paths if exclude is None or
+                 os.path.abspath(path) != os.path.abspath(exclude)]
+        return paths[-1] if paths else None
+
+    def compare(self, previous_path: str) -> DataFrame:
+        """
+        Compare the wall time of the controllers with
+        previously saved results, for the scales run by both
+        :param previous_path: string valued path to results file
+        :return: dataframe object pandas of the wall times and
+        their ratio to the previous wall times
+        """
+        with open(previous_path) as json_file:
+            previous = json.load(json_file)
+
+        rows = []
+        for scale, results in self.results["scales"].items():
+            before = previous["scales"].get(scale, {}).get("controllers", {})
+            for name in CONTROLLERS:
+                current, past = results["controllers"].get(name), \
+                    before.get(name)
+                if current is None or past is None:
+                    continue
+                rows.append({"scale": int(scale), "controller": name,
+                             "wall_time": current["wall_time"],
+                             "previous_wall_time": past["wall_time"],
+                             "ratio": current["wall_time"] /
+                             past["wall_time"]
+                             if past["wall_time"] > 0 else None})
+        return DataFrame(rows)
+
+    def controller(self) -> dict:
+        """
+        Driver function to benchmark all the scales
+        :return: dictionary of the results
+        """
+        self.results = {
+            "started": datetime.now(timezone.utc).isoformat(),
+            "environment": self.get_environment(),
+            "repeat": self.repeat,
+            "scales": {}
+        }
+        workspace = self.workspace
+        if workspace is None:
+            self.workspace = tempfile.mkdtemp(prefix="feed_benchmark_")
+        try:
+            for scale in self.scales:
+                self.results["scales"][str(scale)] = \
+                    self.run_scale(scale=scale)
+        finally:
+            if workspace is None:
+                shutil.rmtree(self.workspace, ignore_errors=True)
+                self.workspace = None
+        return self.results
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(
+        description="Benchmark the pipelines over synthetic data")
+    parser.add_argument("--scales", type=int, nargs="+",
+                        default=BENCHMARK_SCALES,
+                        help="numbers of interactions to benchmark")
+    parser.add_argument("--repeat", type=int, default=BENCHMARK_REPEAT,
+                        help="number of runs per scale")
+    parser.add_argument("--workspace",
+                        help="directory to generate the data in, "
+                             "by default a temporary directory")
+    parser.add_argument("--results-dir",
+                        help="directory to save the results in, by "
+                             "default the results/ subdirectory")
+    parser.add_argument("--compare", nargs="?", const="latest",
+                        help="results file to compare with, by default "
+                             "the latest saved results")
+    arguments = parser.parse_args()
+    compare_path = os.path.abspath(arguments.compare) \
+        if arguments.compare not in [None, "latest"] else arguments.compare
+    suite = BenchmarkSuite(
+        scales=arguments.scales,
+        repeat=arguments.repeat,
+        workspace=arguments.workspace,
+        results_dir=os.path.abspath(arguments.results_dir)
+        if arguments.results_dir else BENCHMARK_RESULTS_DIR)
+
+    # The default results directory is relative to the benchmarks directory
+    os.chdir(os.path.dirname(os.path.abspath(__file__)))
+    suite.controller()
+    results_path = suite.save()
+    print("Results saved at", results_path)
+    print(DataFrame([dict(scale=int(scale), controller=name, **measures)
+                     for scale, results in suite.results["scales"].items()
+                     for name, measures in results["controllers"].items()
+                     if measures is not None]).to_string(index=False))
+
+    if compare_path:
+        previous_path = suite.get_latest_results(
+            results_dir=suite.results_dir, exclude=results_path) \
+            if compare_path == "latest" else compare_path
+        if previous_path is None:
+            print("No previous results to compare with")
+        else:
+            print("Compared with", previous_path)
+            print(suite.compare(
+                previous_path=previous_path).to_string(index=False))
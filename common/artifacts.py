@@ -0,0 +1,117 @@
+import os
+from numpy import asarray, float32, load, save
+from pandas import DataFrame, read_parquet
+from FeedRecommender.common.constants import POST_ID
+
+
+class Artifacts:
+    """
+    Storage layer for the results handed over between the
+    pipeline stages and to the recommender.
+    Tabular results are stored in the columnar parquet format,
+    so that consumers can load only the attributes they need.
+    Dense vectors are stored as raw float32 arrays along with
+    the ids of their records, so that consumers can memory-map
+    them instead of deserializing them. Unlike pickles, loading
+    an artifact never executes arbitrary code.
+    """
+
+    @staticmethod
+    def save_table(
+            data: DataFrame,
+            path: str
+    ):
+        """
+        Atomically save a dataframe in parquet format
+        :param data: dataframe object pandas
+        :param path: string valued path to file
+        :return: None, the result is saved in directory
+        """
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        data.to_parquet(path + ".tmp", index=False)
+        os.replace(path + ".tmp", path)
+
+    @staticmethod
+    def load_table(
+            path: str,
+            columns: list = None
+    ) -> DataFrame:
+        """
+        Load a dataframe saved in parquet format. List valued
+        attributes are loaded as arrays
+        :param path: string valued path to file
+        :param columns: optional list of attributes to load.
+        If None, all the attributes are loaded
+        :return: dataframe object pandas
+        """
+        return read_parquet(path, columns=columns, memory_map=True)
+
+    @staticmethod
+    def save_vectors(
+            data: DataFrame,
+            path: str,
+            id_column: str = POST_ID
+    ):
+        """
+        Save a dataframe of vectors, i.e. an id attribute and
+        integer named vector dimensions, as a raw float32 array
+        and a table of ids
+        :param data: dataframe object pandas
+        :param path: string valued path to artifact directory
+        :param id_column: the id attribute. If absent from the
+        data, only the vectors are saved
+        :return: None, the result is saved in directory
+        """
+        os.makedirs(path, exist_ok=True)
+        dimensions = [column for column in data.columns
+                      if column != id_column]
+        save(os.path.join(path, "vectors.tmp.npy"),
+             asarray(data[dimensions].values, dtype=float32))
+        os.replace(os.path.join(path, "vectors.tmp.npy"),
+                   os.path.join(path, "vectors.npy"))
+
+        if id_column in data.columns:
+            Artifacts.save_table(
+                data=data[[id_column]],
+                path=os.path.join(path, "ids.parquet"))
+
+    @staticmethod
+    def load_vectors(
+            path: str,
+            mmap: bool = True
+    ) -> tuple:
+        """
+        Load the vectors and their ids
+        :param path: string valued path to artifact directory
+        :param mmap: boolean indicator. If True, the vectors are
+        memory-mapped read-only instead of being read in memory
+        :return: tuple of the dataframe of ids, None if no ids
+        were saved, and the float32 array of vectors
+        """
+        ids_path = os.path.join(path, "ids.parquet")
+        ids = Artifacts.load_table(path=ids_path) \
+            if os.path.exists(ids_path) else None
+        vectors = load(os.path.join(path, "vectors.npy"),
+                       mmap_mode="r" if mmap else None)
+        return ids, vectors
+
+    @staticmethod
+    def load_vector_frame(
+            path: str,
+            mmap: bool = True
+    ) -> DataFrame:
+        """
+        Load the vectors as a dataframe with integer named vector
+        dimensions followed by the id attribute, the vectors
+        being a zero-copy view of the memory-mapped array
+        :param path: string valued path to artifact directory
+        :param mmap: boolean indicator. If True, the vectors are
+        memory-mapped read-only instead of being read in memory
+        :return: dataframe object pandas
+        """
+        ids, vectors = Artifacts.load_vectors(path=path, mmap=mmap)
+        data = DataFrame(vectors, copy=False)
+        if ids is not None:
+            for column in ids.columns:
+                data[column] = ids[column].values
+        return data
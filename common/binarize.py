@@ -0,0 +1,101 @@
+from numpy import ones, zeros, asarray, int64, uint8, ndarray
+from pandas import DataFrame, Series, factorize
+from scipy.sparse import csr_matrix, issparse
+
+
+class GroupBinarizer:
+    """
+    Group-wise "any" aggregation of one-hot encoded or count
+    attributes, i.e. the counterpart of summing the attributes
+    per group and setting every positive sum to one. The
+    aggregated attributes are set in a single vectorized pass
+    over the non-zero values, straight into uint8 storage,
+    instead of summing into int64 storage and binarizing one
+    attribute at a time.
+    """
+
+    @staticmethod
+    def from_pairs(
+            group_codes: ndarray,
+            column_codes: ndarray,
+            shape: tuple,
+            sparse: bool = False
+    ):
+        """
+        Set the attributes of the groups from the pairs of
+        group and attribute of the non-zero values. Pairs with
+        a code set to -1, i.e. referring to unknown groups or
+        attributes, are ignored
+        :param group_codes: array of the group of every value
+        :param column_codes: array of the attribute of every value
+        :param shape: tuple of the number of groups and attributes
+        :param sparse: boolean indicator. If True, return a sparse
+        matrix else a dense array
+        :return: binary uint8 matrix with one row per group
+        """
+        group_codes = asarray(group_codes, dtype=int64)
+        column_codes = asarray(column_codes, dtype=int64)
+        known = (group_codes >= 0) & (column_codes >= 0)
+        if sparse:
+            matrix = csr_matrix(
+                (ones(known.sum(), dtype=uint8),
+                 (group_codes[known], column_codes[known])),
+                shape=shape)
+            matrix.sum_duplicates()
+            matrix.data[:] = 1
+            return matrix
+
+        matrix = zeros(shape, dtype=uint8)
+        matrix[group_codes[known], column_codes[known]] = 1
+        return matrix
+
+    @staticmethod
+    def transform(
+            codes: ndarray,
+            values,
+            n_groups: int,
+            sparse: bool = False
+    ):
+        """
+        Aggregate the attributes of the records per group
+        :param codes: array of the group of every record,
+        records of group -1 being ignored
+        :param values: dense array or sparse matrix of the
+        attributes, with one row per record
+        :param n_groups: number of groups
+        :param sparse: boolean indicator. If True, return a sparse
+        matrix else a dense array
+        :return: binary uint8 matrix with one row per group
+        """
+        rows, columns = values.nonzero() if issparse(values) \
+            else asarray(values).nonzero()
+        return GroupBinarizer.from_pairs(
+            group_codes=asarray(codes)[rows],
+            column_codes=columns,
+            shape=(n_groups, values.shape[1]),
+            sparse=sparse)
+
+    @staticmethod
+    def aggregate(
+            keys: Series,
+            values,
+            columns: list
+    ) -> DataFrame:
+        """
+        Aggregate the attributes of the records per key, like
+        the binarized result of grouping by the key and summing
+        :param keys: key attribute of the records, records
+        with missing keys being ignored
+        :param values: dense array or sparse matrix of the
+        attributes, with one row per record
+        :param columns: list of attribute names
+        :return: dataframe object pandas with one record per key,
+        in sorted order, and uint8 valued attributes
+        """
+        codes, uniques = factorize(keys, sort=True)
+        data = DataFrame(
+            GroupBinarizer.transform(
+                codes=codes, values=values, n_groups=len(uniques)),
+            columns=columns)
+        data.insert(0, keys.name, uniques)
+        return data
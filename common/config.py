@@ -1,8 +1,42 @@
+INGEST_BATCH_SIZE = 100000
+USER_IDS_PATH = "../data/ids/user_ids.parquet"
+POST_IDS_PATH = "../data/ids/post_ids.parquet"
+PIPELINE_MAX_WORKERS = 2
+PIPELINE_MAX_PROCESSES = 2
+PIPELINE_START_METHOD = "forkserver"
+MEMORY_SAMPLING_INTERVAL = 0.05
+PROFILER_INTERVAL = 0.005
+PROFILER_TOP_FUNCTIONS = 30
+SPACY_MODEL_NAME = "en_core_web_lg"
+NLTK_RESOURCES = {"wordnet": "corpora/wordnet",
+                  "omw-1.4": "corpora/omw-1.4"}
 SEMANTIC_OVERLAP_THRESHOLD = 0.75
+LANGDETECT_SEED = 0
+LANGDETECT_N_PROCESS = 1
+LANGDETECT_CHUNK_SIZE = 1000
+LANGUAGE_CACHE_PATH = "intermediates/text_languages.json"
+SPACY_BATCH_SIZE = 1000
+SPACY_N_PROCESS = 1
+EMBEDDING_CACHE_DIR = "intermediates/embedding_cache"
+EMBEDDING_CACHE_MAX_BYTES = 2 * 1024 ** 3
 UNWANTED_CHAR_WORDS = [";", "&", "https", "http"]
+TEXT_NORMALIZER_N_PROCESS = 1
+TEXT_NORMALIZER_CHUNK_SIZE = 10000
+LEMMA_CACHE_SIZE = 2 ** 18
 SPACY_VECTOR_LENGTH = 300
 PCA_DIMENSIONS = 65
+PCA_BATCH_SIZE = 10000
+CONTENT_REDUCER_DIR = "intermediates/content_reducer"
 CONTENT_CLUSTER_COUNT = 10
+KMEANS_MINI_BATCH = False
+KMEANS_BATCH_SIZE = 4096
+CONTENT_CENTROIDS_PATH = "intermediates/content_centroids.npz"
+CONTENT_MANIFEST_PATH = "intermediates/manifest.json"
+USER_WATERMARK_PATH = "intermediates/watermark.json"
+USER_PREPARED_WATERMARK_PATH = "intermediates/prepared_watermark.json"
+USER_PROFILE_SHARDS = 1
+USER_SHARD_MAX_INTERACTIONS = 1000000
+USER_PROFILE_PROCESSES = 2
 USER_CONTENT_CLUSTER_TEST_SIZE = 0.15
 USER_CONTENT_CLUSTER_TRAIN_EPOCHS = 100
 USER_CONTENT_CLUSTER_TRAIN_PATIENCE = 5
@@ -10,4 +44,15 @@ USER_CONTENT_MODEL_NAME = "01_userContentClusterClassifier"
 USER_CONTENT_TOP_CLUSTER = 5
 MOST_RECENT_HISTORY_COUNT = 1
 RECSYS_HISTORY_CAP = 25
-RECSYS_CONTENT_COUNT_CAP = 1000
\ No newline at end of file
+RECSYS_CONTENT_COUNT_CAP = 1000
+ARTIFACT_SNAPSHOT_DIR = "data/snapshots"
+ARTIFACT_SNAPSHOT_KEEP = 3
+ARTIFACT_STORE_POLL_INTERVAL = 10
+SYNTHETIC_POSTS_PER_INTERACTION = 0.87
+SYNTHETIC_INTERACTIONS_PER_USER = 1.5
+SYNTHETIC_POPULARITY_SKEW = 0.6
+SYNTHETIC_MISSING_LANGUAGE_RATE = 0.55
+SYNTHETIC_BATCH_SIZE = 100000
+BENCHMARK_SCALES = [10000, 100000, 1000000, 10000000]
+BENCHMARK_REPEAT = 1
+BENCHMARK_RESULTS_DIR = "results"
\ No newline at end of file
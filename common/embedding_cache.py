@@ -0,0 +1,211 @@
+import os
+from hashlib import blake2b
+from numpy import memmap, empty, zeros, ones, asarray, argsort, \
+    arange, concatenate, float32, int64, ndarray, load, savez
+from FeedRecommender.common.config import \
+    SPACY_VECTOR_LENGTH, EMBEDDING_CACHE_MAX_BYTES
+
+
+class EmbeddingCache:
+    """
+    Disk-backed, content-addressed cache of text embeddings.
+    Every text is keyed by a hash of its exact value and
+    the version of the model that embedded it. The vectors are
+    stored as float32 rows of a memory-mapped array, while the
+    index maps every key to its row and to the last time it
+    was used. Once the cache reaches its maximum size, the
+    least recently used entries are evicted.
+    """
+
+    # Version of the keys, caches with other keys are discarded
+    KEY_VERSION = 2
+
+    def __init__(
+            self,
+            cache_dir: str,
+            model_version: str,
+            dimensions: int = SPACY_VECTOR_LENGTH,
+            max_bytes: int = EMBEDDING_CACHE_MAX_BYTES,
+            autosave: bool = True
+    ):
+        """
+        Open the cache stored in the directory, creating it
+        if it does not exist yet
+        :param cache_dir: string valued path to cache directory
+        :param model_version: identifier of the embedding model
+        :param dimensions: length of the embedding vectors
+        :param max_bytes: maximum size of the stored vectors
+        :param autosave: boolean indicator. If True, the cache is
+        saved whenever new texts are added, else only by save
+        """
+        self.cache_dir = cache_dir
+        self.model_version = model_version
+        self.dimensions = dimensions
+        self.capacity = max(1, max_bytes // (dimensions * 4))
+        self.index_path = os.path.join(cache_dir, "index.npz")
+        self.vectors_path = os.path.join(cache_dir, "vectors.f32")
+        self.autosave = autosave
+        self.dirty = False
+
+        os.makedirs(cache_dir, exist_ok=True)
+        self.index = {}
+        self.last_used = zeros(self.capacity, dtype=int64)
+        self.clock = 0
+        self.load_index()
+        self.vectors = memmap(
+            self.vectors_path,
+            dtype=float32,
+            mode="r+" if os.path.exists(self.vectors_path) else "w+",
+            shape=(self.capacity, dimensions)
+        )
+
+    def load_index(self):
+        """
+        Load the index from directory. The cache is discarded
+        if it was created for different vector dimensions, a
+        different cache capacity or another version of the keys
+        :return: None, updates the data members of the class
+        """
+        if not os.path.exists(self.index_path):
+            if os.path.exists(self.vectors_path):
+                os.remove(self.vectors_path)
+            return
+
+        index = load(self.index_path)
+        key_version = int(index["key_version"]) \
+            if "key_version" in index.files else 1
+        if int(index["dimensions"]) != self.dimensions or \
+                int(index["capacity"]) != self.capacity or \
+                key_version != self.KEY_VERSION:
+            os.remove(self.index_path)
+            if os.path.exists(self.vectors_path):
+                os.remove(self.vectors_path)
+            return
+
+        slots = index["slots"]
+        self.index = dict(zip(index["keys"].tolist(), slots.tolist()))
+        self.last_used[slots] = index["last_used"]
+        self.clock = int(index["clock"])
+
+    def save(self):
+        """
+        Flush the vectors and atomically write the index
+        :return: None, the cache is saved in directory
+        """
+        self.vectors.flush()
+        keys = list(self.index.keys())
+        slots = asarray(list(self.index.values()), dtype=int64)
+        temp_path = self.index_path + ".tmp.npz"
+        savez(
+            temp_path,
+            keys=asarray(keys, dtype="S32"),
+            slots=slots,
+            last_used=self.last_used[slots],
+            clock=self.clock,
+            dimensions=self.dimensions,
+            capacity=self.capacity,
+            key_version=self.KEY_VERSION
+        )
+        os.replace(temp_path, self.index_path)
+        self.dirty = False
+
+    def get_key(
+            self,
+            text: str
+    ) -> bytes:
+        """
+        Compute the content address of a text. The text is not
+        normalized, since the embedding of a text depends on its
+        whitespaces, spacy emitting tokens for them
+        :param text: text to compute the key of
+        :return: hexadecimal digest of the text and model version
+        """
+        return blake2b(
+            (self.model_version + "\0" + text).encode("utf-8"),
+            digest_size=16
+        ).hexdigest().encode("ascii")
+
+    def allocate(
+            self,
+            count: int
+    ) -> ndarray:
+        """
+        Return free rows of the vector array, evicting the
+        least recently used entries if the cache is full
+        :param count: number of rows required
+        :return: array of row indices
+        """
+        used = asarray(list(self.index.values()), dtype=int64)
+        is_free = ones(self.capacity, dtype=bool)
+        is_free[used] = False
+        free = arange(self.capacity)[is_free][:count]
+
+        if len(free) < count:
+            evicted = used[argsort(self.last_used[used],
+                                   kind="stable")][:count - len(free)]
+            evicted_set = set(evicted.tolist())
+            self.index = {key: slot for key, slot in self.index.items()
+                          if slot not in evicted_set}
+            free = concatenate([free, evicted])
+
+        return free
+
+    def put(
+            self,
+            keys: list,
+            vectors: ndarray
+    ):
+        """
+        Store the vectors of the given keys
+        :param keys: list of text keys
+        :param vectors: float32 matrix with one row per key
+        :return: None, updates the cache
+        """
+        keys = keys[-self.capacity:]
+        vectors = vectors[-self.capacity:]
+        slots = self.allocate(count=len(keys))
+        self.vectors[slots] = vectors
+        self.last_used[slots] = self.clock
+        self.index.update(zip(keys, slots.tolist()))
+        self.dirty = True
+
+    def get_vectors(
+            self,
+            texts: list,
+            embed
+    ) -> ndarray:
+        """
+        Fetch the embeddings of texts in bulk. Only the texts
+        missing from the cache are embedded, each distinct
+        text once, and are then added to the cache, which is
+        only saved if texts were missing and autosave is set
+        :param texts: list of texts
+        :param embed: function mapping a list of texts to
+        a float32 matrix with one row per text
+        :return: float32 matrix with one row per text
+        """
+        self.clock += 1
+        keys = [self.get_key(text=text) for text in texts]
+        slots = asarray([self.index.get(key, -1) for key in keys],
+                        dtype=int64)
+        hits = slots >= 0
+
+        result = empty((len(texts), self.dimensions), dtype=float32)
+        result[hits] = self.vectors[slots[hits]]
+        self.last_used[slots[hits]] = self.clock
+
+        missing = {}
+        for position in arange(len(texts))[~hits].tolist():
+            missing.setdefault(keys[position], []).append(position)
+
+        if missing:
+            positions = list(missing.values())
+            vectors = asarray(
+                embed([texts[group[0]] for group in positions]),
+                dtype=float32)
+            for group, vector in zip(positions, vectors):
+                result[group] = vector
+            self.put(keys=list(missing.keys()), vectors=vectors)
+            if self.autosave:
+                self.save()
+        return result
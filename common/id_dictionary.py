@@ -0,0 +1,127 @@
+import os
+from contextlib import contextmanager
+from numpy import asarray, int32, ndarray
+from pandas import DataFrame, Index, isna, unique
+from FeedRecommender.common.artifacts import Artifacts
+from FeedRecommender.common.constants import ID
+
+try:
+    import fcntl
+except ImportError:
+    fcntl = None
+
+
+class IdDictionary:
+    """
+    Persistent dictionary assigning dense int32 codes to string
+    valued ids, such as user_ids and post_ids. The ids are
+    encoded as soon as they are ingested, so that every result
+    downstream is keyed by integer codes, and decoded back to
+    strings only when results leave the recommender.
+    Codes are assigned in order of first appearance and never
+    change, so that saved results remain valid as new ids are
+    added. The dictionary is stored as a parquet table of ids,
+    the code of an id being its position in the table. Ids are
+    added under an exclusive file lock, so that concurrent
+    stages and processes can share a dictionary.
+    """
+
+    def __init__(
+            self,
+            path: str
+    ):
+        """
+        Load the dictionary, if already saved
+        :param path: string valued path to file
+        """
+        self.path = path
+        self.ids = Index([], dtype=object)
+        self.load()
+
+    def __len__(self) -> int:
+        """
+        Return the number of ids in the dictionary
+        :return: number of ids
+        """
+        return len(self.ids)
+
+    def load(self):
+        """
+        Reload the ids saved in directory
+        :return: None, updates the data member of the class
+        """
+        if os.path.exists(self.path):
+            self.ids = Index(
+                Artifacts.load_table(path=self.path)[ID].values,
+                dtype=object)
+
+    def save(self):
+        """
+        Atomically save the ids in parquet format
+        :return: None, the dictionary is saved in directory
+        """
+        Artifacts.save_table(data=DataFrame({ID: self.ids.values}),
+                             path=self.path)
+
+    @contextmanager
+    def lock(self):
+        """
+        Hold an exclusive lock over the saved dictionary. Where
+        file locks are not available, no lock is taken
+        :return: generator yielding once the lock is held
+        """
+        if fcntl is None:
+            yield
+            return
+        os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+        with open(self.path + ".lock", "w") as lock_file:
+            fcntl.flock(lock_file, fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+    def encode(
+            self,
+            values,
+            add: bool = True
+    ) -> ndarray:
+        """
+        Translate string valued ids to their codes
+        :param values: array-like of string valued ids
+        :param add: boolean indicator. If True, ids never seen
+        before are assigned new codes and saved, else they are
+        encoded as -1
+        :return: int32 array of codes, missing values
+        being encoded as -1
+        """
+        values = asarray(values, dtype=object)
+        codes = self.ids.get_indexer(values)
+        if add and (codes < 0).any():
+            with self.lock():
+                # Other processes may have added ids meanwhile
+                self.load()
+                codes = self.ids.get_indexer(values)
+                unknown = (codes < 0) & ~isna(values)
+                if unknown.any():
+                    self.ids = self.ids.append(
+                        Index(unique(values[unknown]), dtype=object))
+                    self.save()
+                    codes = self.ids.get_indexer(values)
+        return codes.astype(int32)
+
+    def decode(
+            self,
+            codes
+    ) -> ndarray:
+        """
+        Translate codes back to their string valued ids
+        :param codes: array-like of integer codes
+        :return: object array of ids, codes of -1
+        being decoded as None
+        """
+        codes = asarray(codes, dtype=int32)
+        ids = self.ids.values.take(codes.clip(min=0)) \
+            if len(self.ids) else asarray([None] * len(codes), dtype=object)
+        ids[codes < 0] = None
+        return ids
@@ -0,0 +1,433 @@
+import json
+import os
+import sys
+import threading
+import time
+from collections import Counter
+from contextlib import contextmanager
+from datetime import datetime, timezone
+from functools import wraps
+from FeedRecommender.common.config import PROFILER_INTERVAL, \
+    PROFILER_TOP_FUNCTIONS, MEMORY_SAMPLING_INTERVAL
+
+# Innermost functions of the threads waiting for work or results
+IDLE_FUNCTIONS = {("threading", "wait"),
+                  ("threading", "_wait_for_tstate_lock"),
+                  ("selectors", "select"),
+                  ("queue", "get")}
+
+try:
+    import resource
+except ImportError:
+    resource = None
+
+
+class MemorySampler:
+    """
+    Track the peak resident set size of the process over an
+    interval of time, by sampling it from a background thread.
+    Where the current resident set size is not available, the
+    peak resident set size of the whole process life is reported.
+    """
+
+    def __init__(
+            self,
+            interval: float = MEMORY_SAMPLING_INTERVAL
+    ):
+        """
+        Initialize data members of the class
+        :param interval: number of seconds between two samples
+        """
+        self.interval = interval
+        self.peak = 0
+        self.stopped = threading.Event()
+        self.thread = None
+
+    @staticmethod
+    def get_rss() -> int:
+        """
+        Return the current resident set size of the process
+        :return: resident set size in bytes, None if unavailable
+        """
+        try:
+            with open("/proc/self/statm") as statm_file:
+                pages = int(statm_file.read().split()[1])
+            return pages * os.sysconf("SC_PAGE_SIZE")
+        except (OSError, ValueError, IndexError):
+            return None
+
+    @staticmethod
+    def get_max_rss() -> int:
+        """
+        Return the peak resident set size of the process life
+        :return: resident set size in bytes, None if unavailable
+        """
+        if resource is None:
+            return None
+        max_rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        # Reported in bytes on macOS and in kilobytes elsewhere
+        return max_rss if sys.platform == "darwin" else max_rss * 1024
+
+    def sample(self):
+        """
+        Record the resident set size until stopped
+        :return: None, updates the data members of the class
+        """
+        while True:
+            self.peak = max(self.peak, self.get_rss() or 0)
+            if self.stopped.wait(self.interval):
+                break
+
+    def start(self):
+        """
+        Start sampling in a background thread
+        :return: None, updates the data members of the class
+        """
+        if self.get_rss() is None:
+            return
+        self.thread = threading.Thread(
+            target=self.sample, name="instrumentation-memory", daemon=True)
+        self.thread.start()
+
+    def stop(self) -> int:
+        """
+        Stop sampling
+        :return: peak resident set size in bytes since started
+        """
+        if self.thread is None:
+            return self.get_max_rss()
+        self.stopped.set()
+        self.thread.join()
+        return max(self.peak, self.get_rss() or 0)
+
+
+class SamplingProfiler:
+    """
+    Statistical profiler periodically sampling the call stacks
+    of all the threads of the process from a background thread.
+    Unlike a tracing profiler, the overhead does not grow with
+    the number of function calls.
+    """
+
+    def __init__(
+            self,
+            interval: float = PROFILER_INTERVAL
+    ):
+        """
+        Initialize data members of the class
+        :param interval: number of seconds between two samples
+        """
+        self.interval = interval
+        self.samples = 0
+        self.idle = 0
+        self.own = Counter()
+        self.cumulative = Counter()
+        self.stopped = threading.Event()
+        self.thread = None
+
+    @staticmethod
+    def get_location(frame) -> str:
+        """
+        Describe the function a frame is executing
+        :param frame: stack frame
+        :return: string valued module, function and line
+        """
+        code = frame.f_code
+        return "{}:{}:{}".format(
+            frame.f_globals.get("__name__", code.co_filename),
+            code.co_name, code.co_firstlineno)
+
+    def sample(self):
+        """
+        Record the call stacks of the other threads until stopped,
+        leaving out the threads of the instrumentation itself.
+        The threads found waiting are only counted as idle
+        :return: None, updates the data members of the class
+        """
+        while not self.stopped.wait(self.interval):
+            skipped = {thread.ident for thread in threading.enumerate()
+                       if thread.name.startswith("instrumentation-")}
+            for thread_id, frame in sys._current_frames().items():
+                if thread_id in skipped:
+                    continue
+                self.samples += 1
+                if (frame.f_globals.get("__name__"),
+                        frame.f_code.co_name) in IDLE_FUNCTIONS:
+                    self.idle += 1
+                    continue
+                self.own[self.get_location(frame)] += 1
+                stack = set()
+                while frame is not None:
+                    stack.add(self.get_location(frame))
+                    frame = frame.f_back
+                self.cumulative.update(stack)
+
+    def start(self):
+        """
+        Start sampling in a background thread
+        :return: None, updates the data members of the class
+        """
+        self.thread = threading.Thread(
+            target=self.sample, name="instrumentation-profiler",
+            daemon=True)
+        self.thread.start()
+
+    def stop(self) -> dict:
+        """
+        Stop sampling and summarize the samples
+        :return: dictionary of the functions most often found
+        executing and most often found on the call stacks
+        """
+        self.stopped.set()
+        self.thread.join()
+        return {
+            "interval": self.interval,
+            "samples": self.samples,
+            "idle": self.idle,
+            "own": [{"function": location, "samples": count}
+                    for location, count in
+                    self.own.most_common(PROFILER_TOP_FUNCTIONS)],
+            "cumulative": [{"function": location, "samples": count}
+                           for location, count in
+                           self.cumulative.most_common(
+                               PROFILER_TOP_FUNCTIONS)]
+        }
+
+
+class RunReport:
+    """
+    Structured report of a pipeline run. Every measured stage or
+    controller records its wall time, CPU time, peak resident set
+    size, input and output row counts and throughput. Measures
+    can be nested, each record naming its parent measure.
+    CPU time and memory are measured for the whole process, so
+    the records of concurrent stages overlap. Only one report
+    is active at a time, the measures taken while no report is
+    active are not recorded.
+    """
+
+    active = None
+
+    def __init__(
+            self,
+            name: str,
+            path: str = None,
+            profile: bool = False
+    ):
+        """
+        Initialize data members of the class
+        :param name: name of the run
+        :param path: optional string valued path to file the
+        report is saved to once the run is over
+        :param profile: boolean indicator. If True, the call
+        stacks are sampled during the run
+        """
+        self.name = name
+        self.path = path
+        self.profiler = SamplingProfiler() if profile else None
+        self.records = []
+        self.lock = threading.Lock()
+        self.local = threading.local()
+        self.started = None
+        self.summary = {}
+        self.profile = None
+        self.run_measure = None
+
+    def __enter__(self):
+        """
+        Activate the report and start measuring the run
+        :return: the report object
+        """
+        RunReport.active = self
+        self.started = datetime.now(timezone.utc).isoformat()
+        if self.profiler is not None:
+            self.profiler.start()
+        self.run_measure = self.measure(name=self.name)
+        self.summary = self.run_measure.__enter__()
+        return self
+
+    def __exit__(self, *exception):
+        """
+        Deactivate the report, and save it if a path was given
+        :return: False, exceptions are propagated
+        """
+        self.run_measure.__exit__(*exception)
+        RunReport.active = None
+        if self.profiler is not None:
+            self.profile = self.profiler.stop()
+        if self.path is not None:
+            self.save(path=self.path)
+        return False
+
+    @staticmethod
+    def get_rows(value) -> int:
+        """
+        Count the rows of a dataframe, an array or a sparse matrix
+        :param value: object to count the rows of
+        :return: number of rows, None if not countable
+        """
+        shape = getattr(value, "shape", None)
+        return int(shape[0]) if shape else None
+
+    @contextmanager
+    def measure(
+            self,
+            name: str,
+            rows_in: int = None
+    ):
+        """
+        Measure the enclosed block of code
+        :param name: name of the measured stage or controller
+        :param rows_in: optional number of input rows
+        :return: generator yielding the record of the measure,
+        whose row counts may be updated within the block
+        """
+        stack = getattr(self.local, "stack", None)
+        if stack is None:
+            stack = self.local.stack = []
+        # Measures taken from other threads than the run belong to the run
+        parent = stack[-1]["name"] if stack else \
+            self.name if self.summary else None
+        record = {
+            "name": name,
+            "parent": parent,
+            "status": "completed",
+            "rows_in": rows_in,
+            "rows_out": None
+        }
+        memory = MemorySampler()
+        memory.start()
+        stack.append(record)
+        wall_time, cpu_time = time.perf_counter(), time.process_time()
+        try:
+            yield record
+        except BaseException:
+            record["status"] = "failed"
+            raise
+        finally:
+            record["wall_time"] = time.perf_counter() - wall_time
+            record["cpu_time"] = time.process_time() - cpu_time
+            record["peak_rss"] = memory.stop()
+            rows = record["rows_out"] if record["rows_out"] is not None \
+                else record["rows_in"]
+            record["throughput"] = rows / record["wall_time"] \
+                if rows is not None and record["wall_time"] > 0 else None
+            stack.pop()
+            if record is not self.summary:
+                with self.lock:
+                    self.records.append(record)
+
+    @staticmethod
+    @contextmanager
+    def track(
+            name: str,
+            rows_in: int = None
+    ):
+        """
+        Measure the enclosed block of code in the active report
+        :param name: name of the measured stage or controller
+        :param rows_in: optional number of input rows
+        :return: generator yielding the record of the measure,
+        or an unrecorded record if no report is active
+        """
+        report = RunReport.active
+        if report is None:
+            yield {"rows_in": rows_in, "rows_out": None}
+            return
+        with report.measure(name=name, rows_in=rows_in) as record:
+            yield record
+
+    @staticmethod
+    def set_rows(
+            rows_in: int = None,
+            rows_out: int = None
+    ):
+        """
+        Set the row counts of the innermost measure of
+        the calling thread in the active report
+        :param rows_in: optional number of input rows
+        :param rows_out: optional number of output rows
+        :return: None, updates the record of the measure
+        """
+        report = RunReport.active
+        stack = getattr(report.local, "stack", None) if report else None
+        if not stack:
+            return
+        if rows_in is not None:
+            stack[-1]["rows_in"] = int(rows_in)
+        if rows_out is not None:
+            stack[-1]["rows_out"] = int(rows_out)
+
+    @staticmethod
+    def instrument(function):
+        """
+        Decorator measuring every call of a function in the
+        active report. For methods, the input rows are counted
+        from the data member "data", and the output rows from
+        the returned value or else the same data member. The
+        function may set more accurate row counts itself
+        :param function: function or method to measure
+        :return: wrapped function
+        """
+        @wraps(function)
+        def wrapper(*args, **kwargs):
+            instance = args[0] if args else None
+            rows_in = RunReport.get_rows(getattr(instance, "data", None))
+            with RunReport.track(name=function.__qualname__,
+                                 rows_in=rows_in) as record:
+                result = function(*args, **kwargs)
+                if record["rows_out"] is None:
+                    record["rows_out"] = RunReport.get_rows(result) \
+                        if result is not None else RunReport.get_rows(
+                        getattr(instance, "data", None))
+                return result
+        return wrapper
+
+    def extend(
+            self,
+            records: list,
+            parent: str = None
+    ):
+        """
+        Add records measured in another process, such as a
+        worker process running an isolated stage
+        :param records: list of records
+        :param parent: optional name of the parent measure
+        of the records without parent
+        :return: None, updates the data members of the class
+        """
+        with self.lock:
+            for record in records:
+                if record["parent"] is None:
+                    record["parent"] = parent
+                record["process"] = "worker"
+                self.records.append(record)
+
+    def get_report(self) -> dict:
+        """
+        Return the report in JSON serializable format
+        :return: dictionary of the run summary and the
+        records, in the order the measures completed
+        """
+        report = {
+            "run": self.name,
+            "started": self.started,
+            "pid": os.getpid(),
+            "summary": self.summary,
+            "records": self.records
+        }
+        if self.profile is not None:
+            report["profile"] = self.profile
+        return report
+
+    def save(self, path: str):
+        """
+        Atomically save the report in JSON format
+        :param path: string valued path to file
+        :return: None, the report is saved in directory
+        """
+        report = self.get_report()
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        with open(path + ".tmp", "w") as json_file:
+            json.dump(report, json_file, indent=1)
+        os.replace(path + ".tmp", path)
@@ -0,0 +1,109 @@
+from json import JSONDecoder, JSONDecodeError
+from FeedRecommender.common.config import INGEST_BATCH_SIZE
+
+
+class JsonArrayReader:
+    """
+    Incremental reader for files holding a single JSON array
+    of records. The file is read in fixed size chunks and the
+    records are decoded one at a time, so that the memory
+    required is bounded by the chunk and batch sizes instead
+    of the size of the file.
+    """
+
+    def __init__(
+            self,
+            data_path: str,
+            chunk_size: int = 1 << 20
+    ):
+        """
+        Initialize data members of the class
+        :param data_path: string valued data path to file
+        :param chunk_size: number of characters read at once
+        """
+        self.data_path = data_path
+        self.chunk_size = chunk_size
+
+    def iter_records(self):
+        """
+        Lazily decode the records of the JSON array
+        :return: generator of decoded records
+        """
+        decoder = JSONDecoder()
+        buffer = ""
+        position = 0
+        started = False
+        eof = False
+
+        with open(self.data_path, encoding="utf-8") as json_file:
+            while True:
+                while position < len(buffer) and \
+                        buffer[position] in " \t\r\n,":
+                    position += 1
+
+                if position == len(buffer):
+                    if eof:
+                        raise ValueError(
+                            "Unterminated JSON array in " + self.data_path)
+                    buffer = json_file.read(self.chunk_size)
+                    position = 0
+                    eof = len(buffer) < self.chunk_size
+                    continue
+
+                if not started:
+                    if buffer[position] != "[":
+                        raise ValueError(
+                            "Expected a JSON array in " + self.data_path)
+                    started = True
+                    position += 1
+                    continue
+
+                if buffer[position] == "]":
+                    return
+
+                try:
+                    record, end = decoder.raw_decode(buffer, position)
+                    delimiter = end
+                    while delimiter < len(buffer) and \
+                            buffer[delimiter] in " \t\r\n":
+                        delimiter += 1
+                except JSONDecodeError:
+                    if eof:
+                        raise
+                    delimiter = None
+
+                # A value cut at the chunk boundary may still be
+                # decoded, e.g. a number, so a value is only kept
+                # once followed by a delimiter
+                if delimiter is None or delimiter == len(buffer) or \
+                        buffer[delimiter] not in ",]":
+                    if eof:
+                        raise ValueError(
+                            "Malformed JSON array in " + self.data_path)
+                    chunk = json_file.read(self.chunk_size)
+                    eof = len(chunk) < self.chunk_size
+                    buffer = buffer[position:] + chunk
+                    position = 0
+                    continue
+
+                position = end
+                yield record
+
+    def iter_batches(
+            self,
+            batch_size: int = INGEST_BATCH_SIZE
+    ):
+        """
+        Lazily decode the records of the JSON array
+        in batches of fixed size
+        :param batch_size: number of records per batch
+        :return: generator of lists of decoded records
+        """
+        batch = []
+        for record in self.iter_records():
+            batch.append(record)
+            if len(batch) == batch_size:
+                yield batch
+                batch = []
+        if batch:
+            yield batch
@@ -0,0 +1,141 @@
+import json
+from itertools import chain
+from numpy import arange, repeat, ones, asarray, int64, uint8, ndarray
+from pandas import DataFrame, Series, Categorical
+from scipy.sparse import csr_matrix, hstack
+from FeedRecommender.common.binarize import GroupBinarizer
+
+
+class MultiHotEncoder:
+    """
+    Sparse counterpart of exploding list valued attributes,
+    one-hot encoding them and aggregating the records back to
+    a single record per row. Each attribute may hold either
+    a single value or a list of values per row. The columns
+    follow a stable vocabulary and are named like the columns
+    generated by pandas get_dummies, i.e. <attribute>_<value>.
+    """
+
+    def __init__(
+            self,
+            features: list,
+            vocabulary: dict = None
+    ):
+        """
+        Initialize data members of the class
+        :param features: list of attributes to encode
+        :param vocabulary: optional dictionary of attributes
+        to their sorted list of values
+        """
+        self.features = features
+        self.vocabulary = vocabulary or {}
+
+    def save(
+            self,
+            path: str
+    ):
+        """
+        Save the attributes and their vocabulary in JSON format
+        :param path: string valued path to file
+        :return: None, the encoder is saved in directory
+        """
+        with open(path, "w") as json_file:
+            json.dump({"features": self.features,
+                       "vocabulary": self.vocabulary}, json_file)
+
+    @staticmethod
+    def load(path: str):
+        """
+        Load an encoder saved in JSON format
+        :param path: string valued path to file
+        :return: the fitted encoder
+        """
+        with open(path) as json_file:
+            encoder = json.load(json_file)
+        return MultiHotEncoder(features=encoder["features"],
+                               vocabulary=encoder["vocabulary"])
+
+    def get_values(
+            self,
+            feature: Series
+    ) -> tuple:
+        """
+        Flatten the values of an attribute without exploding
+        the dataframe
+        :param feature: attribute holding single values or
+        lists of values
+        :return: tuple of the number of values per row and
+        the flattened list of values
+        """
+        is_list = feature.map(lambda value: isinstance(
+            value, (list, tuple, set, ndarray))).values
+        if not is_list.any():
+            return ones(len(feature), dtype=int64), feature.tolist()
+
+        values = [value if listed else [value]
+                  for value, listed in zip(feature, is_list)]
+        lengths = asarray([len(value) for value in values], dtype=int64)
+        return lengths, list(chain.from_iterable(values))
+
+    def fit(
+            self,
+            data
+    ):
+        """
+        Build the sorted vocabulary of every attribute
+        :param data: dataframe object pandas or list of
+        dataframe objects sharing the vocabulary
+        :return: the fitted encoder
+        """
+        frames = data if isinstance(data, list) else [data]
+        for feature in self.features:
+            values = set()
+            for frame in frames:
+                values.update(self.get_values(feature=frame[feature])[1])
+            self.vocabulary[feature] = sorted(
+                value for value in values
+                if isinstance(value, str) or value == value)
+        return self
+
+    def get_feature_names(self) -> list:
+        """
+        Return the names of the encoded attributes
+        :return: list of attribute names
+        """
+        return ["{}_{}".format(feature, value)
+                for feature in self.features
+                for value in self.vocabulary[feature]]
+
+    def transform_feature(
+            self,
+            feature: Series
+    ) -> csr_matrix:
+        """
+        Multi-hot encode a single attribute. Values missing
+        from the vocabulary are ignored
+        :param feature: attribute holding single values or
+        lists of values
+        :return: sparse binary matrix with one row per record
+        """
+        lengths, values = self.get_values(feature=feature)
+        categories = self.vocabulary[feature.name]
+        return GroupBinarizer.from_pairs(
+            group_codes=repeat(arange(len(feature)), lengths),
+            column_codes=Categorical(values, categories=categories).codes,
+            shape=(len(feature), len(categories)),
+            sparse=True)
+
+    def transform(
+            self,
+            data: DataFrame
+    ) -> csr_matrix:
+        """
+        Multi-hot encode all the attributes
+        :param data: dataframe object pandas
+        :return: sparse binary matrix with one row per record
+        and one column per attribute value
+        """
+        return hstack(
+            [self.transform_feature(feature=data[feature])
+             for feature in self.features],
+            format="csr", dtype=uint8)
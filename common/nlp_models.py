@@ -0,0 +1,114 @@
+from threading import Lock
+from numpy import asarray, zeros, float32, ndarray
+from FeedRecommender.common.config import \
+    SPACY_MODEL_NAME, NLTK_RESOURCES, SPACY_VECTOR_LENGTH, \
+    SPACY_BATCH_SIZE, SPACY_N_PROCESS
+
+
+class NLPModels:
+    """
+    Process-wide registry of the natural language resources
+    used by the content pipeline. Every resource is loaded
+    lazily on first use and the same instance is shared by
+    all the consumers, so importing a module never loads a
+    model or reaches the network.
+    The NLTK resources are only downloaded if they are not
+    already available locally, so the pipeline works offline
+    once the resources have been installed using:
+    python -m nltk.downloader wordnet omw-1.4
+    """
+
+    _models = {}
+    _lock = Lock()
+
+    @staticmethod
+    def get_spacy_model(name: str = SPACY_MODEL_NAME):
+        """
+        Return the shared spacy language model
+        :param name: name of the spacy model to load
+        :return: spacy Language object
+        """
+        if name not in NLPModels._models:
+            with NLPModels._lock:
+                if name not in NLPModels._models:
+                    import spacy
+                    #python -m spacy download en_core_web_lg
+                    NLPModels._models[name] = spacy.load(name)
+        return NLPModels._models[name]
+
+    @staticmethod
+    def get_spacy_model_version(name: str = SPACY_MODEL_NAME) -> str:
+        """
+        Return an identifier of the spacy model and its version,
+        used to invalidate text embeddings computed by other models
+        :param name: name of the spacy model
+        :return: string value model version identifier
+        """
+        meta = NLPModels.get_spacy_model(name=name).meta
+        return "{}_{}-{}".format(
+            meta.get("lang"), meta.get("name"), meta.get("version"))
+
+    @staticmethod
+    def get_text_vectors(
+            texts: list,
+            batch_size: int = SPACY_BATCH_SIZE,
+            n_process: int = SPACY_N_PROCESS
+    ) -> ndarray:
+        """
+        Generate vector representations of texts in batches.
+        Document vectors are the average of the static word
+        vectors, hence only the tokenizer is required and the
+        rest of the pipeline components are disabled
+        :param texts: list of texts to vectorize
+        :param batch_size: number of texts buffered per batch
+        :param n_process: number of worker processes
+        :return: float32 matrix with one row per text
+        """
+        if not texts:
+            return zeros((0, SPACY_VECTOR_LENGTH), dtype=float32)
+
+        nlp = NLPModels.get_spacy_model()
+        docs = nlp.pipe(
+            texts,
+            batch_size=batch_size,
+            n_process=n_process,
+            disable=nlp.pipe_names
+        )
+        return asarray([doc.vector for doc in docs], dtype=float32)
+
+    @staticmethod
+    def ensure_nltk_resources(resources: dict = None):
+        """
+        Make sure the NLTK resources are available locally,
+        downloading only the ones that are missing
+        :param resources: mapping of NLTK resource names
+        to their paths in the NLTK data directory
+        :return: None, raises LookupError if a missing
+        resource could not be downloaded
+        """
+        import nltk
+
+        for resource, path in (resources or NLTK_RESOURCES).items():
+            try:
+                nltk.data.find(path)
+            except LookupError:
+                if not nltk.download(resource, quiet=True):
+                    raise LookupError(
+                        "NLTK resource '{}' is not available, install "
+                        "it using: python -m nltk.downloader {}".
+                        format(resource, resource))
+
+    @staticmethod
+    def get_lemmatizer():
+        """
+        Return the shared WordNet lemmatizer
+        :return: WordNetLemmatizer object
+        """
+        if "lemmatizer" not in NLPModels._models:
+            with NLPModels._lock:
+                if "lemmatizer" not in NLPModels._models:
+                    from nltk.stem import WordNetLemmatizer
+                    NLPModels.ensure_nltk_resources()
+                    NLPModels._models["lemmatizer"] = \
+                        WordNetLemmatizer()
+        return NLPModels._models["lemmatizer"]
@@ -0,0 +1,357 @@
+import inspect
+import json
+import multiprocessing
+import os
+from concurrent.futures import ThreadPoolExecutor, \
+    ProcessPoolExecutor, wait, FIRST_COMPLETED
+from hashlib import blake2b
+from threading import Lock
+from numpy import load
+from pyarrow.parquet import read_metadata
+from FeedRecommender.common import config
+from FeedRecommender.common.config import PIPELINE_MAX_WORKERS, \
+    PIPELINE_MAX_PROCESSES, PIPELINE_START_METHOD
+from FeedRecommender.common.instrumentation import RunReport
+
+
+class Stage:
+    """
+    A single step of a pipeline, declaring the files it reads
+    and the files it writes. The stages producing the inputs
+    of a stage are its dependencies.
+    """
+
+    def __init__(
+            self,
+            name: str,
+            function,
+            inputs: list = None,
+            outputs: list = None,
+            code: list = None,
+            isolated: bool = False
+    ):
+        """
+        Initialize data members of the class
+        :param name: unique name of the stage
+        :param function: callable running the stage
+        :param inputs: list of paths to files or directories read
+        :param outputs: list of paths to files or directories written
+        :param code: list of modules the stage relies on. Along with
+        the function itself, their source is part of the stage
+        fingerprint, so that code changes invalidate the outputs
+        :param isolated: boolean indicator. If True, the stage runs
+        in a worker process, so that CPU bound stages run in
+        parallel instead of contending for the interpreter lock.
+        The worker processes are started from a fork server rather
+        than forked from the threads of the running stages, hence
+        the function must be importable by its qualified name
+        """
+        self.name = name
+        self.function = function
+        self.inputs = inputs or []
+        self.outputs = outputs or []
+        self.code = code or []
+        self.isolated = isolated
+
+
+class PipelineRunner:
+    """
+    Run a graph of stages. Every stage is fingerprinted from
+    its inputs and code, and is skipped if its outputs were
+    produced from the same fingerprint and left untouched since.
+    The fingerprints of completed stages are recorded as soon
+    as they complete, so a failed run resumes where it stopped.
+    Stages that do not depend on each other run concurrently.
+    """
+
+    def __init__(
+            self,
+            stages: list,
+            state_path: str,
+            max_workers: int = PIPELINE_MAX_WORKERS,
+            max_processes: int = PIPELINE_MAX_PROCESSES
+    ):
+        """
+        Initialize data members of the class
+        :param stages: list of stages, in their natural order
+        :param state_path: string valued path to the file
+        recording the fingerprints of completed stages
+        :param max_workers: maximum number of concurrent stages
+        :param max_processes: maximum number of worker processes
+        running the isolated stages
+        """
+        self.stages = {stage.name: stage for stage in stages}
+        self.order = [stage.name for stage in stages]
+        self.state_path = state_path
+        self.max_workers = max_workers
+        self.max_processes = max_processes
+        self.processes = None
+        self.lock = Lock()
+        self.state = {}
+        if os.path.exists(state_path):
+            with open(state_path) as json_file:
+                self.state = json.load(json_file)
+
+    def get_dependencies(self) -> dict:
+        """
+        Map every stage to the stages producing its inputs
+        :return: dictionary of stage names to sets of stage names
+        """
+        producers = {output: stage.name
+                     for stage in self.stages.values()
+                     for output in stage.outputs}
+        return {stage.name: {producers[path] for path in stage.inputs
+                             if path in producers}
+                for stage in self.stages.values()}
+
+    @staticmethod
+    def fingerprint_path(path: str) -> str:
+        """
+        Fingerprint a file, or all the files of a directory,
+        from their sizes and modification times
+        :param path: string valued path to file or directory
+        :return: string valued fingerprint
+        """
+        if os.path.isfile(path):
+            files = [path]
+        elif os.path.isdir(path):
+            files = sorted(os.path.join(root, name)
+                           for root, _, names in os.walk(path)
+                           for name in names)
+        else:
+            return "missing"
+
+        digest = blake2b(digest_size=16)
+        for file in files:
+            status = os.stat(file)
+            digest.update("{}:{}:{};".format(
+                os.path.relpath(file, path), status.st_size,
+                status.st_mtime_ns).encode("utf-8"))
+        return digest.hexdigest()
+
+    @staticmethod
+    def count_rows(path: str) -> int:
+        """
+        Count the rows of a parquet table, a saved array, a saved
+        sparse matrix or a vectors artifact, without loading it
+        :param path: string valued path to file or directory
+        :return: number of rows, None if not countable
+        """
+        if os.path.isdir(path):
+            path = os.path.join(path, "vectors.npy")
+        if not os.path.isfile(path):
+            return None
+        if path.endswith(".parquet"):
+            return read_metadata(path).num_rows
+        if path.endswith(".npy"):
+            return load(path, mmap_mode="r").shape[0]
+        if path.endswith(".npz"):
+            with load(path) as archive:
+                if "shape" in archive.files:
+                    return int(archive["shape"][0])
+        return None
+
+    @staticmethod
+    def count_stage_rows(
+            record: dict,
+            inputs: list,
+            outputs: list
+    ):
+        """
+        Record the number of rows of the largest input
+        and output of a stage
+        :param record: record of the stage measure
+        :param inputs: list of paths read by the stage
+        :param outputs: list of paths written by the stage
+        :return: None, updates the record
+        """
+        for key, paths in [("rows_in", inputs), ("rows_out", outputs)]:
+            rows = [PipelineRunner.count_rows(path) for path in paths]
+            rows = [count for count in rows if count is not None]
+            record[key] = max(rows) if rows else None
+
+    @staticmethod
+    def run_isolated(
+            name: str,
+            function,
+            inputs: list,
+            outputs: list
+    ) -> list:
+        """
+        Run a stage in a worker process and measure it
+        :param name: name of the stage
+        :param function: callable running the stage
+        :param inputs: list of paths read by the stage
+        :param outputs: list of paths written by the stage
+        :return: list of the records measured in the worker
+        """
+        with RunReport(name=name) as report:
+            function()
+            PipelineRunner.count_stage_rows(
+                record=report.summary, inputs=inputs, outputs=outputs)
+        return [report.summary] + report.records
+
+    def get_fingerprint(
+            self,
+            stage: Stage
+    ) -> str:
+        """
+        Fingerprint a stage from its code and its inputs
+        :param stage: stage object
+        :return: string valued fingerprint
+        """
+        digest = blake2b(digest_size=16)
+        for source in [stage.function, config] + stage.code:
+            digest.update(inspect.getsource(source).encode("utf-8"))
+        for path in stage.inputs:
+            digest.update("{}={};".format(
+                path, self.fingerprint_path(path)).encode("utf-8"))
+        return digest.hexdigest()
+
+    def is_up_to_date(
+            self,
+            stage: Stage,
+            fingerprint: str
+    ) -> bool:
+        """
+        Check whether the outputs of a stage were produced
+        from the same fingerprint and left untouched since
+        :param stage: stage object
+        :param fingerprint: current fingerprint of the stage
+        :return: boolean indicator, if True, the stage
+        can be skipped else not
+        """
+        state = self.state.get(stage.name)
+        if state is None or state["fingerprint"] != fingerprint:
+            return False
+        return all(state["outputs"].get(path) ==
+                   self.fingerprint_path(path) != "missing"
+                   for path in stage.outputs)
+
+    def save_state(
+            self,
+            stage: Stage,
+            fingerprint: str
+    ):
+        """
+        Record the fingerprint and outputs of a completed stage
+        :param stage: stage object
+        :param fingerprint: fingerprint the stage ran with
+        :return: None, the state is saved in directory
+        """
+        with self.lock:
+            self.state[stage.name] = {
+                "fingerprint": fingerprint,
+                "outputs": {path: self.fingerprint_path(path)
+                            for path in stage.outputs}
+            }
+            with open(self.state_path + ".tmp", "w") as json_file:
+                json.dump(self.state, json_file, indent=1)
+            os.replace(self.state_path + ".tmp", self.state_path)
+
+    def select(
+            self,
+            start: str = None,
+            until: str = None
+    ) -> list:
+        """
+        Select the stages to run, in their natural order
+        :param start: name of the first stage to run.
+        If None, start from the first stage
+        :param until: name of the last stage to run.
+        If None, run until the last stage
+        :return: list of stage names
+        """
+        for name in [start, until]:
+            if name is not None and name not in self.stages:
+                raise ValueError("Unknown stage '{}', expected one of {}".
+                                 format(name, self.order))
+        first = self.order.index(start) if start else 0
+        last = self.order.index(until) if until else len(self.order) - 1
+        return self.order[first:last + 1]
+
+    def run_stage(
+            self,
+            name: str,
+            force: bool
+    ) -> str:
+        """
+        Run a single stage unless it is up to date
+        :param name: name of the stage
+        :param force: boolean indicator, if True, run the
+        stage even if it is up to date
+        :return: "skipped" or "completed"
+        """
+        stage = self.stages[name]
+        fingerprint = self.get_fingerprint(stage=stage)
+        if not force and self.is_up_to_date(stage=stage,
+                                            fingerprint=fingerprint):
+            return "skipped"
+
+        if stage.isolated:
+            records = self.processes.submit(
+                PipelineRunner.run_isolated, stage.name, stage.function,
+                stage.inputs, stage.outputs).result()
+            if RunReport.active is not None:
+                RunReport.active.extend(records=records,
+                                        parent=RunReport.active.name)
+        else:
+            with RunReport.track(name=stage.name) as record:
+                stage.function()
+                self.count_stage_rows(record=record, inputs=stage.inputs,
+                                      outputs=stage.outputs)
+        self.save_state(stage=stage, fingerprint=fingerprint)
+        return "completed"
+
+    def run(
+            self,
+            start: str = None,
+            until: str = None,
+            force: bool = False
+    ) -> dict:
+        """
+        Run the selected stages, each one as soon as the
+        selected stages it depends on have completed
+        :param start: name of the first stage to run
+        :param until: name of the last stage to run
+        :param force: boolean indicator, if True, run the
+        selected stages even if they are up to date
+        :return: dictionary of stage names to their status
+        """
+        selected = self.select(start=start, until=until)
+        dependencies = self.get_dependencies()
+        pending = {name: dependencies[name].intersection(selected)
+                   for name in selected}
+        status = {}
+        running = {}
+        error = None
+
+        with ProcessPoolExecutor(
+                max_workers=self.max_processes,
+                mp_context=multiprocessing.get_context(
+                    PIPELINE_START_METHOD)) as self.processes, \
+                ThreadPoolExecutor(max_workers=self.max_workers) \
+                as executor:
+            while pending or running:
+                if error is None:
+                    for name in [name for name, upstream in pending.items()
+                                 if upstream.issubset(status)]:
+                        running[executor.submit(
+                            self.run_stage, name, force)] = name
+                        del pending[name]
+
+                if not running:
+                    break
+
+                done, _ = wait(running, return_when=FIRST_COMPLETED)
+                for future in done:
+                    name = running.pop(future)
+                    try:
+                        status[name] = future.result()
+                    except Exception as exception:
+                        status[name] = "failed"
+                        error = error or exception
+
+        if error is not None:
+            raise error
+        return status
@@ -0,0 +1,159 @@
+from numpy import load, einsum, float32, ndarray
+from pandas import DataFrame, concat
+from scipy.sparse import vstack
+from FeedRecommender.common.config import CONTENT_REDUCER_DIR, \
+    CONTENT_CENTROIDS_PATH
+from FeedRecommender.common.constants import MERGED_TEXTS, \
+    CONTENT, DESCRIPTION, CAPTION, TITLE, CLUSTER
+from FeedRecommender.common.embedding_cache import EmbeddingCache
+from FeedRecommender.common.id_dictionary import IdDictionary
+from FeedRecommender.common.multi_hot import MultiHotEncoder
+from FeedRecommender.content.detect_language import DetectLanguage
+from FeedRecommender.content.fetch_attributes import FetchAttributes
+from FeedRecommender.content.merge_attributes import MergeAttributes
+from FeedRecommender.content.prepare_feature_set import PrepareFeatureSet
+from FeedRecommender.content.process_attributes import ProcessAttributes
+from FeedRecommender.content.reduce_dimensions import DimensionalityReducer
+
+
+class ContentClusterAssigner:
+    """
+    Assign new contents to the content clusters without
+    refitting. The contents go through the same fetching,
+    merging, processing and feature set preparation steps
+    as the content profile, and are then projected with the
+    saved dimensionality reduction artifact and labelled
+    with the nearest saved cluster centroid. The language cache
+    is loaded once, and the caches are only saved by flush, so
+    that the cost of a call does not grow with their size.
+    """
+
+    def __init__(
+            self,
+            reducer_dir: str = CONTENT_REDUCER_DIR,
+            centroids_path: str = CONTENT_CENTROIDS_PATH,
+            embedding_cache: EmbeddingCache = None,
+            language_cache_path: str = None,
+            post_ids: IdDictionary = None
+    ):
+        """
+        Load the saved projection and cluster centroids
+        :param reducer_dir: string valued path to the
+        dimensionality reduction artifact directory
+        :param centroids_path: string valued path to the
+        saved cluster centroids
+        :param embedding_cache: optional persistent cache of
+        text embeddings, created without autosave in order to
+        be saved by flush only
+        :param language_cache_path: optional path to the
+        persistent cache of detected text languages
+        :param post_ids: optional dictionary of post_ids the
+        new contents are keyed by
+        """
+        centroids = load(centroids_path)
+        self.reducer = DimensionalityReducer.load(
+            directory=reducer_dir,
+            version=str(centroids["reducer_version"]))
+        self.centroids = centroids["centroids"].astype(float32)
+        self.encoder = MultiHotEncoder(
+            features=self.reducer.metadata["features"],
+            vocabulary=self.reducer.metadata["vocabulary"])
+        self.embedding_cache = embedding_cache
+        self.language_cache_path = language_cache_path
+        self.language_cache = DetectLanguage.load_cache(
+            cache_path=language_cache_path)
+        self.language_cache_size = len(self.language_cache)
+        self.post_ids = post_ids
+        self.merged_data = None
+        self.en_data = None
+        self.non_en_data = None
+        self.features = None
+        self.vectors = None
+
+    def get_nearest_centroids(
+            self,
+            vectors: ndarray
+    ) -> ndarray:
+        """
+        Label every vector with its nearest cluster centroid
+        :param vectors: float32 array of reduced attributes
+        :return: array of cluster labels
+        """
+        distances = einsum("ij,ij->i", self.centroids,
+                           self.centroids)[None, :] - \
+            2 * vectors @ self.centroids.T
+        return distances.argmin(axis=1)
+
+    def prepare_data(
+            self,
+            posts: list
+    ) -> tuple:
+        """
+        Fetch, merge and process the attributes of the contents
+        :param posts: list of content records, in the same
+        format as the records of reacted_posts.json
+        :return: English data records and rest of the records
+        in dataframe object pandas formats
+        """
+        fa = FetchAttributes(records=posts, post_ids=self.post_ids)
+        fa.controller()
+        tma = MergeAttributes(
+            data=fa.data,
+            embedding_cache=self.embedding_cache,
+            language_cache=self.language_cache)
+        tma.controller()
+        self.merged_data = tma.data.copy()
+        pa = ProcessAttributes(
+            data=tma.data,
+            process_features=[MERGED_TEXTS])
+        self.en_data, self.non_en_data = pa.controller()
+        return self.en_data, self.non_en_data
+
+    def assign(
+            self,
+            posts: list
+    ) -> DataFrame:
+        """
+        Assign a batch of new contents to the content clusters.
+        The intermediate merged attributes, sparse feature set
+        and reduced vectors are kept as data members
+        :param posts: list of content records, in the same
+        format as the records of reacted_posts.json
+        :return: dataframe object pandas of the processed content
+        attributes along with their cluster labels, in the same
+        format as the content profile cluster labels
+        """
+        features = []
+        for data, is_en in zip(self.prepare_data(posts=posts),
+                               [True, False]):
+            pfs = PrepareFeatureSet(
+                data=data,
+                to_drop=[CONTENT, DESCRIPTION,
+                         CAPTION, TITLE, MERGED_TEXTS],
+                embedding_cache=self.embedding_cache if is_en else None)
+            pfs.controller(is_en=is_en, encoder=self.encoder)
+            features.append((data, pfs.features))
+
+        all_data = concat([data for data, _ in features],
+                          axis=0).reset_index(drop=True)
+        self.features = vstack([matrix for _, matrix in features],
+                               format="csr")
+        self.vectors = pfs.get_best_N_components(
+            attributes=self.features,
+            reducer=self.reducer)
+        all_data[CLUSTER] = self.get_nearest_centroids(
+            vectors=self.vectors)
+        return all_data
+
+    def flush(self):
+        """
+        Save the texts embedded and the languages detected
+        since the previous flush in the persistent caches
+        :return: None, the caches are saved in directory
+        """
+        if self.embedding_cache is not None and self.embedding_cache.dirty:
+            self.embedding_cache.save()
+        if len(self.language_cache) != self.language_cache_size:
+            DetectLanguage.save_cache(cache=self.language_cache,
+                                      cache_path=self.language_cache_path)
+            self.language_cache_size = len(self.language_cache)
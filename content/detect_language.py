@@ -0,0 +1,169 @@
+import json
+import os
+from concurrent.futures import ProcessPoolExecutor
+from hashlib import blake2b
+from pandas import DataFrame
+from langdetect import DetectorFactory, detect, LangDetectException
+from FeedRecommender.common.config import LANGDETECT_SEED, \
+    LANGDETECT_N_PROCESS, LANGDETECT_CHUNK_SIZE
+from FeedRecommender.common.constants import MERGED_TEXTS, TEXT_LANGUAGE
+from FeedRecommender.common.instrumentation import RunReport
+
+
+def seed_detector(seed: int):
+    """
+    Fix the seed of langdetect, which is otherwise
+    non-deterministic, in the current process
+    :param seed: integer seed
+    :return: None
+    """
+    DetectorFactory.seed = seed
+
+
+def detect_texts(texts: list) -> list:
+    """
+    Detect the language of every text. If in case, the
+    language detection fails, the language code is "none"
+    :param texts: list of texts to detect language of
+    :return: list of language string codes
+    """
+    languages = []
+    for text in texts:
+        try:
+            languages.append(detect(text))
+        except LangDetectException:
+            languages.append("none")
+    return languages
+
+
+class DetectLanguage:
+
+    def __init__(
+            self,
+            data: DataFrame,
+            feature: str = MERGED_TEXTS,
+            cache_path: str = None,
+            cache: dict = None,
+            n_process: int = LANGDETECT_N_PROCESS,
+            chunk_size: int = LANGDETECT_CHUNK_SIZE,
+            seed: int = LANGDETECT_SEED
+    ):
+        """
+        Initialize data members of the class
+        :param data: dataframe object pandas
+        :param feature: text attribute to detect language of
+        :param cache_path: optional path to the persistent cache
+        of detected languages keyed by text hash
+        :param cache: optional already loaded cache of detected
+        languages, shared with the caller, which is then in charge
+        of saving it, see save_cache
+        :param n_process: number of worker processes
+        :param chunk_size: number of texts sent to a worker at once
+        :param seed: seed used by langdetect
+        """
+        self.data = data
+        self.feature = feature
+        self.cache_path = None if cache is not None else cache_path
+        self.n_process = n_process
+        self.chunk_size = chunk_size
+        self.seed = seed
+        self.cache = cache if cache is not None \
+            else self.load_cache(cache_path=cache_path)
+
+    @staticmethod
+    def load_cache(cache_path: str) -> dict:
+        """
+        Load the detected languages of previous runs
+        :param cache_path: optional path to the persistent cache
+        :return: dictionary of text hashes to language codes
+        """
+        if cache_path is None or not os.path.exists(cache_path):
+            return {}
+        with open(cache_path) as json_file:
+            return json.load(json_file)
+
+    @staticmethod
+    def save_cache(
+            cache: dict,
+            cache_path: str
+    ):
+        """
+        Atomically save the detected languages in directory
+        :param cache: dictionary of text hashes to language codes
+        :param cache_path: optional path to the persistent cache
+        :return: None, the cache is saved in directory
+        """
+        if cache_path is None:
+            return
+        temp_path = cache_path + ".tmp"
+        with open(temp_path, "w") as json_file:
+            json.dump(cache, json_file)
+        os.replace(temp_path, cache_path)
+
+    def get_text_hash(
+            self,
+            text: str
+    ) -> str:
+        """
+        Compute the cache key of a text. The seed is part of
+        the key since the detected language may depend on it
+        :param text: text to compute the hash of
+        :return: hexadecimal digest
+        """
+        return blake2b(
+            "{}\0{}".format(self.seed, text).encode("utf-8"),
+            digest_size=16
+        ).hexdigest()
+
+    def detect_languages(
+            self,
+            texts: list
+    ) -> list:
+        """
+        Detect the language of texts, spreading the work
+        over a pool of worker processes
+        :param texts: list of texts to detect language of
+        :return: list of language string codes
+        """
+        if self.n_process <= 1:
+            seed_detector(seed=self.seed)
+            return detect_texts(texts=texts)
+
+        chunks = [texts[start:start + self.chunk_size]
+                  for start in range(0, len(texts), self.chunk_size)]
+        with ProcessPoolExecutor(
+                max_workers=self.n_process,
+                initializer=seed_detector,
+                initargs=(self.seed,)
+        ) as executor:
+            return [language
+                    for languages in executor.map(detect_texts, chunks)
+                    for language in languages]
+
+    @RunReport.instrument
+    def controller(self):
+        """
+        Driver function to detect the language of texts.
+        The procedure involves the following sub-components:
+        1) Deduplicate identical texts, such as reposts
+        2) Look up the languages detected in previous runs
+        3) Detect the language of the remaining texts
+        4) Create the text language attribute at once
+        :return: None, updates the data member of the class
+        """
+        texts = self.data[self.feature].unique().tolist()
+        hashes = [self.get_text_hash(text=text) for text in texts]
+
+        missing = [index for index, text_hash in enumerate(hashes)
+                   if text_hash not in self.cache]
+        languages = self.detect_languages(
+            texts=[texts[index] for index in missing])
+        self.cache.update(
+            (hashes[index], language)
+            for index, language in zip(missing, languages))
+        if missing:
+            self.save_cache(cache=self.cache, cache_path=self.cache_path)
+
+        self.data[TEXT_LANGUAGE] = self.data[self.feature].map(
+            {text: self.cache[text_hash]
+             for text, text_hash in zip(texts, hashes)})
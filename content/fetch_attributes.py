@@ -1,23 +1,77 @@
-import json
-from pandas import DataFrame, set_option
-from tqdm import tqdm
+from pandas import DataFrame, Series, set_option, concat
+from FeedRecommender.common.config import INGEST_BATCH_SIZE
 from FeedRecommender.common.constants import \
     DESCRIPTION, CAPTION, TITLE, CONTENT, SOURCE, POST_ID
+from FeedRecommender.common.id_dictionary import IdDictionary
+from FeedRecommender.common.json_stream import JsonArrayReader
+from FeedRecommender.common.instrumentation import RunReport
 set_option("display.max_columns", None)
 
 class FetchAttributes:
 
     def __init__(
             self,
-            data_path: str
+            data_path: str = None,
+            batch_size: int = INGEST_BATCH_SIZE,
+            records: list = None,
+            post_ids: IdDictionary = None
     ):
         """
         Retrieve data from the string data path to
-        assign to initialize the data member
+        assign to initialize the data member. The file
+        is parsed incrementally in batches of records and
+        the content attribute of every batch is split as
+        soon as the batch is read
         :param data_path: string valued data path to file
+        :param batch_size: number of records parsed at once
+        :param records: list of already decoded records,
+        used instead of the data path if given
+        :param post_ids: optional dictionary of post_ids. If
+        given, the post_ids are translated to their integer codes
         """
-        with open(data_path) as json_file:
-            self.data = DataFrame(json.load(json_file))
+        if records is None:
+            records = JsonArrayReader(data_path=data_path).\
+                iter_batches(batch_size=batch_size)
+        else:
+            records = [records[start:start + batch_size]
+                       for start in range(0, len(records), batch_size)]
+
+        self.data = self.concat_batches(
+            batches=(self.split_content_attribute(data=DataFrame(batch))
+                     for batch in records))
+        self.post_ids = post_ids
+
+    @staticmethod
+    def concat_batches(batches) -> DataFrame:
+        """
+        Concatenate the batches one attribute at a time. The
+        attributes of every batch are kept as separate copies,
+        released as soon as they are concatenated, so that the
+        memory required exceeds the size of the data by a single
+        attribute, instead of the batches and their concatenation
+        being held together
+        :param batches: iterable of dataframe objects pandas
+        :return: dataframe object pandas
+        """
+        columns = {}
+        lengths = []
+        for data in batches:
+            for column in data.columns:
+                columns.setdefault(column, {})[len(lengths)] = \
+                    data[column].copy()
+            lengths.append(len(data))
+        if not lengths:
+            return DataFrame()
+
+        # Attributes missing from a batch are set to NaN
+        for column in list(columns):
+            parts = columns[column]
+            columns[column] = concat(
+                [parts.pop(batch) if batch in parts
+                 else Series(index=range(length), dtype=float)
+                 for batch, length in enumerate(lengths)],
+                ignore_index=True)
+        return DataFrame(columns, copy=False)
 
     def check_attribute_null_values(
             self,
@@ -32,24 +86,25 @@ class FetchAttributes:
         """
         return self.data[attribute].isnull().values.any()
 
-    def split_content_attribute(self):
+    def split_content_attribute(
+            self,
+            data: DataFrame
+    ) -> DataFrame:
         """
         Split the key-value pairs comprising of any
         combination of caption, title, description
         into 3 distinct attributes for convenience
-        :return: None, updates the data member of the class
+        :param data: dataframe object pandas
+        :return: dataframe object pandas with the
+        additional attributes
         """
-        for index in tqdm(range(len(self.data))):
-            content = self.data.loc[index, CONTENT]
-
-            if DESCRIPTION in content.keys():
-                self.data.loc[index, DESCRIPTION] = content[DESCRIPTION]
-
-            if CAPTION in content.keys():
-                self.data.loc[index, CAPTION] = content[CAPTION]
-
-            if TITLE in content.keys():
-                self.data.loc[index, TITLE] = content[TITLE]
+        contents = DataFrame.from_records(
+            [content if isinstance(content, dict) else {}
+             for content in data[CONTENT]],
+            columns=[DESCRIPTION, CAPTION, TITLE],
+            index=data.index
+        )
+        return concat([data, contents], axis=1)
 
     def split_post_attribute(self):
         """
@@ -58,8 +113,18 @@ class FetchAttributes:
         :return: None, updates the data member of the class
         by adding a new attribute
         """
-        self.data[SOURCE] = [post_id.split("_")[0]
-                             for post_id in self.data[POST_ID]]
+        self.data[SOURCE] = \
+            self.data[POST_ID].str.split("_", n=1).str[0]
+
+    def encode_post_ids(self):
+        """
+        Translate the post_ids to their integer codes, new
+        post_ids being added to the dictionary
+        :return: None, updates the data member of the class
+        """
+        if self.post_ids is not None:
+            self.data[POST_ID] = self.post_ids.encode(
+                values=self.data[POST_ID])
 
     def fill_empty_values(
             self,
@@ -72,12 +137,13 @@ class FetchAttributes:
         """
         self.data = self.data.fillna(value)
 
+    @RunReport.instrument
     def controller(self):
         """
         Driver function to fetch the content
         information attributes
         :return: None, updates the data member of the class
         """
-        self.split_content_attribute()
         self.split_post_attribute()
+        self.encode_post_ids()
         self.fill_empty_values()
@@ -1,12 +1,37 @@
+import argparse
+import multiprocessing
 import os
-from pandas import read_pickle, DataFrame, concat
+from concurrent.futures import ProcessPoolExecutor
+from pandas import DataFrame, concat
+from scipy.sparse import vstack, save_npz, load_npz
 from FeedRecommender.common.constants import MERGED_TEXTS, \
-    CONTENT, DESCRIPTION, CAPTION, TITLE, POST_ID
+    CONTENT, DESCRIPTION, CAPTION, TITLE, POST_ID, CLUSTER
+from FeedRecommender.common.config import EMBEDDING_CACHE_DIR, \
+    LANGUAGE_CACHE_PATH, SPACY_VECTOR_LENGTH, CONTENT_REDUCER_DIR, \
+    CONTENT_CENTROIDS_PATH, CONTENT_MANIFEST_PATH, PIPELINE_MAX_PROCESSES, \
+    PIPELINE_START_METHOD, POST_IDS_PATH
+from FeedRecommender.common import nlp_models, multi_hot, id_dictionary
+from FeedRecommender.common.artifacts import Artifacts
+from FeedRecommender.common.embedding_cache import EmbeddingCache
+from FeedRecommender.common.id_dictionary import IdDictionary
+from FeedRecommender.common.multi_hot import MultiHotEncoder
+from FeedRecommender.common.nlp_models import NLPModels
+from FeedRecommender.common.instrumentation import RunReport
+from FeedRecommender.common.pipeline import PipelineRunner, Stage
+from FeedRecommender.content import fetch_attributes, merge_attributes, \
+    detect_language, process_attributes, prepare_feature_set, \
+    reduce_dimensions, prepare_cluster_labels, manifest
+from FeedRecommender.content.assign_clusters import ContentClusterAssigner
 from FeedRecommender.content.fetch_attributes import FetchAttributes
+from FeedRecommender.content.manifest import ContentManifest
 from FeedRecommender.content.merge_attributes import MergeAttributes
 from FeedRecommender.content.prepare_cluster_labels import PrepareClusterLabels
 from FeedRecommender.content.prepare_feature_set import PrepareFeatureSet
 from FeedRecommender.content.process_attributes import ProcessAttributes
+from FeedRecommender.content.reduce_dimensions import DimensionalityReducer
+
+RAW_CONTENT_PATH = "../data/raw/reacted_posts.json"
+
 
 class contentProfile:
     """
@@ -22,22 +47,57 @@ class contentProfile:
     In order to execute this script , use the following main():
     if __name__ == '__main__':
         contentProfile.create_profile()
+    or run the module from the command line, optionally
+    selecting the stages to run using --from and --until
     """
 
+    @staticmethod
+    def get_embedding_cache(autosave: bool = True) -> EmbeddingCache:
+        """
+        Open the persistent text embedding cache shared by
+        the merging and feature set preparation steps, so that
+        only texts not seen in previous runs are vectorized
+        :param autosave: boolean indicator. If True, the cache
+        is saved whenever new texts are added, else only by save
+        :return: embedding cache object
+        """
+        return EmbeddingCache(
+            cache_dir=EMBEDDING_CACHE_DIR,
+            model_version=NLPModels.get_spacy_model_version(),
+            autosave=autosave
+        )
+
+    @staticmethod
+    def get_post_ids() -> IdDictionary:
+        """
+        Open the persistent dictionary of post_ids shared with
+        the user profile and the recommender. All the results
+        of the content profile are keyed by the integer codes
+        :return: id dictionary object
+        """
+        return IdDictionary(path=POST_IDS_PATH)
+
     @staticmethod
     def fetch_and_merge_attributes():
         """
         Fetch appropriate attributes and
-        merge texts to prepare the attribute set
+        merge texts to prepare the attribute set.
+        The post_ids are translated to their integer codes
         :return: None, the result is saved in directory
         """
         fa = FetchAttributes(
-            data_path=os.getcwd() + '/../data/raw/reacted_posts.json'
+            data_path=RAW_CONTENT_PATH,
+            post_ids=contentProfile.get_post_ids()
         )
         fa.controller()
-        tma = MergeAttributes(data=fa.data)
+        tma = MergeAttributes(
+            data=fa.data,
+            embedding_cache=contentProfile.get_embedding_cache(),
+            language_cache_path=LANGUAGE_CACHE_PATH
+        )
         tma.controller()
-        tma.data.to_pickle("intermediates/merged_content.pkl")
+        Artifacts.save_table(
+            data=tma.data, path="intermediates/merged_content.parquet")
     
     @staticmethod
     def process_attributes():
@@ -49,92 +109,450 @@ class contentProfile:
         vector generation of texts in records
         :return: None, results are stored in directory
         """
-        data = read_pickle("intermediates/merged_content.pkl")
+        data = Artifacts.load_table(
+            path="intermediates/merged_content.parquet")
         pa = ProcessAttributes(
             data=data,
             process_features=[MERGED_TEXTS]
         )
         en_data, other_data = pa.controller()
-        en_data.to_pickle("intermediates/en_data.pkl")
-        other_data.to_pickle("intermediates/non_en_data.pkl")
+        Artifacts.save_table(
+            data=en_data, path="intermediates/en_data.parquet")
+        Artifacts.save_table(
+            data=other_data, path="intermediates/non_en_data.parquet")
 
     @staticmethod
-    def prepare_feature_set():
+    def prepare_vocabulary():
         """
-        Since the processing of attribute set split the
-        data into English and Non-English records, the
-        feature set preparation runs once for both of the
-        data. Once the results are obtained the results are
-         combined and then reformatted to obtain the final
-         feature set. Since the number of features are very
-         large due to one-hot encoding of attributes,
-         dimensionality reduction is applied over the
-         feature set so as to make it suitable for
-         downstream tasks.
+        Build the vocabulary of the categorical attributes,
+        shared by the English and Non-English records so that
+        both feature sets hold the same attributes
         :return: None, saves the results in directory
         """
+        encoder = PrepareFeatureSet.get_encoder(
+            data=[Artifacts.load_table(
+                      path="intermediates/en_data.parquet"),
+                  Artifacts.load_table(
+                      path="intermediates/non_en_data.parquet")])
+        encoder.save(path="intermediates/feature_vocabulary.json")
 
-        # Working on English data
-        en_data = read_pickle("intermediates/en_data.pkl")
-        en_pfs = PrepareFeatureSet(
-            data=en_data,
+    @staticmethod
+    def prepare_language_feature_set(is_en: bool):
+        """
+        Prepare the sparse feature set of either the English
+        or the Non-English records
+        :param is_en: boolean indicator. If true, work on the
+        English records else on the rest of the records
+        :return: None, saves the results in directory
+        """
+        prefix = "en" if is_en else "non_en"
+        pfs = PrepareFeatureSet(
+            data=Artifacts.load_table(
+                path="intermediates/{}_data.parquet".format(prefix)),
             to_drop=[CONTENT, DESCRIPTION,
-                     CAPTION, TITLE, MERGED_TEXTS])
-        en_pfs.controller(is_en=True)
+                     CAPTION, TITLE, MERGED_TEXTS],
+            embedding_cache=contentProfile.get_embedding_cache()
+            if is_en else None)
+        pfs.controller(
+            is_en=is_en,
+            encoder=MultiHotEncoder.load(
+                path="intermediates/feature_vocabulary.json"))
+        save_npz("intermediates/{}_features.npz".format(prefix),
+                 pfs.features)
 
-        # Working on non-English data
-        non_en_data = read_pickle("intermediates/non_en_data.pkl")
-        non_en_pfs = PrepareFeatureSet(
-            data=non_en_data,
-            to_drop=[CONTENT, DESCRIPTION,
-                     CAPTION, TITLE, MERGED_TEXTS])
-        non_en_pfs.controller(is_en=False)
+    @staticmethod
+    def prepare_en_feature_set():
+        """
+        Prepare the sparse feature set of the English records
+        :return: None, saves the results in directory
+        """
+        contentProfile.prepare_language_feature_set(is_en=True)
+
+    @staticmethod
+    def prepare_non_en_feature_set():
+        """
+        Prepare the sparse feature set of the Non-English records
+        :return: None, saves the results in directory
+        """
+        contentProfile.prepare_language_feature_set(is_en=False)
 
+    @staticmethod
+    def reduce_feature_set():
+        """
+        Combine the English and Non-English feature sets and
+        apply dimensionality reduction over the combined feature
+        set. The fitted projection is saved as a versioned
+        artifact to project new contents.
+        :return: None, saves the results in directory
+        """
         # Merging the results
         all_data = concat(
-            [en_data, non_en_data],
+            [Artifacts.load_table(path="intermediates/en_data.parquet"),
+             Artifacts.load_table(path="intermediates/non_en_data.parquet")],
             axis=0).reset_index(drop=True)
 
-        # Preparing the reformatted results
-        all_data_vectors = concat(
-            [en_pfs.data, non_en_pfs.data],
-            axis=0).reset_index(drop=True)
-
-        all_data_vectors = all_data_vectors.fillna(0)
+        # Preparing the sparse feature set, with
+        # one row per record of the merged results
+        all_data_features = vstack(
+            [load_npz("intermediates/en_features.npz"),
+             load_npz("intermediates/non_en_features.npz")],
+            format="csr")
 
         # Performing dimensionality reduction
         # on the reformatted feature set
+        reducer = DimensionalityReducer()
         all_data_vectors_reduced = DataFrame(
-            en_pfs.get_best_N_components(
-                attributes=all_data_vectors.drop(columns=[POST_ID])
-            ))
+            reducer.fit_transform(attributes=all_data_features))
+
+        # Keeping only the text vectors, the categorical
+        # attributes are available in the sparse feature set
+        all_data_vectors = DataFrame(
+            all_data_features[:, -SPACY_VECTOR_LENGTH:].toarray())
+        all_data_vectors[POST_ID] = all_data[POST_ID]
 
         # Saving the results in directory
-        all_data.to_pickle("intermediates/all_data.pkl")
-        all_data_vectors.to_pickle("intermediates/all_data_vectors.pkl")
-        all_data_vectors_reduced.to_pickle("intermediates/all_data_vectors_reduced.pkl")
+        encoder = MultiHotEncoder.load(
+            path="intermediates/feature_vocabulary.json")
+        Artifacts.save_table(
+            data=all_data, path="intermediates/all_data.parquet")
+        Artifacts.save_vectors(
+            data=all_data_vectors, path="intermediates/all_data_vectors")
+        save_npz("intermediates/all_data_features.npz", all_data_features)
+        reducer.save(
+            directory=CONTENT_REDUCER_DIR,
+            metadata={"vocabulary": encoder.vocabulary,
+                      "features": encoder.features})
+        Artifacts.save_vectors(
+            data=all_data_vectors_reduced,
+            path="intermediates/all_data_vectors_reduced")
+
+    @staticmethod
+    def prepare_feature_set():
+        """
+        Since the processing of attribute set split the
+        data into English and Non-English records, the
+        feature set preparation runs once for both of the
+        data. Once the results are obtained the results are
+         combined and then reformatted to obtain the final
+         feature set. The categorical attributes are
+         multi-hot encoded as a sparse matrix, with a vocabulary
+         shared by both of the data, so that memory scales with
+         the number of non-zero attributes. Both of the data
+         are prepared in parallel worker processes, and the
+         Non-English records hold no stored text vectors.
+         Since the number of features are very
+         large due to one-hot encoding of attributes,
+         dimensionality reduction is applied over the
+         feature set so as to make it suitable for
+         downstream tasks. The fitted projection is saved
+         as a versioned artifact to project new contents.
+        :return: None, saves the results in directory
+        """
+        contentProfile.prepare_vocabulary()
+
+        # Preparing the English and Non-English feature sets
+        # in parallel worker processes, started from a fork
+        # server since the stages run in threads
+        with ProcessPoolExecutor(
+                max_workers=PIPELINE_MAX_PROCESSES,
+                mp_context=multiprocessing.get_context(
+                    PIPELINE_START_METHOD)) as executor:
+            for future in [
+                    executor.submit(contentProfile.prepare_en_feature_set),
+                    executor.submit(
+                        contentProfile.prepare_non_en_feature_set)]:
+                future.result()
+
+        contentProfile.reduce_feature_set()
 
     @staticmethod
     def prepare_cluster_labels():
         """
-        Apply KMeans clustering over the input feature set
+        Apply KMeans clustering over the input feature set.
+        The centroids are saved along with the version of the
+        projection, so that new contents can be assigned to
+        clusters using ContentClusterAssigner without refitting
         :return: None, saves the results in directory
         """
         pcl = PrepareClusterLabels(
-            original_data=read_pickle("intermediates/all_data.pkl"),
-            features=read_pickle("intermediates/all_data_vectors_reduced.pkl")
+            original_data=Artifacts.load_table(
+                path="intermediates/all_data.parquet"),
+            features=Artifacts.load_vector_frame(
+                path="intermediates/all_data_vectors_reduced")
         )
         pcl.controller()
-        pcl.original_data.to_pickle("intermediates/all_cluster_labels.pkl")
+        Artifacts.save_table(
+            data=pcl.original_data,
+            path="intermediates/all_cluster_labels.parquet")
+        pcl.save_centroids(
+            path=CONTENT_CENTROIDS_PATH,
+            reducer_version=DimensionalityReducer.get_latest_version(
+                directory=CONTENT_REDUCER_DIR))
+
+    @staticmethod
+    def merge_intermediate(
+            path: str,
+            rows: DataFrame,
+            stale: set,
+            is_vectors: bool = False
+    ) -> DataFrame:
+        """
+        Replace the records of stale contents in a saved
+        intermediate result with the newly prepared records
+        :param path: string valued path to the intermediate result
+        :param rows: dataframe object pandas of new records
+        :param stale: set of post_ids to be replaced or removed
+        :param is_vectors: boolean indicator. If True, the
+        intermediate result is a vectors artifact else a table
+        :return: dataframe object pandas of the updated result
+        """
+        data = Artifacts.load_vector_frame(path=path, mmap=False) \
+            if is_vectors else Artifacts.load_table(path=path)
+        return concat([data[~data[POST_ID].isin(stale)], rows],
+                      axis=0).reset_index(drop=True)
+
+    @staticmethod
+    def update_profile():
+        """
+        Incrementally update the content profile. The raw
+        content records are diffed against the manifest of the
+        previous run, only the new or changed contents go through
+        the fetching, merging, processing and feature set steps,
+        and they are assigned to clusters with the saved projection
+        and centroids. Their results then replace the stale records
+        of the saved intermediate results.
+        All the updated results are computed before any is saved,
+        and the manifest is saved last, so that an update failing
+        before completion is entirely run again by the next update.
+        Since the vocabulary and the clusters are not refitted,
+        values of categorical attributes never seen before are
+        ignored until the next complete run
+        :return: None, the results are saved in directory
+        """
+        manifest = ContentManifest(path=CONTENT_MANIFEST_PATH)
+        changed, removed, hashes = manifest.diff(
+            data_path=RAW_CONTENT_PATH)
+        stale = removed.union(record[POST_ID] for record in changed)
+        if not stale:
+            return
+
+        # The manifest is keyed by the post_ids, while the intermediate
+        # results are keyed by their codes. The post_ids without a
+        # code, i.e. new contents, have no records to replace
+        post_ids = contentProfile.get_post_ids()
+        stale = set(post_ids.encode(values=list(stale), add=False).tolist())
+        stale.discard(-1)
+
+        all_data = Artifacts.load_table(
+            path="intermediates/all_data.parquet")
+        all_cluster_labels = Artifacts.load_table(
+            path="intermediates/all_cluster_labels.parquet")
+        all_data_features = load_npz("intermediates/all_data_features.npz")
+        all_data_vectors_reduced = Artifacts.load_vector_frame(
+            path="intermediates/all_data_vectors_reduced", mmap=False)
+
+        # Preparing the records of new or changed contents
+        assigner = ContentClusterAssigner(
+            embedding_cache=contentProfile.get_embedding_cache(
+                autosave=False),
+            language_cache_path=LANGUAGE_CACHE_PATH,
+            post_ids=post_ids)
+        labels = assigner.assign(posts=changed) if changed \
+            else all_cluster_labels.iloc[:0]
+        assigner.flush()
+
+        # Replacing the stale records of the row aligned results
+        keep = ~all_data[POST_ID].isin(stale).values
+        if changed:
+            all_data_features = vstack(
+                [all_data_features[keep], assigner.features],
+                format="csr")
+            vectors = DataFrame(
+                assigner.features[:, -SPACY_VECTOR_LENGTH:].toarray())
+            vectors[POST_ID] = labels[POST_ID]
+            all_data_vectors_reduced = concat(
+                [all_data_vectors_reduced[keep],
+                 DataFrame(assigner.vectors)], axis=0)
+            new_data = [assigner.merged_data, assigner.en_data,
+                        assigner.non_en_data, vectors]
+        else:
+            all_data_features = all_data_features[keep]
+            all_data_vectors_reduced = all_data_vectors_reduced[keep]
+            new_data = [None, None, None, None]
+
+        tables = {
+            path: contentProfile.merge_intermediate(
+                path=path, rows=rows, stale=stale)
+            for path, rows in zip(
+                ["intermediates/merged_content.parquet",
+                 "intermediates/en_data.parquet",
+                 "intermediates/non_en_data.parquet"],
+                new_data[:3])}
+        tables["intermediates/all_data.parquet"] = concat(
+            [all_data[keep], labels.drop(columns=[CLUSTER])],
+            axis=0).reset_index(drop=True)
+        tables["intermediates/all_cluster_labels.parquet"] = concat(
+            [all_cluster_labels[keep], labels],
+            axis=0).reset_index(drop=True)
+        vectors = {
+            "intermediates/all_data_vectors":
+                contentProfile.merge_intermediate(
+                    path="intermediates/all_data_vectors",
+                    rows=new_data[3], stale=stale, is_vectors=True),
+            "intermediates/all_data_vectors_reduced":
+                all_data_vectors_reduced.reset_index(drop=True)}
+
+        # Saving the results once all of them are computed
+        for path, data in tables.items():
+            Artifacts.save_table(data=data, path=path)
+        for path, data in vectors.items():
+            Artifacts.save_vectors(data=data, path=path)
+        save_npz("intermediates/all_data_features.npz", all_data_features)
+
+        manifest.save(hashes=hashes)
+
+    @staticmethod
+    def save_manifest():
+        """
+        Save the manifest of the contents included in the
+        profile, used by the incremental profile updates
+        :return: None, saves the results in directory
+        """
+        manifest = ContentManifest(path=CONTENT_MANIFEST_PATH)
+        manifest.save(hashes=manifest.compute_hashes(
+            data_path=RAW_CONTENT_PATH))
 
     @staticmethod
-    def create_profile():
+    def get_pipeline() -> PipelineRunner:
+        """
+        Declare the content profile creation stages along with
+        the files they read and write. The English and
+        Non-English feature sets are prepared in parallel
+        worker processes
+        :return: pipeline runner object
+        """
+        return PipelineRunner(
+            stages=[
+                Stage(name="fetch_and_merge_attributes",
+                      function=contentProfile.fetch_and_merge_attributes,
+                      inputs=[RAW_CONTENT_PATH],
+                      outputs=["intermediates/merged_content.parquet"],
+                      code=[fetch_attributes, merge_attributes,
+                            detect_language, nlp_models, id_dictionary]),
+                Stage(name="process_attributes",
+                      function=contentProfile.process_attributes,
+                      inputs=["intermediates/merged_content.parquet"],
+                      outputs=["intermediates/en_data.parquet",
+                               "intermediates/non_en_data.parquet"],
+                      code=[process_attributes, nlp_models]),
+                Stage(name="prepare_vocabulary",
+                      function=contentProfile.prepare_vocabulary,
+                      inputs=["intermediates/en_data.parquet",
+                              "intermediates/non_en_data.parquet"],
+                      outputs=["intermediates/feature_vocabulary.json"],
+                      code=[prepare_feature_set, multi_hot]),
+                Stage(name="prepare_en_feature_set",
+                      function=contentProfile.prepare_en_feature_set,
+                      inputs=["intermediates/en_data.parquet",
+                              "intermediates/feature_vocabulary.json"],
+                      outputs=["intermediates/en_features.npz"],
+                      code=[contentProfile.prepare_language_feature_set,
+                            prepare_feature_set, multi_hot, nlp_models],
+                      isolated=True),
+                Stage(name="prepare_non_en_feature_set",
+                      function=contentProfile.prepare_non_en_feature_set,
+                      inputs=["intermediates/non_en_data.parquet",
+                              "intermediates/feature_vocabulary.json"],
+                      outputs=["intermediates/non_en_features.npz"],
+                      code=[contentProfile.prepare_language_feature_set,
+                            prepare_feature_set, multi_hot],
+                      isolated=True),
+                Stage(name="reduce_feature_set",
+                      function=contentProfile.reduce_feature_set,
+                      inputs=["intermediates/en_data.parquet",
+                              "intermediates/non_en_data.parquet",
+                              "intermediates/feature_vocabulary.json",
+                              "intermediates/en_features.npz",
+                              "intermediates/non_en_features.npz"],
+                      outputs=["intermediates/all_data.parquet",
+                               "intermediates/all_data_vectors",
+                               "intermediates/all_data_features.npz",
+                               "intermediates/all_data_vectors_reduced",
+                               CONTENT_REDUCER_DIR],
+                      code=[reduce_dimensions]),
+                Stage(name="prepare_cluster_labels",
+                      function=contentProfile.prepare_cluster_labels,
+                      inputs=["intermediates/all_data.parquet",
+                              "intermediates/all_data_vectors_reduced",
+                              CONTENT_REDUCER_DIR],
+                      outputs=["intermediates/all_cluster_labels.parquet",
+                               CONTENT_CENTROIDS_PATH],
+                      code=[prepare_cluster_labels]),
+                Stage(name="save_manifest",
+                      function=contentProfile.save_manifest,
+                      inputs=[RAW_CONTENT_PATH,
+                              "intermediates/all_cluster_labels.parquet"],
+                      outputs=[CONTENT_MANIFEST_PATH],
+                      code=[manifest]),
+            ],
+            state_path="intermediates/pipeline_state.json"
+        )
+
+    @staticmethod
+    def create_profile(
+            incremental: bool = False,
+            start: str = None,
+            until: str = None,
+            force: bool = False
+    ):
         """
         Driver function for content profile creation.
+        The stages whose outputs are up to date are skipped,
+        so a failed run resumes from the failed stage.
+        :param incremental: boolean indicator. If True and a
+        previous run exists, only the new or changed contents
+        are processed, else the complete profile is rebuilt
+        :param start: name of the first stage to run
+        :param until: name of the last stage to run
+        :param force: boolean indicator. If True, the selected
+        stages run even if they are up to date
         :return: None, the results for each step are
         saved in the 'intermediates/' subdirectory
         """
-        contentProfile.fetch_and_merge_attributes()
-        contentProfile.process_attributes()
-        contentProfile.prepare_feature_set()
-        contentProfile.prepare_cluster_labels()
+        if incremental and os.path.exists(CONTENT_MANIFEST_PATH):
+            contentProfile.update_profile()
+            return
+
+        contentProfile.get_pipeline().run(
+            start=start, until=until, force=force)
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(
+        description="Create the content profile")
+    parser.add_argument("--from", dest="start",
+                        help="name of the first stage to run")
+    parser.add_argument("--until",
+                        help="name of the last stage to run")
+    parser.add_argument("--force", action="store_true",
+                        help="run the stages even if up to date")
+    parser.add_argument("--report",
+                        help="path to the JSON run report, by default "
+                             "intermediates/run_report.json")
+    parser.add_argument("--profile", action="store_true",
+                        help="sample the call stacks during the run")
+    parser.add_argument("--incremental", action="store_true",
+                        help="only process new or changed contents")
+    arguments = parser.parse_args()
+    report_path = os.path.abspath(arguments.report) \
+        if arguments.report else "intermediates/run_report.json"
+
+    # All the paths are relative to the content directory
+    os.chdir(os.path.dirname(os.path.abspath(__file__)))
+    with RunReport(name="content_profile", path=report_path,
+                   profile=arguments.profile):
+        contentProfile.create_profile(
+            incremental=arguments.incremental,
+            start=arguments.start,
+            until=arguments.until,
+            force=arguments.force)
@@ -0,0 +1,90 @@
+import json
+import os
+from hashlib import blake2b
+from FeedRecommender.common.constants import POST_ID
+from FeedRecommender.common.json_stream import JsonArrayReader
+
+
+class ContentManifest:
+    """
+    Manifest of the contents included in the content profile,
+    mapping every post_id to a hash of its raw record. Diffing
+    the raw input against the manifest gives the contents that
+    are new or changed since the last run, and the contents
+    that have been removed.
+    """
+
+    def __init__(
+            self,
+            path: str
+    ):
+        """
+        Load the manifest saved in directory, if any
+        :param path: string valued path to manifest file
+        """
+        self.path = path
+        self.hashes = {}
+        if os.path.exists(path):
+            with open(path) as json_file:
+                self.hashes = json.load(json_file)
+
+    @staticmethod
+    def get_record_hash(record: dict) -> str:
+        """
+        Compute the hash of a raw content record
+        :param record: decoded content record
+        :return: hexadecimal digest
+        """
+        return blake2b(
+            json.dumps(record, sort_keys=True).encode("utf-8"),
+            digest_size=16
+        ).hexdigest()
+
+    def compute_hashes(
+            self,
+            data_path: str
+    ) -> dict:
+        """
+        Stream the raw content records and hash them
+        :param data_path: string valued data path to file
+        :return: dictionary of post_ids to record hashes
+        """
+        return {record[POST_ID]: self.get_record_hash(record=record)
+                for record in
+                JsonArrayReader(data_path=data_path).iter_records()}
+
+    def diff(
+            self,
+            data_path: str
+    ) -> tuple:
+        """
+        Stream the raw content records and compare them
+        against the manifest
+        :param data_path: string valued data path to file
+        :return: tuple of the list of new or changed records,
+        the set of removed post_ids and the updated hashes
+        """
+        changed = []
+        hashes = {}
+        for record in JsonArrayReader(data_path=data_path).iter_records():
+            record_hash = self.get_record_hash(record=record)
+            hashes[record[POST_ID]] = record_hash
+            if self.hashes.get(record[POST_ID]) != record_hash:
+                changed.append(record)
+
+        removed = set(self.hashes).difference(hashes)
+        return changed, removed, hashes
+
+    def save(
+            self,
+            hashes: dict
+    ):
+        """
+        Atomically replace the manifest
+        :param hashes: dictionary of post_ids to record hashes
+        :return: None, the manifest is saved in directory
+        """
+        self.hashes = hashes
+        with open(self.path + ".tmp", "w") as json_file:
+            json.dump(hashes, json_file)
+        os.replace(self.path + ".tmp", self.path)
@@ -1,27 +1,51 @@
-import spacy
+from functools import partial
 from tqdm import tqdm
+from numpy import array, zeros, zeros_like, einsum, \
+    divide, flatnonzero, ndarray
+from numpy.linalg import norm
 from pandas import DataFrame
 from FeedRecommender.common.constants import \
     DESCRIPTION, CAPTION, TITLE, MERGED_TEXTS, TEXT_LANGUAGE
 from FeedRecommender.common.config import \
-    SEMANTIC_OVERLAP_THRESHOLD
+    SEMANTIC_OVERLAP_THRESHOLD, SPACY_BATCH_SIZE, SPACY_N_PROCESS
+from FeedRecommender.common.nlp_models import NLPModels
+from FeedRecommender.common.embedding_cache import EmbeddingCache
+from FeedRecommender.common.instrumentation import RunReport
 from langdetect import detect, LangDetectException
 from FeedRecommender.content.fetch_attributes import FetchAttributes
-
-#python -m spacy download en_core_web_lg
-nlp = spacy.load("en_core_web_lg")
+from FeedRecommender.content.detect_language import DetectLanguage
 
 class MergeAttributes:
 
     def __init__(
             self,
-            data: DataFrame
+            data: DataFrame,
+            batch_size: int = SPACY_BATCH_SIZE,
+            n_process: int = SPACY_N_PROCESS,
+            embedding_cache: EmbeddingCache = None,
+            language_cache_path: str = None,
+            language_cache: dict = None
     ):
         """
         Initialize data members of the class
         :param data: dataframe object pandas
+        :param batch_size: number of texts buffered per
+        batch while streaming texts through spacy
+        :param n_process: number of worker processes
+        used by spacy to vectorize the texts
+        :param embedding_cache: optional persistent cache
+        of text embeddings
+        :param language_cache_path: optional path to the
+        persistent cache of detected text languages
+        :param language_cache: optional already loaded cache of
+        detected text languages, saved by the caller
         """
         self.data = data
+        self.batch_size = batch_size
+        self.n_process = n_process
+        self.embedding_cache = embedding_cache
+        self.language_cache_path = language_cache_path
+        self.language_cache = language_cache
         self.merged_text = []
         self.text_lang = []
 
@@ -70,8 +94,81 @@ class MergeAttributes:
         :param string2: the other text to be compared
         :return: real-valued similarity score
         """
+        nlp = NLPModels.get_spacy_model()
         return nlp(string1).similarity(nlp(string2))
 
+    def get_text_vectors(
+            self,
+            texts: list
+    ) -> ndarray:
+        """
+        Generate vector representations of texts in batches.
+        If an embedding cache is available, only the texts
+        missing from the cache are vectorized
+        :param texts: list of texts to vectorize
+        :return: float32 matrix with one row per text
+        """
+        embed = partial(NLPModels.get_text_vectors,
+                        batch_size=self.batch_size,
+                        n_process=self.n_process)
+        if self.embedding_cache is None:
+            return embed(texts)
+        return self.embedding_cache.get_vectors(
+            texts=texts, embed=embed)
+
+    def get_semantic_overlaps(
+            self,
+            captions: list,
+            titles: list
+    ) -> ndarray:
+        """
+        Batched counterpart of check_semantic_overlap. Captions
+        and titles are vectorized in a single stream and the
+        cosine similarity of every caption-title pair is
+        computed at once. As with spacy, pairs holding the same
+        sequence of tokens are given a similarity score of one,
+        and the other pairs with an empty vector a score of zero
+        :param captions: list of captions to be compared
+        :param titles: list of titles to be compared
+        :return: array of real-valued similarity scores
+        """
+        vectors = self.get_text_vectors(texts=captions + titles)
+        caption_vectors = vectors[:len(captions)]
+        title_vectors = vectors[len(captions):]
+
+        dots = einsum("ij,ij->i", caption_vectors, title_vectors)
+        norms = norm(caption_vectors, axis=1) * \
+            norm(title_vectors, axis=1)
+        similarities = divide(dots, norms,
+                              out=zeros_like(dots),
+                              where=norms > 0)
+        similarities[self.get_identical_tokens(
+            captions=captions, titles=titles)] = 1.0
+        return similarities
+
+    def get_identical_tokens(
+            self,
+            captions: list,
+            titles: list
+    ) -> ndarray:
+        """
+        Check which captions hold the same sequence of tokens as
+        their title, which spacy considers fully similar whatever
+        their vectors, e.g. identical texts out of the vocabulary.
+        Only the differing texts are tokenized
+        :param captions: list of captions to be compared
+        :param titles: list of titles to be compared
+        :return: boolean array, True for identical token sequences
+        """
+        identical = array([caption == title for caption, title
+                           in zip(captions, titles)], dtype=bool)
+        tokenizer = NLPModels.get_spacy_model().tokenizer
+        for index in flatnonzero(~identical):
+            identical[index] = \
+                [token.orth for token in tokenizer(captions[index])] == \
+                [token.orth for token in tokenizer(titles[index])]
+        return identical
+
     def merge_texts(
             self,
             string1: str,
@@ -86,7 +183,56 @@ class MergeAttributes:
         """
         return string1 + "." + string2
 
-    def controller(self):
+    def merge_batched(self):
+        """
+        Merge the acquired attributes for all the records at
+        once. The semantic overlap of every caption and title
+        is computed in a single batched pass instead of
+        running the spacy pipeline twice per record, and the
+        text languages are detected by the DetectLanguage stage
+        :return: None, updates the data member of the class
+        """
+        captions = self.data[CAPTION]
+        titles = self.data[TITLE]
+        descriptions = self.data[DESCRIPTION]
+
+        # Choose to proceed with description or title+caption
+        # for each record
+        description_required = \
+            ~(captions.astype(bool) | titles.astype(bool))
+
+        # Check for semantic overlap between title and caption
+        # to avoid redundancy.
+        overlap = zeros(len(self.data), dtype=bool)
+        indices = flatnonzero(~description_required.values)
+        overlap[indices] = self.get_semantic_overlaps(
+            captions=captions.iloc[indices].tolist(),
+            titles=titles.iloc[indices].tolist()
+        ) > SEMANTIC_OVERLAP_THRESHOLD
+
+        merged_texts = (titles + "." + captions).\
+            where(~overlap, titles).\
+            where(~description_required, descriptions)
+
+        self.data[MERGED_TEXTS] = merged_texts
+
+        # Create an additional attribute indicating
+        # the text language
+        DetectLanguage(
+            data=self.data,
+            feature=MERGED_TEXTS,
+            cache_path=self.language_cache_path,
+            cache=self.language_cache
+        ).controller()
+
+        self.merged_text = self.data[MERGED_TEXTS].tolist()
+        self.text_lang = self.data[TEXT_LANGUAGE].tolist()
+
+    @RunReport.instrument
+    def controller(
+            self,
+            batched: bool = True
+    ):
         """
         Driver function to merge the acquired attributes.
         The procedure involves the following sub-components:
@@ -96,8 +242,15 @@ class MergeAttributes:
         to avoid redundancy.
         3) Create an additional attribute indicating the
         text language
-        :return:
+        :param batched: boolean indicator. If True, the
+        semantic overlaps are computed for all the records
+        at once, else record by record
+        :return: None, updates the data member of the class
         """
+        if batched:
+            self.merge_batched()
+            return
+
         for index in tqdm(range(len(self.data))):
 
             caption = self.data.loc[index, CAPTION]
@@ -1,7 +1,11 @@
-from pandas import DataFrame, set_option, merge, read_pickle
-from sklearn.cluster import KMeans
-from FeedRecommender.common.config import CONTENT_CLUSTER_COUNT
+import os
+from numpy import asarray, float32, savez
+from pandas import DataFrame, set_option, merge
+from sklearn.cluster import KMeans, MiniBatchKMeans
+from FeedRecommender.common.config import CONTENT_CLUSTER_COUNT, \
+    KMEANS_MINI_BATCH, KMEANS_BATCH_SIZE
 from FeedRecommender.common.constants import CLUSTER
+from FeedRecommender.common.instrumentation import RunReport
 set_option("display.max_columns", None)
 
 class PrepareClusterLabels:
@@ -19,42 +23,85 @@ class PrepareClusterLabels:
         """
         self.original_data= original_data
         self.features = features
+        self.centroids = None
 
     def get_cluster_labels(
             self,
-            K=CONTENT_CLUSTER_COUNT
+            K=CONTENT_CLUSTER_COUNT,
+            mini_batch: bool = KMEANS_MINI_BATCH
     ):
         """
         Get KMeans cluster labels for the inout data
-        :param K:
-        :return:
+        :param K: number of clusters
+        :param mini_batch: boolean indicator. If True, fit
+        the clusters over mini-batches of records, suitable
+        for large number of records
+        :return: None, updates the data members of the class
         """
-        kmeans = KMeans(
-            n_clusters=K,
-            random_state=42).fit(self.features)
+        if mini_batch:
+            kmeans = MiniBatchKMeans(
+                n_clusters=K,
+                batch_size=KMEANS_BATCH_SIZE,
+                random_state=42).fit(self.features)
+        else:
+            kmeans = KMeans(
+                n_clusters=K,
+                random_state=42).fit(self.features)
 
+        self.centroids = kmeans.cluster_centers_.astype(float32)
         self.features[CLUSTER] = \
             kmeans.predict(self.features)
 
-    def controller(self):
+    def save_centroids(
+            self,
+            path: str,
+            reducer_version: str
+    ):
+        """
+        Save the cluster centroids along with the version of the
+        projection of the features they were fitted on, so that
+        new contents can be assigned to clusters without refitting
+        :param path: string valued path to file
+        :param reducer_version: version of the dimensionality
+        reduction artifact used to prepare the features
+        :return: None, the centroids are saved in directory
+        """
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        savez(path,
+              centroids=self.centroids,
+              reducer_version=asarray(reducer_version))
+
+    @RunReport.instrument
+    def controller(
+            self,
+            mini_batch: bool = KMEANS_MINI_BATCH
+    ):
         """
         Driver function to getting the cluster
         labels for input feature set
+        :param mini_batch: boolean indicator. If True, fit
+        the clusters over mini-batches of records
         :return:
         """
-        self.get_cluster_labels()
+        RunReport.set_rows(rows_in=len(self.features))
+        self.get_cluster_labels(mini_batch=mini_batch)
         self.original_data = merge(
             self.original_data,
             self.features[CLUSTER],
             left_index=True,
             right_index=True
         )
+        RunReport.set_rows(rows_out=len(self.original_data))
 
 # if __name__ == '__main__':
 #     pcl = PrepareClusterLabels(
-#         original_data=read_pickle("intermediates/all_data.pkl"),
-#         features=read_pickle("intermediates/all_data_vectors_reduced.pkl")
+#         original_data=Artifacts.load_table(
+#             path="intermediates/all_data.parquet"),
+#         features=Artifacts.load_vector_frame(
+#             path="intermediates/all_data_vectors_reduced")
 #     )
 #     pcl.controller()
-#     pcl.original_data.to_pickle("intermediates/all_cluster_labels.pkl")
-#     print(pcl.original_data)
\ No newline at end of file
+#     Artifacts.save_table(
+#         data=pcl.original_data,
+#         path="intermediates/all_cluster_labels.parquet")
+#     print(pcl.original_data)
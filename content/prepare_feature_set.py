@@ -1,15 +1,17 @@
 import numpy as np
-from pandas import DataFrame, get_dummies, set_option, \
-    read_pickle, merge,  concat
-from numpy import asarray
-from sklearn.decomposition import PCA
-import spacy
+from functools import partial
+from pandas import DataFrame, get_dummies, set_option
+from scipy.sparse import csr_matrix, hstack, issparse
+from FeedRecommender.common.multi_hot import MultiHotEncoder
+from FeedRecommender.content.reduce_dimensions import DimensionalityReducer
+from FeedRecommender.common.nlp_models import NLPModels
+from FeedRecommender.common.embedding_cache import EmbeddingCache
 from FeedRecommender.common.config import PCA_DIMENSIONS, \
-    SPACY_VECTOR_LENGTH
+    SPACY_VECTOR_LENGTH, SPACY_BATCH_SIZE, SPACY_N_PROCESS
 from FeedRecommender.common.constants import ML_LANGUAGE, \
     TEXT_LANGUAGE, SOURCE, ML_INTERESTS, CONTENT, DESCRIPTION, \
-    CAPTION, TITLE, MERGED_TEXTS, POST_ID
-nlp = spacy.load("en_core_web_lg")
+    CAPTION, TITLE, MERGED_TEXTS
+from FeedRecommender.common.instrumentation import RunReport
 set_option("display.max_columns", None)
 
 class PrepareFeatureSet:
@@ -17,15 +19,22 @@ class PrepareFeatureSet:
     def __init__(
             self,
             data: DataFrame,
-            to_drop: list
+            to_drop: list,
+            embedding_cache: EmbeddingCache = None
     ):
         """
         Initialize data members of the class
         :param data: dataframe object pandas
         :param to_drop: list of attributes to be dropped
+        :param embedding_cache: optional persistent cache
+        of text embeddings
         """
         self.data = data
         self.to_drop = to_drop
+        self.embedding_cache = embedding_cache
+        self.encoder = None
+        self.features = None
+        self.reducer = None
 
     def filter_attributes(self):
         """
@@ -65,7 +74,10 @@ class PrepareFeatureSet:
         """
         Generate vector representation of list of texts.
         If the language of texts is English, generate vector
-        representation, else return list of zero vectors
+        representation, else return an all-zero sparse block,
+        holding no stored values.
+        If an embedding cache is available, only the texts
+        missing from the cache are vectorized
         :param feature: dataframe attribute with list of texts
          to work on
         :param is_en: boolean indicator. If true, text language is
@@ -73,53 +85,92 @@ class PrepareFeatureSet:
         :return: vectorized format of text
         """
         if is_en:
-            return asarray([nlp(text).vector
-                            for text in self.data[feature]])
+            texts = self.data[feature].tolist()
+            embed = partial(NLPModels.get_text_vectors,
+                            batch_size=SPACY_BATCH_SIZE,
+                            n_process=SPACY_N_PROCESS)
+            if self.embedding_cache is None:
+                return embed(texts)
+            return self.embedding_cache.get_vectors(
+                texts=texts, embed=embed)
         else:
-            return [np.zeros(SPACY_VECTOR_LENGTH)
-                    for _ in self.data[feature]]
+            return csr_matrix((len(self.data), SPACY_VECTOR_LENGTH),
+                              dtype=np.float32)
 
     def get_best_N_components(
             self,
             attributes,
-            N=PCA_DIMENSIONS
-    ):
+            N=PCA_DIMENSIONS,
+            reducer: DimensionalityReducer = None
+    ) -> np.ndarray:
         """
-        Perform dimensionality reduction using PCA
+        Perform dimensionality reduction using PCA. The
+        projection is fitted incrementally over chunks of
+        records, so that sparse attribute sets are never
+        densified as a whole
         :param attributes: original attribute set
         :param N: number of attributes to reduce down to
+        :param reducer: optional fitted reducer. If given,
+        the attributes are projected without refitting
         :return: Transformed attribute set with reduced attributes
         """
-        pca = PCA(n_components=N)
-        return pca.fit_transform(attributes).tolist()
+        if reducer is not None:
+            self.reducer = reducer
+            return self.reducer.transform(attributes=attributes)
+
+        self.reducer = DimensionalityReducer(n_components=N)
+        return self.reducer.fit_transform(attributes=attributes)
+
+    def get_feature_names(self) -> list:
+        """
+        Return the names of the attributes of the feature set,
+        i.e. the encoded categorical attributes followed by
+        the indices of the text vector dimensions
+        :return: list of attribute names
+        """
+        return self.encoder.get_feature_names() + \
+            list(range(SPACY_VECTOR_LENGTH))
+
+    @staticmethod
+    def get_encoder(data: list) -> MultiHotEncoder:
+        """
+        Build the multi-hot encoder of the categorical attributes
+        with a vocabulary shared by all the given data
+        :param data: list of dataframe objects pandas
+        :return: fitted multi-hot encoder
+        """
+        return MultiHotEncoder(
+            features=[ML_INTERESTS, ML_LANGUAGE, SOURCE, TEXT_LANGUAGE]
+        ).fit(data=data)
 
+    @RunReport.instrument
     def controller(
             self,
-            is_en: bool
+            is_en: bool,
+            encoder: MultiHotEncoder = None
     ):
         """
         Driver function to prepare the feature set for
-        downstream clustering tasks
+        downstream clustering tasks. The categorical attributes
+        are multi-hot encoded straight into a sparse matrix,
+        which is stacked with the text vectors, so that the
+        feature set holds one row per record in the original order
         :param is_en: boolean indicator. If true, text language is
         English else not
-        :return: None, updates the data member of the class
+        :param encoder: multi-hot encoder with the vocabulary to
+        be shared with other feature sets. If None, the vocabulary
+        is built from the data
+        :return: None, updates the data members of the class
         """
-        vectors = DataFrame(self.get_word_vectors(
-            feature=MERGED_TEXTS, is_en=is_en))
-        vectors[POST_ID] = self.data[POST_ID]
+        vectors = self.get_word_vectors(
+            feature=MERGED_TEXTS, is_en=is_en)
+        if not issparse(vectors):
+            vectors = csr_matrix(np.asarray(
+                vectors, dtype=np.float32).reshape(
+                len(self.data), SPACY_VECTOR_LENGTH))
 
         self.filter_attributes()
-        self.explode_attribute(feature=ML_LANGUAGE)
-        self.explode_attribute(feature=ML_INTERESTS)
-        self.explode_attribute(feature=SOURCE)
-        self.encode_attributes(features=[ML_INTERESTS, ML_LANGUAGE,
-                                         SOURCE, TEXT_LANGUAGE])
-
-        attributes = self.data.columns.tolist()
-        attributes.remove(POST_ID)
-        self.data = self.data.groupby(POST_ID).sum().reset_index()
-        for attribute in attributes:
-            self.data[attribute].values[
-                self.data[attribute].values > 0] = 1
-
-        self.data = merge(self.data, vectors, on=POST_ID)
+        self.encoder = encoder or self.get_encoder(data=[self.data])
+        self.features = hstack(
+            [self.encoder.transform(data=self.data), vectors],
+            format="csr", dtype=np.float32)
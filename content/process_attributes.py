@@ -1,101 +1,122 @@
-from FeedRecommender.common.config import UNWANTED_CHAR_WORDS
+from FeedRecommender.common.config import UNWANTED_CHAR_WORDS, \
+    TEXT_NORMALIZER_N_PROCESS, TEXT_NORMALIZER_CHUNK_SIZE, LEMMA_CACHE_SIZE
 from FeedRecommender.common.constants import MERGED_TEXTS, EN_LANGUAGE, ML_LANGUAGE
 from pandas import DataFrame, set_option, Series, read_pickle
 import re
-import nltk
-from nltk.stem import WordNetLemmatizer
-import spacy
+from concurrent.futures import ProcessPoolExecutor
+from functools import lru_cache, partial
 from tqdm import tqdm
-nlp = spacy.load("en_core_web_lg")
-lemmatizer = WordNetLemmatizer()
-nltk.download('omw-1.4')
+from FeedRecommender.common.nlp_models import NLPModels
+from FeedRecommender.common.instrumentation import RunReport
 set_option("display.max_columns", None)
 
+UNWANTED_WORDS_PATTERN = re.compile(
+    "|".join(re.escape(word) for word in UNWANTED_CHAR_WORDS))
+NON_ALPHA_NUMERICS_PATTERN = re.compile(r"[^a-zA-Z \']+")
+
+
+@lru_cache(maxsize=LEMMA_CACHE_SIZE)
+def lemmatize_token(token: str) -> str:
+    """
+    Memoized lemma lookup of a single token
+    :param token: token to lemmatize
+    :return: lemma of the token
+    """
+    return NLPModels.get_lemmatizer().lemmatize(token)
+
+
+def normalize_text(
+        text: str,
+        is_lang_en: bool
+) -> str:
+    """
+    Apply all the cleaning rules to a text in a single
+    tokenization pass: lowercase, drop the words holding
+    unwanted characters, replace non alpha-numeric characters
+    with whitespaces, collapse whitespaces and lemmatize
+    every token. Only the first and last rules apply to
+    texts that are not in english
+    :param text: Text to work with
+    :param is_lang_en: validate whether working with
+    english language text
+    :return: normalized text
+    """
+    words = text.lower().split()
+    if not is_lang_en:
+        return " ".join(words)
+
+    tokens = []
+    for word in words:
+        if UNWANTED_WORDS_PATTERN.search(word):
+            continue
+        tokens.extend(
+            lemmatize_token(token) for token in
+            NON_ALPHA_NUMERICS_PATTERN.sub(" ", word).split())
+    return " ".join(tokens)
+
+
+def normalize_texts(
+        texts: list,
+        is_lang_en: bool
+) -> list:
+    """
+    Normalize a chunk of texts
+    :param texts: list of texts to work with
+    :param is_lang_en: validate whether working with
+    english language text
+    :return: list of normalized texts
+    """
+    return [normalize_text(text=text, is_lang_en=is_lang_en)
+            for text in texts]
+
 class ProcessAttributes:
 
     def __init__(
             self,
             data: DataFrame,
-            process_features: list  # MERGED_TEXTS
+            process_features: list,  # MERGED_TEXTS
+            n_process: int = TEXT_NORMALIZER_N_PROCESS,
+            chunk_size: int = TEXT_NORMALIZER_CHUNK_SIZE
     ):
         """
         Initialize data members of the class
         :param data: dataframe object pandas
         :param process_features: list of features
         to be processed
+        :param n_process: number of worker processes
+        used to normalize the texts
+        :param chunk_size: number of texts sent to
+        a worker at once
         """
         self.data = data
         self.process_features = process_features
+        self.n_process = n_process
+        self.chunk_size = chunk_size
 
-    def to_lower(
+    def normalize_feature(
             self,
-            feature: Series
-    ) -> Series:
+            feature: Series,
+            is_lang_en: bool
+    ) -> list:
         """
-        Convert string text to lowercase
-        :param feature: text to work with
-        :return: lowercase format of input text
+        Normalize the texts of an attribute, chunking the
+        work across a pool of worker processes
+        :param feature: texts to work with
+        :param is_lang_en: validate whether working with
+        english language text
+        :return: list of normalized texts
         """
-        return feature.str.lower()
+        texts = feature.tolist()
+        normalize = partial(normalize_texts, is_lang_en=is_lang_en)
 
-    def remove_unwanted_words(
-            self,
-            text: str
-    ) -> str:
-        """
-        Remove unwanted words from the input text,
-        i.e remove words with unnecessary characters
-        that imply irrelevant information in current
-        context. For eg: hyperlinks, special
-        characters' Unicode representation etc.
-        :param text: Text to work with
-        :return: text cleaned off unwanted words
-        """
-        for unwanted_word in UNWANTED_CHAR_WORDS:
-            text = ' '.join(
-                word for word in text.split()
-                if unwanted_word not in word
-            )
-        return text
-
-    def remove_non_alpha_numerics(
-            self,
-            text: str
-    ) -> str:
-        """
-        Filter to proceed with only alpha
-        numeric characters in text
-        :param text: Text to work with
-        :return: alpha-numeric string
-        """
-        return re.sub(r'[^a-zA-Z \']', ' ', text)
+        if self.n_process <= 1:
+            return normalize(texts)
 
-    def remove_redundant_whitespaces(
-            self,
-            text: str
-    ) -> str:
-        """
-        Remove unnecessary whitespaces from the text
-        :param text: Text to work with
-        :return: Text with no multiple consecutive
-        occurrence of whitespace
-        """
-        text = text.lstrip()
-        text = text.rstrip()
-        return re.sub("\\s+", " ", text)
-
-    def lemmatize_str(
-            self,
-            feature: Series
-    ) -> Series:
-        """
-        Perform text lemmatization
-        :param feature: list of strings to work with
-        :return: lemmatize format of the input list of texts
-        """
-        feature = [lemmatizer.lemmatize(x)
-                   for x in feature.tolist()]
-        return Series(feature)
+        chunks = [texts[start:start + self.chunk_size]
+                  for start in range(0, len(texts), self.chunk_size)]
+        with ProcessPoolExecutor(max_workers=self.n_process) as executor:
+            return [text for chunk in executor.map(normalize, chunks)
+                    for text in chunk]
 
     def process_data(
             self,
@@ -105,6 +126,8 @@ class ProcessAttributes:
     ):
         """
         The preprocessing pipeline is executed via this method.
+        All the cleaning rules are applied to each text in
+        a single pass, see normalize_text
         :param df: dataframe object pandas
         :param features: list of features to process
         :param is_lang_en: validate whether working with
@@ -112,26 +135,9 @@ class ProcessAttributes:
         :return: Dataframe object pandas
         """
         for feature in features:
-
-            df[feature] = self.to_lower(
-                feature=df[feature])
-
-            df[feature] = [self.remove_redundant_whitespaces(text=text)
-                           for text in df[feature]]
-
-            if not is_lang_en:
-                continue
-
-            df[feature] = [self.remove_unwanted_words(text=text)
-                           for text in df[feature]]
-
-            df[feature] = [self.remove_non_alpha_numerics(text=text)
-                           for text in df[feature]]
-
-            df[feature] = [self.remove_redundant_whitespaces(text=text)
-                           for text in df[feature]]
-
-            df[feature] = self.lemmatize_str(feature=df[feature])
+            df[feature] = self.normalize_feature(
+                feature=df[feature],
+                is_lang_en=is_lang_en)
 
         return df
 
@@ -158,6 +164,7 @@ class ProcessAttributes:
             self.data.filter(items=non_en_data_indices,
                              axis=0).reset_index(drop=True)
 
+    @RunReport.instrument
     def controller(self):
         """
         Driver function to process the fetched and merged
@@ -174,5 +181,6 @@ class ProcessAttributes:
                                         features=self.process_features,
                                         is_lang_en=False)
 
+        RunReport.set_rows(rows_out=len(en_data) + len(non_en_data))
         return en_data, non_en_data
 
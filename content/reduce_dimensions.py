@@ -0,0 +1,178 @@
+import os
+import json
+from datetime import datetime, timezone
+from hashlib import blake2b
+from numpy import asarray, empty, float32, ndarray, load, savez
+from scipy.sparse import issparse
+from sklearn.decomposition import IncrementalPCA
+from FeedRecommender.common.config import PCA_DIMENSIONS, PCA_BATCH_SIZE
+
+
+class DimensionalityReducer:
+    """
+    Principal component projection fitted chunk by chunk, so
+    that sparse or memory-mapped attribute sets larger than the
+    available memory never have to be materialized at once.
+    The fitted projection is persisted as a versioned artifact
+    and re-used to project new records without refitting.
+    """
+
+    def __init__(
+            self,
+            n_components: int = PCA_DIMENSIONS,
+            batch_size: int = PCA_BATCH_SIZE
+    ):
+        """
+        Initialize data members of the class
+        :param n_components: number of attributes to reduce down to
+        :param batch_size: number of records processed at once
+        """
+        self.n_components = n_components
+        self.batch_size = max(batch_size, n_components)
+        self.components = None
+        self.mean = None
+        self.explained_variance_ratio = None
+        self.version = None
+        self.metadata = {}
+
+    def iter_chunks(
+            self,
+            attributes
+    ):
+        """
+        Split the attribute set into dense float32 chunks of rows
+        :param attributes: sparse matrix, array or memory-mapped
+        array of attributes
+        :return: generator of tuples of the first row
+        of the chunk and the dense chunk
+        """
+        for start in range(0, attributes.shape[0], self.batch_size):
+            chunk = attributes[start:start + self.batch_size]
+            chunk = chunk.toarray() if issparse(chunk) else chunk
+            yield start, asarray(chunk, dtype=float32)
+
+    def fit(
+            self,
+            attributes
+    ):
+        """
+        Incrementally fit the projection over chunks of records
+        :param attributes: sparse matrix, array or memory-mapped
+        array of attributes
+        :return: the fitted reducer
+        """
+        pca = IncrementalPCA(n_components=self.n_components)
+        for _, chunk in self.iter_chunks(attributes=attributes):
+            pca.partial_fit(chunk)
+
+        self.components = pca.components_.astype(float32)
+        self.mean = pca.mean_.astype(float32)
+        self.explained_variance_ratio = \
+            pca.explained_variance_ratio_.astype(float32)
+        self.version = None
+        return self
+
+    def transform(
+            self,
+            attributes
+    ) -> ndarray:
+        """
+        Project the attributes using the fitted projection
+        :param attributes: sparse matrix, array or memory-mapped
+        array of attributes
+        :return: float32 array of reduced attributes
+        """
+        if self.components is None:
+            raise ValueError("The reducer has not been fitted yet")
+
+        reduced = empty((attributes.shape[0], self.n_components),
+                        dtype=float32)
+        offset = self.mean @ self.components.T
+        for start, chunk in self.iter_chunks(attributes=attributes):
+            reduced[start:start + len(chunk)] = \
+                chunk @ self.components.T - offset
+        return reduced
+
+    def fit_transform(
+            self,
+            attributes
+    ) -> ndarray:
+        """
+        Fit the projection and project the attributes
+        :param attributes: sparse matrix, array or memory-mapped
+        array of attributes
+        :return: float32 array of reduced attributes
+        """
+        return self.fit(attributes=attributes).transform(
+            attributes=attributes)
+
+    def save(
+            self,
+            directory: str,
+            metadata: dict = None
+    ) -> str:
+        """
+        Save the fitted projection as a new version of the
+        artifact and mark it as the latest version
+        :param directory: string valued path to artifact directory
+        :param metadata: optional JSON serializable information
+        required to re-use the projection, such as the
+        vocabulary of the encoded attributes
+        :return: version of the saved artifact
+        """
+        self.metadata = metadata or {}
+        fingerprint = blake2b(self.components.tobytes(),
+                              digest_size=4).hexdigest()
+        self.version = "{}-{}".format(
+            datetime.now(timezone.utc).strftime("%Y%m%dT%H%M%S"),
+            fingerprint)
+
+        os.makedirs(directory, exist_ok=True)
+        savez(os.path.join(directory, self.version + ".npz"),
+              components=self.components,
+              mean=self.mean,
+              explained_variance_ratio=self.explained_variance_ratio,
+              metadata=json.dumps(self.metadata))
+
+        latest_path = os.path.join(directory, "LATEST")
+        with open(latest_path + ".tmp", "w") as latest_file:
+            latest_file.write(self.version)
+        os.replace(latest_path + ".tmp", latest_path)
+        return self.version
+
+    @staticmethod
+    def get_latest_version(directory: str) -> str:
+        """
+        Return the latest saved version of the artifact
+        :param directory: string valued path to artifact directory
+        :return: version of the latest artifact
+        """
+        with open(os.path.join(directory, "LATEST")) as latest_file:
+            return latest_file.read().strip()
+
+    @staticmethod
+    def load(
+            directory: str,
+            version: str = None
+    ):
+        """
+        Load a saved projection
+        :param directory: string valued path to artifact directory
+        :param version: version to load. If None, the latest
+        version is loaded
+        :return: the fitted reducer
+        """
+        if version is None:
+            version = DimensionalityReducer.get_latest_version(
+                directory=directory)
+
+        artifact = load(os.path.join(directory, version + ".npz"))
+        reducer = DimensionalityReducer(
+            n_components=artifact["components"].shape[0])
+        reducer.components = artifact["components"]
+        reducer.mean = artifact["mean"]
+        reducer.explained_variance_ratio = \
+            artifact["explained_variance_ratio"]
+        reducer.metadata = json.loads(str(artifact["metadata"]))
+        reducer.version = version
+        return reducer
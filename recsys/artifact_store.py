@@ -0,0 +1,353 @@
+import json
+import os
+import shutil
+import threading
+from datetime import datetime, timezone
+from pandas import DataFrame, Index, concat, read_pickle
+from FeedRecommender.common.artifacts import Artifacts
+from FeedRecommender.common.config import ARTIFACT_SNAPSHOT_DIR, \
+    ARTIFACT_SNAPSHOT_KEEP, ARTIFACT_STORE_POLL_INTERVAL, \
+    USER_IDS_PATH, POST_IDS_PATH
+from FeedRecommender.common.constants import CLUSTER
+from FeedRecommender.common.id_dictionary import IdDictionary
+from FeedRecommender.recsys.content_bitmap_index import ContentBitmapIndex
+from FeedRecommender.recsys.interaction_index import UserInteractionIndex
+
+# Artifacts prepared for the recommendations, relative to the
+# directory they are prepared in
+RECSYS_ARTIFACTS = ["content_cat.parquet", "content_text_vec",
+                    "users.parquet", "user_interaction.parquet",
+                    "user_genres.parquet", "trending.parquet",
+                    "complete_user_info.pkl"]
+
+
+class ArtifactSnapshot:
+    """
+    Immutable in-memory view of a published snapshot of the
+    recommendation artifacts. All the artifacts are loaded in
+    memory once. The user interactions are indexed by user, see
+    UserInteractionIndex, and the content attributes are sorted
+    by cluster, so that the records of a user or of clusters
+    are looked up without scanning. The candidate contents are
+    selected on their attributes with the ContentBitmapIndex.
+    Artifacts missing from the snapshot are set to None.
+    """
+
+    def __init__(
+            self,
+            directory: str,
+            version: str
+    ):
+        """
+        Load the artifacts of a snapshot
+        :param directory: string valued path to snapshot directory
+        :param version: version of the snapshot
+        """
+        self.directory = directory
+        self.version = version
+        self.content_embeddings = self.load(
+            "content_text_vec", lambda path: Artifacts.load_vector_frame(
+                path=path, mmap=False))
+        self.content_attributes = self.load(
+            "content_cat.parquet", Artifacts.load_table)
+        self.users = self.load("users.parquet", Artifacts.load_table)
+        self.user_interaction = self.load(
+            "user_interaction.parquet", Artifacts.load_table)
+        self.user_genres = self.load(
+            "user_genres.parquet", Artifacts.load_table)
+        self.trending = self.load("trending.parquet", Artifacts.load_table)
+        self.user_language = self.load("complete_user_info.pkl", read_pickle)
+        self.user_ids = self.load(
+            "ids/user_ids.parquet", lambda path: IdDictionary(path=path))
+        self.post_ids = self.load(
+            "ids/post_ids.parquet", lambda path: IdDictionary(path=path))
+
+        self.interaction_index = None
+        if self.user_interaction is not None:
+            self.interaction_index = UserInteractionIndex(
+                user_interaction=self.user_interaction)
+        self.cluster_index = None
+        self.content_index = None
+        if self.content_attributes is not None:
+            self.content_index = ContentBitmapIndex(
+                content_attributes=self.content_attributes)
+            self.content_attributes = self.content_attributes.sort_values(
+                by=CLUSTER, kind="stable").reset_index(drop=True)
+            self.cluster_index = Index(self.content_attributes[CLUSTER])
+
+    def load(
+            self,
+            name: str,
+            loader
+    ):
+        """
+        Load an artifact of the snapshot, if present
+        :param name: path to the artifact within the snapshot
+        :param loader: callable loading the artifact from its path
+        :return: the loaded artifact, None if not present
+        """
+        path = os.path.join(self.directory, name)
+        return loader(path) if os.path.exists(path) else None
+
+    @staticmethod
+    def get_slice(
+            data: DataFrame,
+            index: Index,
+            key
+    ) -> DataFrame:
+        """
+        Return the records of a sorted dataframe holding a key
+        :param data: dataframe object pandas sorted by the key
+        :param index: sorted index of the key attribute
+        :param key: value of the key
+        :return: dataframe object pandas
+        """
+        start = index.searchsorted(key, side="left")
+        stop = index.searchsorted(key, side="right")
+        return data.iloc[start:stop].reset_index(drop=True)
+
+    def get_cluster_contents(
+            self,
+            clusters: list
+    ) -> DataFrame:
+        """
+        Return the content attributes of the contents
+        belonging to a list of clusters
+        :param clusters: list of clusters shortlisted
+        :return: dataframe object pandas
+        """
+        return concat(
+            [self.get_slice(data=self.content_attributes,
+                            index=self.cluster_index, key=cluster)
+             for cluster in clusters] or [self.content_attributes.iloc[:0]],
+            ignore_index=True)
+
+
+class ArtifactStore:
+    """
+    Process-wide store of the recommendation artifacts, serving
+    in-memory views of the latest published snapshot so that the
+    recommendations never read from disk. The offline procedures
+    prepare the artifacts in the data directory, and publish them
+    as an immutable, versioned snapshot once they are complete.
+    A background thread watches for newly published versions,
+    loads them while the current snapshot keeps being served, and
+    swaps them in with a single assignment, so that a snapshot is
+    never served before being completely loaded. Requests should
+    fetch the snapshot once, to work on a consistent view.
+    """
+
+    instance = None
+    lock = threading.Lock()
+
+    def __init__(
+            self,
+            snapshot_dir: str = ARTIFACT_SNAPSHOT_DIR,
+            poll_interval: float = ARTIFACT_STORE_POLL_INTERVAL
+    ):
+        """
+        Initialize data members of the class
+        :param snapshot_dir: string valued path to the directory
+        of the published snapshots
+        :param poll_interval: number of seconds between two
+        checks for a newly published version
+        """
+        self.snapshot_dir = os.path.abspath(snapshot_dir)
+        self.poll_interval = poll_interval
+        self.snapshot = None
+        self.error = None
+        self.models = {}
+        self.model_lock = threading.Lock()
+        self.stopped = threading.Event()
+        self.thread = None
+
+    @staticmethod
+    def get_instance():
+        """
+        Return the store of the process, started on first use
+        :return: artifact store object
+        """
+        if ArtifactStore.instance is None:
+            with ArtifactStore.lock:
+                if ArtifactStore.instance is None:
+                    store = ArtifactStore()
+                    store.start()
+                    ArtifactStore.instance = store
+        return ArtifactStore.instance
+
+    @staticmethod
+    def reset():
+        """
+        Stop and discard the store of the process, so that the
+        next use starts a new store, e.g. from another directory
+        :return: None, updates the class
+        """
+        with ArtifactStore.lock:
+            if ArtifactStore.instance is not None:
+                ArtifactStore.instance.stop()
+            ArtifactStore.instance = None
+
+    @staticmethod
+    def get_published_version(snapshot_dir: str) -> str:
+        """
+        Return the latest published version
+        :param snapshot_dir: string valued path to the directory
+        of the published snapshots
+        :return: version, None if no snapshot was published
+        """
+        path = os.path.join(snapshot_dir, "LATEST.json")
+        if not os.path.exists(path):
+            return None
+        with open(path) as json_file:
+            return json.load(json_file)["version"]
+
+    @staticmethod
+    def link_artifact(
+            source: str,
+            destination: str
+    ):
+        """
+        Hard link a file, or all the files of a directory, falling
+        back to copies where hard links are not supported. Since
+        the artifacts are saved by replacing their files, the
+        linked files are never modified afterwards
+        :param source: string valued path to file or directory
+        :param destination: string valued path to create
+        :return: None, the artifact is linked in directory
+        """
+        files = [(source, destination)] if os.path.isfile(source) else \
+            [(os.path.join(root, name),
+              os.path.join(destination, os.path.relpath(root, source), name))
+             for root, _, names in os.walk(source) for name in names]
+        for source_file, destination_file in files:
+            os.makedirs(os.path.dirname(destination_file), exist_ok=True)
+            try:
+                os.link(source_file, destination_file)
+            except OSError:
+                shutil.copy2(source_file, destination_file)
+
+    @staticmethod
+    def publish(
+            data_dir: str = "data",
+            snapshot_dir: str = ARTIFACT_SNAPSHOT_DIR,
+            keep: int = ARTIFACT_SNAPSHOT_KEEP
+    ) -> str:
+        """
+        Publish the artifacts prepared in the data directory, along
+        with the id dictionaries, as a new snapshot. The snapshot is
+        assembled under a temporary name, and the latest version is
+        only updated once it is complete
+        :param data_dir: string valued path to the directory the
+        artifacts are prepared in
+        :param snapshot_dir: string valued path to the directory
+        of the published snapshots
+        :param keep: number of most recent snapshots kept
+        :return: the published version
+        """
+        version = datetime.now(timezone.utc).strftime("%Y%m%dT%H%M%S%fZ")
+        staging = os.path.join(snapshot_dir, version + ".tmp")
+        artifacts = [(os.path.join(data_dir, name), name)
+                     for name in RECSYS_ARTIFACTS] + \
+                    [(path, os.path.join("ids", os.path.basename(path)))
+                     for path in [USER_IDS_PATH, POST_IDS_PATH]]
+        for source, name in artifacts:
+            if os.path.exists(source):
+                ArtifactStore.link_artifact(
+                    source=source,
+                    destination=os.path.join(staging, name))
+        os.makedirs(staging, exist_ok=True)
+        os.replace(staging, os.path.join(snapshot_dir, version))
+
+        latest = os.path.join(snapshot_dir, "LATEST.json")
+        with open(latest + ".tmp", "w") as json_file:
+            json.dump({"version": version}, json_file)
+        os.replace(latest + ".tmp", latest)
+
+        # Removing the older snapshots, the files still
+        # in use by running stores remain readable
+        versions = sorted(name for name in os.listdir(snapshot_dir)
+                          if os.path.isdir(os.path.join(snapshot_dir, name))
+                          and not name.endswith(".tmp"))
+        for name in versions[:-keep]:
+            shutil.rmtree(os.path.join(snapshot_dir, name),
+                          ignore_errors=True)
+        return version
+
+    def refresh(self) -> bool:
+        """
+        Load the latest published snapshot, if newer than
+        the one served, and swap it in
+        :return: boolean indicator, if True, a new
+        snapshot is served else not
+        """
+        version = self.get_published_version(snapshot_dir=self.snapshot_dir)
+        if version is None or (self.snapshot is not None and
+                               self.snapshot.version == version):
+            return False
+        self.snapshot = ArtifactSnapshot(
+            directory=os.path.join(self.snapshot_dir, version),
+            version=version)
+        return True
+
+    def watch(self):
+        """
+        Check for newly published snapshots until stopped.
+        If a snapshot fails to load, the current one keeps
+        being served and the error is kept
+        :return: None, updates the data members of the class
+        """
+        while not self.stopped.wait(self.poll_interval):
+            try:
+                self.refresh()
+                self.error = None
+            except Exception as exception:
+                self.error = exception
+
+    def start(self):
+        """
+        Load the latest published snapshot and start
+        watching for new ones in a background thread
+        :return: None, updates the data members of the class
+        """
+        self.refresh()
+        self.thread = threading.Thread(
+            target=self.watch, name="artifact-store", daemon=True)
+        self.thread.start()
+
+    def stop(self):
+        """
+        Stop watching for new snapshots
+        :return: None, updates the data members of the class
+        """
+        self.stopped.set()
+        if self.thread is not None:
+            self.thread.join()
+
+    def get_snapshot(self) -> ArtifactSnapshot:
+        """
+        Return the snapshot currently served
+        :return: artifact snapshot object
+        """
+        snapshot = self.snapshot
+        if snapshot is None:
+            raise FileNotFoundError(
+                "No artifact snapshot published in " + self.snapshot_dir)
+        return snapshot
+
+    def get_model(
+            self,
+            path: str,
+            loader
+    ):
+        """
+        Return a model, loaded once per process
+        :param path: string valued path to the saved model
+        :param loader: callable loading the model from its path
+        :return: the loaded model
+        """
+        path = os.path.abspath(path)
+        if path not in self.models:
+            with self.model_lock:
+                if path not in self.models:
+                    self.models[path] = loader(path)
+        return self.models[path]
@@ -1,10 +1,32 @@
 import os
-from pandas import read_pickle, DataFrame
-import tensorflow as tf
+from pandas import DataFrame
 from FeedRecommender.common.config import USER_CONTENT_MODEL_NAME
-from FeedRecommender.common.constants import CLUSTER, USER_ID
+from FeedRecommender.common.constants import CLUSTER, USER_ID, POST_ID
+from FeedRecommender.common.id_dictionary import IdDictionary
+from FeedRecommender.recsys.artifact_store import ArtifactStore, \
+    ArtifactSnapshot
+from FeedRecommender.recsys.dense_model import DenseModel
 
 class FetchData:
+    """
+    Fetch the results prepared for the recommendations. All
+    the results are keyed by the integer codes of the user_ids
+    and post_ids, the string valued ids being translated only
+    when entering or leaving the recommender, using get_user_code
+    and get_external_ids. The results are served from the
+    in-memory snapshot of the process-wide ArtifactStore, and
+    are shared by all the requests, hence must not be modified
+    """
+
+    @staticmethod
+    def get_snapshot() -> ArtifactSnapshot:
+        """
+        Return the snapshot of the results currently served.
+        A request fetching several results should fetch the
+        snapshot once, to work on a consistent version
+        :return: artifact snapshot object
+        """
+        return ArtifactStore.get_instance().get_snapshot()
 
     @staticmethod
     def get_content_embeddings():
@@ -12,7 +34,7 @@ class FetchData:
         Return the content text embeddings attributes
         :return: dataframe object pandas
         """
-        return read_pickle("data/content_text_vec.pkl")
+        return FetchData.get_snapshot().content_embeddings
 
     @staticmethod
     def get_content_attributes():
@@ -20,7 +42,7 @@ class FetchData:
         Get the complete set of content categorical attributes
         :return: dataframe object pandas
         """
-        return read_pickle("data/content_cat.pkl")
+        return FetchData.get_snapshot().content_attributes
 
     @staticmethod
     def get_user_attributes():
@@ -28,7 +50,7 @@ class FetchData:
         Get the complete set of user attributes
         :return: dataframe object pandas
         """
-        return read_pickle("data/users.pkl")
+        return FetchData.get_snapshot().users
 
     @staticmethod
     def get_user_language():
@@ -36,7 +58,7 @@ class FetchData:
         Return the user language preferences data
         :return: dataframe object pandas
         """
-        return read_pickle("data/complete_user_info.pkl")
+        return FetchData.get_snapshot().user_language
 
     @staticmethod
     def get_user_interaction():
@@ -44,7 +66,7 @@ class FetchData:
         Return the user-content interaction data
         :return: dataframe object pandas
         """
-        return read_pickle("data/user_interaction.pkl")
+        return FetchData.get_snapshot().user_interaction
 
     @staticmethod
     def get_user_genres():
@@ -52,7 +74,7 @@ class FetchData:
         Return the genre preferences of all the users
         :return: dataframe object pandas
         """
-        return read_pickle("data/user_genres.pkl")
+        return FetchData.get_snapshot().user_genres
 
     @staticmethod
     def get_trending():
@@ -61,17 +83,20 @@ class FetchData:
         order of trending scores
         :return: dataframe object pandas
         """
-        return read_pickle("data/trending.pkl")
+        return FetchData.get_snapshot().trending
 
     @staticmethod
     def get_user_content_cluster_model():
         """
-        Load multi-label classification neural model
-        :return: saved model
+        Return multi-label classification neural model, loaded
+        once per process from the weights exported with
+        DenseModel.export, without depending on TensorFlow
+        :return: dense model object, see DenseModel.predict
         """
-        return tf.keras.models.\
-            load_model(os.getcwd() + "/../user/model/" +
-                       USER_CONTENT_MODEL_NAME)
+        return ArtifactStore.get_instance().get_model(
+            path=os.getcwd() + "/../user/model/" +
+            USER_CONTENT_MODEL_NAME + ".npz",
+            loader=DenseModel)
 
     @staticmethod
     def get_contents_for_cluster(
@@ -89,17 +114,111 @@ class FetchData:
             contents[CLUSTER].isin(clusters)].\
             reset_index(drop=True)
 
+    @staticmethod
+    def get_user_ids():
+        """
+        Return the dictionary of user_ids
+        :return: id dictionary object
+        """
+        return FetchData.get_snapshot().user_ids
+
+    @staticmethod
+    def get_post_ids():
+        """
+        Return the dictionary of post_ids
+        :return: id dictionary object
+        """
+        return FetchData.get_snapshot().post_ids
+
+    @staticmethod
+    def get_user_code(
+            user_id: str,
+            user_ids: IdDictionary = None
+    ) -> int:
+        """
+        Translate the user_id of a request to its integer code
+        :param user_id: string value for user id
+        :param user_ids: optional already loaded dictionary
+        of user_ids
+        :return: integer code, -1 for unknown users
+        """
+        if user_ids is None:
+            user_ids = FetchData.get_user_ids()
+        return int(user_ids.encode(values=[user_id], add=False)[0])
+
+    @staticmethod
+    def get_external_ids(
+            result: DataFrame,
+            post_ids: IdDictionary = None,
+            user_ids: IdDictionary = None
+    ) -> DataFrame:
+        """
+        Translate the post_id and user_id codes of a
+        recommendation result back to their string values
+        :param result: dataframe object pandas
+        :param post_ids: optional already loaded dictionary
+        of post_ids
+        :param user_ids: optional already loaded dictionary
+        of user_ids
+        :return: dataframe object pandas
+        """
+        result = result.copy()
+        if POST_ID in result.columns:
+            if post_ids is None:
+                post_ids = FetchData.get_post_ids()
+            result[POST_ID] = post_ids.decode(codes=result[POST_ID])
+        if USER_ID in result.columns:
+            if user_ids is None:
+                user_ids = FetchData.get_user_ids()
+            result[USER_ID] = user_ids.decode(codes=result[USER_ID])
+        return result
+
     @staticmethod
     def get_previously_viewed(
-            user_interaction: DataFrame,
-            user_id: str
+            user_id: int,
+            count: int = None
     ) -> DataFrame:
         """
-        Return the contents previously viewed by a user
-        :param user_interaction: dataframe object pandas
-        :param user_id: string value for user id
+        Return the contents previously viewed by a user, most
+        recent first, looked up in the interaction index of the
+        snapshot. Use count to only keep the most recent contents,
+        e.g. MOST_RECENT_HISTORY_COUNT or RECSYS_HISTORY_CAP
+        :param user_id: integer code of the user id,
+        see get_user_code
+        :param count: maximum number of contents returned,
+        None for the complete history
         :return: dataframe object pandas
         """
-        return user_interaction[
-            user_interaction[USER_ID] == user_id].\
-            reset_index(drop=True)
+        return FetchData.get_snapshot().interaction_index.get_frame(
+            user_id=user_id, count=count)
+
+    @staticmethod
+    def get_cluster_contents(clusters: list) -> DataFrame:
+        """
+        For a given list of clusters, return the contents belonging
+        to those clusters, looked up in the content attributes of
+        the snapshot sorted by cluster
+        :param clusters: list of clusters shortlisted
+        :return: dataframe object pandas
+        """
+        return FetchData.get_snapshot().get_cluster_contents(
+            clusters=clusters)
+
+    @staticmethod
+    def get_candidate_posts(
+            include: dict,
+            exclude_posts=None
+    ):
+        """
+        Return the contents holding, for every attribute of include,
+        any of its values, excluding a set of contents, computed on
+        the bitmap index of the snapshot. For instance the contents
+        of some clusters, in the languages of a user and not viewed
+        {CLUSTER: clusters, ML_LANGUAGE: languages}, viewed posts
+        :param include: dict mapping the attributes of
+        CONTENT_INDEX_ATTRIBUTES to lists of values
+        :param exclude_posts: optional array of post codes
+        :return: array of post codes
+        """
+        return FetchData.get_snapshot().content_index.select(
+            include=include, exclude_posts=exclude_posts)
@@ -0,0 +1,131 @@
+from numpy import asarray, bitwise_or, int64, ndarray, ones, packbits, \
+    unpackbits, zeros, uint8
+from pandas import DataFrame, factorize
+from FeedRecommender.common.binarize import GroupBinarizer
+from FeedRecommender.common.constants import POST_ID, CLUSTER, \
+    ML_INTERESTS, ML_LANGUAGE, SOURCE, TEXT_LANGUAGE
+
+CONTENT_INDEX_ATTRIBUTES = [CLUSTER, ML_INTERESTS, ML_LANGUAGE,
+                            SOURCE, TEXT_LANGUAGE]
+
+
+class ContentBitmapIndex:
+    """
+    Bitmap index of the categorical content attributes. Every
+    post code is given a position, and every value of an indexed
+    attribute a bitset of the posts holding it, packed eight posts
+    per byte. Candidate sets, e.g. the contents of some clusters,
+    in the languages of a user and not yet viewed, are computed as
+    bitwise intersections, unions and differences of the bitsets
+    instead of scans of the content attributes.
+    """
+
+    def __init__(
+            self,
+            content_attributes: DataFrame,
+            attributes: list = None
+    ):
+        """
+        Build the bitsets of every value of the indexed attributes
+        :param content_attributes: dataframe object pandas of the
+        exploded content attributes, keyed by post code
+        :param attributes: list of attributes to index,
+        CONTENT_INDEX_ATTRIBUTES by default
+        """
+        if attributes is None:
+            attributes = CONTENT_INDEX_ATTRIBUTES
+        positions, self.posts = factorize(content_attributes[POST_ID],
+                                          sort=True)
+        self.posts = asarray(self.posts)
+        self.bitmaps = {}
+        for attribute in attributes:
+            codes, values = factorize(content_attributes[attribute])
+            bits = GroupBinarizer.from_pairs(
+                group_codes=codes, column_codes=positions,
+                shape=(len(values), len(self.posts)))
+            bitmaps = packbits(bits, axis=1)
+            self.bitmaps[attribute] = {
+                value: bitmaps[index]
+                for index, value in enumerate(asarray(values).tolist())}
+
+    def get_all(self) -> ndarray:
+        """
+        Return the bitset of all the contents
+        :return: packed uint8 array
+        """
+        return packbits(ones(len(self.posts), dtype=uint8))
+
+    def get_empty(self) -> ndarray:
+        """
+        Return the empty bitset
+        :return: packed uint8 array
+        """
+        return zeros((len(self.posts) + 7) // 8, dtype=uint8)
+
+    def get_bitmap(
+            self,
+            attribute: str,
+            values: list
+    ) -> ndarray:
+        """
+        Return the bitset of the contents holding any of the
+        values of an attribute. Unknown values are ignored
+        :param attribute: name of an indexed attribute
+        :param values: list of values of the attribute
+        :return: packed uint8 array
+        """
+        bitmap = self.get_empty()
+        for value in values:
+            if value in self.bitmaps[attribute]:
+                bitwise_or(bitmap, self.bitmaps[attribute][value],
+                           out=bitmap)
+        return bitmap
+
+    def from_posts(
+            self,
+            post_codes
+    ) -> ndarray:
+        """
+        Return the bitset of a set of contents, such as the
+        contents viewed by a user. Unknown posts are ignored
+        :param post_codes: array of post codes
+        :return: packed uint8 array
+        """
+        post_codes = asarray(post_codes, dtype=int64)
+        positions = self.posts.searchsorted(post_codes)
+        known = positions < len(self.posts)
+        known[known] = self.posts[positions[known]] == post_codes[known]
+        bits = zeros(len(self.posts), dtype=uint8)
+        bits[positions[known]] = 1
+        return packbits(bits)
+
+    def to_posts(self, bitmap: ndarray) -> ndarray:
+        """
+        Return the post codes of the contents of a bitset
+        :param bitmap: packed uint8 array
+        :return: array of post codes, in increasing order
+        """
+        return self.posts[unpackbits(
+            bitmap, count=len(self.posts)).nonzero()[0]]
+
+    def select(
+            self,
+            include: dict,
+            exclude_posts=None
+    ) -> ndarray:
+        """
+        Return the contents holding, for every attribute of
+        include, any of its values, e.g. any of some clusters
+        and any of the languages of a user, excluding a set
+        of contents, e.g. the contents viewed by the user
+        :param include: dict mapping indexed attributes to
+        lists of values
+        :param exclude_posts: optional array of post codes
+        :return: array of post codes, in increasing order
+        """
+        bitmap = self.get_all()
+        for attribute, values in include.items():
+            bitmap &= self.get_bitmap(attribute=attribute, values=values)
+        if exclude_posts is not None:
+            bitmap &= ~self.from_posts(post_codes=exclude_posts)
+        return self.to_posts(bitmap=bitmap)
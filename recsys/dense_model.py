@@ -0,0 +1,155 @@
+import argparse
+import os
+from numpy import asarray, float32, load, maximum, savez, tanh, \
+    zeros, concatenate, ndarray
+from scipy.special import expit, softmax
+from FeedRecommender.common.config import USER_CONTENT_MODEL_NAME
+
+ACTIVATIONS = {
+    "linear": lambda x: x,
+    "relu": lambda x: maximum(x, 0, out=x),
+    "sigmoid": lambda x: expit(x, out=x),
+    "tanh": lambda x: tanh(x, out=x),
+    "softmax": lambda x: softmax(x, axis=1)
+}
+
+# Layers without effect at inference time
+PASSTHROUGH_LAYERS = ["InputLayer", "Dropout"]
+
+
+class DenseModel:
+    """
+    TensorFlow-free inference engine for the user-content cluster
+    classifier, a sequential stack of fully connected layers. The
+    weights of the Keras model are exported once to a compact .npz
+    file, using export, and the forward pass is computed with
+    float32 matrix products on batches of records, reproducing the
+    predictions of the Keras model, so that the recommender neither
+    imports TensorFlow nor keeps its runtime in memory.
+    """
+
+    def __init__(
+            self,
+            path: str
+    ):
+        """
+        Load the weights of an exported model
+        :param path: string valued path to .npz file
+        """
+        with load(path) as weights:
+            activations = weights["activations"].tolist()
+            self.layers = [(weights["kernel_{}".format(index)],
+                            weights["bias_{}".format(index)],
+                            activation)
+                           for index, activation in enumerate(activations)]
+
+    @staticmethod
+    def get_layers(model) -> list:
+        """
+        Extract the weights and activations of the fully
+        connected layers of a Keras sequential model
+        :param model: Keras model object
+        :return: list of tuples of the kernel, bias and
+        activation of every layer
+        """
+        layers = []
+        for layer in model.layers:
+            layer_type = type(layer).__name__
+            if layer_type in PASSTHROUGH_LAYERS:
+                continue
+            config = layer.get_config()
+            if layer_type != "Dense" or \
+                    config["activation"] not in ACTIVATIONS:
+                raise ValueError("Unsupported layer {} ({}, {})".format(
+                    layer.name, layer_type, config.get("activation")))
+            weights = layer.get_weights()
+            kernel = asarray(weights[0], dtype=float32)
+            bias = asarray(weights[1], dtype=float32) \
+                if config.get("use_bias", True) \
+                else zeros(kernel.shape[1], dtype=float32)
+            layers.append((kernel, bias, config["activation"]))
+        return layers
+
+    @staticmethod
+    def save(
+            layers: list,
+            path: str
+    ):
+        """
+        Atomically save the weights of a model
+        :param layers: list of tuples of the kernel, bias and
+        activation of every layer
+        :param path: string valued path to .npz file
+        :return: None, the weights are saved in directory
+        """
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        weights = {"activations": asarray(
+            [activation for _, _, activation in layers])}
+        for index, (kernel, bias, _) in enumerate(layers):
+            weights["kernel_{}".format(index)] = kernel
+            weights["bias_{}".format(index)] = bias
+        with open(path + ".tmp", "wb") as npz_file:
+            savez(npz_file, **weights)
+        os.replace(path + ".tmp", path)
+
+    @staticmethod
+    def export(
+            model_path: str,
+            path: str
+    ):
+        """
+        Export the weights of a saved Keras model.
+        Only the export depends on TensorFlow
+        :param model_path: string valued path to saved model
+        :param path: string valued path to .npz file
+        :return: None, the weights are saved in directory
+        """
+        import tensorflow as tf
+
+        DenseModel.save(
+            layers=DenseModel.get_layers(
+                model=tf.keras.models.load_model(model_path)),
+            path=path)
+
+    def predict(
+            self,
+            X,
+            batch_size: int = 4096
+    ) -> ndarray:
+        """
+        Compute the cluster probabilities of the records,
+        as the predict method of the Keras model
+        :param X: dataframe object pandas or array of the input
+        attributes, in the order the model was trained on
+        :param batch_size: number of records per batch
+        :return: float32 array with one row per record
+        """
+        X = asarray(X, dtype=float32)
+        if X.ndim == 1:
+            X = X.reshape(1, -1)
+        batches = []
+        for start in range(0, len(X), batch_size):
+            output = X[start:start + batch_size]
+            for kernel, bias, activation in self.layers:
+                output = output @ kernel
+                output += bias
+                output = ACTIVATIONS[activation](output)
+            batches.append(output)
+        if not batches:
+            return zeros((0, self.layers[-1][0].shape[1]), dtype=float32)
+        return concatenate(batches) if len(batches) > 1 else batches[0]
+
+
+if __name__ == '__main__':
+    model_dir = os.getcwd() + "/../user/model/"
+    parser = argparse.ArgumentParser(
+        description="Export the weights of the user-content "
+                    "cluster classifier")
+    parser.add_argument("--model", default=model_dir +
+                        USER_CONTENT_MODEL_NAME,
+                        help="path to the saved Keras model")
+    parser.add_argument("--output", default=model_dir +
+                        USER_CONTENT_MODEL_NAME + ".npz",
+                        help="path to the exported weights")
+    arguments = parser.parse_args()
+    DenseModel.export(model_path=arguments.model, path=arguments.output)
@@ -1,6 +1,7 @@
 from FeedRecommender.common.constants import REACTIONS, \
     TOTAL_VIEWS, AGE, SCORES
-from FeedRecommender.recsys.common import FetchData
+from FeedRecommender.common.artifacts import Artifacts
+from FeedRecommender.common.instrumentation import RunReport
 from pandas import DataFrame, merge
 
 class GetTrendingScores:
@@ -40,6 +41,7 @@ class GetTrendingScores:
         return contents
 
     @staticmethod
+    @RunReport.instrument
     def controller(save_results: bool = False):
         """
         Driver function to generate trending scores for
@@ -49,12 +51,15 @@ class GetTrendingScores:
         directory else not
         :return: None, the result is saved in directory
         """
-        log = FetchData.get_user_interaction()
+        log = Artifacts.load_table(path="data/user_interaction.parquet")
+        RunReport.set_rows(rows_in=len(log))
         total_views = GetTrendingScores.get_total_views(user_interaction=log)
         age = GetTrendingScores.get_age(user_interaction=log)
         content_stats = merge(total_views, age, on=REACTIONS)
         content_stats = GetTrendingScores.get_trending_score(contents=content_stats)
         content_stats = content_stats.sort_values(by=SCORES, ascending=False).\
             reset_index(drop=True)
+        RunReport.set_rows(rows_out=len(content_stats))
         if save_results:
-            content_stats.to_pickle("data/trending.pkl")
+            Artifacts.save_table(data=content_stats,
+                                 path="data/trending.parquet")
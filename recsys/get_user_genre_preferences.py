@@ -1,5 +1,6 @@
 from FeedRecommender.common.constants import USER_ID, ML_INTERESTS, ID, GENRE_PREFERENCES
-from FeedRecommender.recsys.common import FetchData
+from FeedRecommender.common.artifacts import Artifacts
+from FeedRecommender.common.instrumentation import RunReport
 from pandas import DataFrame
 
 class GetUserGenrePreferences:
@@ -8,7 +9,7 @@ class GetUserGenrePreferences:
         """
         Initialize data member of the class
         """
-        self.users = FetchData.get_user_attributes()
+        self.users = Artifacts.load_table(path="data/users.parquet")
 
     def get_genre_specific_attributes(self):
         """
@@ -74,6 +75,7 @@ class GetUserGenrePreferences:
         user_genres[GENRE_PREFERENCES] = genre_preferences
         return user_genres[[USER_ID, GENRE_PREFERENCES]]
 
+    @RunReport.instrument
     def controller(
             self,
             save_result: bool = False
@@ -84,10 +86,13 @@ class GetUserGenrePreferences:
         If true, save the results in directory else not
         :return: None, the results are saved in directory
         """
+        RunReport.set_rows(rows_in=len(self.users))
         genres = self.get_genre_specific_attributes()
         user_genres = self.get_user_genres(genres=genres)
         user_genres = self.format_encoding(user_genres=user_genres)
         genre_preferences = self.get_genre_preferences(user_genres=user_genres)
+        RunReport.set_rows(rows_out=len(genre_preferences))
 
         if save_result:
-            genre_preferences.to_pickle("data/user_genres.pkl")
+            Artifacts.save_table(data=genre_preferences,
+                                 path="data/user_genres.parquet")
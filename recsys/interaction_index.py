@@ -0,0 +1,104 @@
+from numpy import bincount, concatenate, cumsum, full, int32, int64, \
+    ndarray, zeros
+from pandas import DataFrame
+from FeedRecommender.common.config import MOST_RECENT_HISTORY_COUNT, \
+    RECSYS_HISTORY_CAP
+from FeedRecommender.common.constants import USER_ID, REACTIONS
+
+
+class UserInteractionIndex:
+    """
+    Index of the contents viewed by every user, in compressed
+    sparse row form. The post codes viewed by the users are stored
+    in a single array, grouped by user code and ordered from the
+    most to the least recent, and the history of user u spans from
+    offsets[u] to offsets[u + 1]. As for the trending scores, the
+    interactions are assumed to be recorded in chronological order,
+    i.e. the later a record in the log, the more recent. Looking up
+    the history of a user, or its most recent part, only depends
+    on the length of the history, not on the size of the log.
+    """
+
+    def __init__(
+            self,
+            user_interaction: DataFrame
+    ):
+        """
+        Build the index of the user-content interactions
+        :param user_interaction: dataframe object pandas of the
+        user_id and reactions codes, in chronological order.
+        Records of unknown users, coded -1, are ignored
+        """
+        users = user_interaction[USER_ID].to_numpy(dtype=int64)[::-1]
+        posts = user_interaction[REACTIONS].to_numpy(dtype=int32)[::-1]
+        known = users >= 0
+        users, posts = users[known], posts[known]
+        # The stable sort of the reversed log keeps the
+        # records of every user from the most recent
+        order = users.argsort(kind="stable")
+        self.posts = posts[order]
+        self.offsets = concatenate([
+            zeros(1, dtype=int64),
+            cumsum(bincount(users), dtype=int64)])
+
+    def get_history(
+            self,
+            user_id: int,
+            count: int = None
+    ) -> ndarray:
+        """
+        Return the post codes viewed by a user, most recent first
+        :param user_id: integer code of the user id
+        :param count: maximum number of posts returned,
+        None for the complete history
+        :return: array of post codes, empty for unknown users
+        """
+        if user_id < 0 or user_id + 1 >= len(self.offsets):
+            return self.posts[:0]
+        start, stop = self.offsets[user_id], self.offsets[user_id + 1]
+        if count is not None:
+            stop = min(stop, start + count)
+        return self.posts[start:stop]
+
+    def get_most_recent(
+            self,
+            user_id: int,
+            count: int = MOST_RECENT_HISTORY_COUNT
+    ) -> ndarray:
+        """
+        Return the most recent post codes viewed by a user
+        :param user_id: integer code of the user id
+        :param count: number of most recent posts
+        :return: array of post codes, most recent first
+        """
+        return self.get_history(user_id=user_id, count=count)
+
+    def get_capped_history(
+            self,
+            user_id: int,
+            upper_cap: int = RECSYS_HISTORY_CAP
+    ) -> ndarray:
+        """
+        Return the history of a user, limited to the maximum
+        number of history based recommendations
+        :param user_id: integer code of the user id
+        :param upper_cap: maximum number of posts
+        :return: array of post codes, most recent first
+        """
+        return self.get_history(user_id=user_id, count=upper_cap)
+
+    def get_frame(
+            self,
+            user_id: int,
+            count: int = None
+    ) -> DataFrame:
+        """
+        Return the history of a user as interaction records
+        :param user_id: integer code of the user id
+        :param count: maximum number of records returned,
+        None for the complete history
+        :return: dataframe object pandas, most recent first
+        """
+        posts = self.get_history(user_id=user_id, count=count)
+        return DataFrame({USER_ID: full(len(posts), user_id, dtype=int32),
+                          REACTIONS: posts})
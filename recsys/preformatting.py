@@ -1,7 +1,9 @@
 import os
-from pandas import DataFrame, read_pickle
+from pandas import DataFrame
+from FeedRecommender.common.artifacts import Artifacts
 from FeedRecommender.common.constants import POST_ID, ML_LANGUAGE, \
     ML_INTERESTS, SOURCE, TEXT_LANGUAGE, CLUSTER
+from FeedRecommender.common.instrumentation import RunReport
 
 class PreFormatting:
     """
@@ -28,14 +30,14 @@ class PreFormatting:
     controller function of this class:
 
     if __name__ == '__main__':
-    content_vectors = read_pickle(
-    os.getcwd() + "/../content/intermediates/all_data_vectors.pkl")
-    content_clusters = read_pickle(
-    os.getcwd() + "/../content/intermediates/all_cluster_labels.pkl")
-    user_vectors = read_pickle(
-    os.getcwd() + "/../user/intermediates/input_features.pkl")
-    user_interaction = read_pickle(
-    os.getcwd() + "/../user/intermediates/user_interaction.pkl"
+    content_vectors = Artifacts.load_vector_frame(
+    os.getcwd() + "/../content/intermediates/all_data_vectors")
+    content_clusters = Artifacts.load_table(
+    os.getcwd() + "/../content/intermediates/all_cluster_labels.parquet")
+    user_vectors = Artifacts.load_table(
+    os.getcwd() + "/../user/intermediates/input_features.parquet")
+    user_interaction = Artifacts.load_table(
+    os.getcwd() + "/../user/intermediates/user_interaction.parquet"
     )
     pf = PreFormatting(
         content_vectors=content_vectors,
@@ -112,14 +114,19 @@ class PreFormatting:
         reference during recommendation
         :return: None, the results are saved in the directory
         """
-        self.content_clusters.to_pickle("data/content_cat.pkl")
-        self.content_vectors.to_pickle("data/content_text_vec.pkl")
-        self.user_vectors.to_pickle("data/users.pkl")
-        self.user_interaction.to_pickle("data/user_interaction.pkl")
+        Artifacts.save_table(data=self.content_clusters,
+                             path="data/content_cat.parquet")
+        Artifacts.save_vectors(data=self.content_vectors,
+                               path="data/content_text_vec")
+        Artifacts.save_table(data=self.user_vectors,
+                             path="data/users.parquet")
+        Artifacts.save_table(data=self.user_interaction,
+                             path="data/user_interaction.parquet")
 
     def get_user_features(self):
         pass
 
+    @RunReport.instrument
     def controller(self):
         """
         Driver function to process and save content and user
@@ -127,9 +134,11 @@ class PreFormatting:
         recommendation results preparation
         :return: None, the results are saved in the directory
         """
+        RunReport.set_rows(rows_in=len(self.content_clusters))
         self.content_vectors = self.content_vectors[
             self.get_content_text_attributes()
         ]
         self.get_content_features()
         self.get_user_features()
         self.save_results()
+        RunReport.set_rows(rows_out=len(self.content_clusters))
@@ -24,8 +24,7 @@ class GetTrendingRecs:
         """
         rec_type = "TRENDING"
 
-        trending[REC_TYPE] = rec_type
-        trending = trending[[POST_ID, REC_TYPE]]
+        trending = trending[[POST_ID]].assign(**{REC_TYPE: rec_type})
 
         # drop the contents already included
         # in the result to avoid duplicates
@@ -1,56 +1,56 @@
-from pandas import read_pickle, get_dummies
+from pandas import read_pickle
+from FeedRecommender.common.binarize import GroupBinarizer
 from FeedRecommender.common.constants import LANGUAGE, USER_ID
+from FeedRecommender.common.id_dictionary import IdDictionary
+from FeedRecommender.common.instrumentation import RunReport
+from FeedRecommender.common.multi_hot import MultiHotEncoder
 
 class FetchUserInfoAttributes:
 
     def __init__(
             self,
-            data_path: str
+            data_path: str,
+            user_ids: IdDictionary = None
     ):
         """
         Fetch required data from path to
         initialize the data members
         :param data_path: string value path to file
+        :param user_ids: optional dictionary of user_ids. If
+        given, the user_ids are translated to their integer codes
         """
         self.data = read_pickle(data_path)
+        self.user_ids = user_ids
 
-    def explode_attribute(
-            self,
-            feature: str
-    ):
+    def encode_user_ids(self):
         """
-        Split dataframe attribute consisting of list values
-        into separate records each with single value
-        :param feature: feature consisting of list values
-        to be split
+        Translate the user_ids to their integer codes, new
+        user_ids being added to the dictionary
         :return: None, updates the data member of the class
         """
-        self.data = self.data.explode(feature).\
-            reset_index(drop=True)
+        if self.user_ids is not None:
+            self.data[USER_ID] = self.user_ids.encode(
+                values=self.data[USER_ID])
 
     def encode_language(self):
         """
-        Generate One-Hot encoded attributes out of a
-        single attribute
+        Multi-hot encode the list valued language attribute
+        and aggregate the records to a single record per user,
+        without exploding the records
         :return: None, updates the data member of the class
         """
-        self.data = get_dummies(
-            data=self.data,
-            columns=[LANGUAGE]
-        )
+        encoder = MultiHotEncoder(features=[LANGUAGE]).fit(data=self.data)
+        self.data = GroupBinarizer.aggregate(
+            keys=self.data[USER_ID],
+            values=encoder.transform(data=self.data),
+            columns=encoder.get_feature_names())
 
+    @RunReport.instrument
     def controller(self):
         """
         Driver function to generate user information attributes
         to be used in downstream user profile creation
         :return: None, updates the data member of the class
         """
-        self.explode_attribute(feature=LANGUAGE)
+        self.encode_user_ids()
         self.encode_language()
-        self.data = self.data.groupby(USER_ID).sum().reset_index()
-        attributes = self.data.columns.tolist()
-        attributes.remove(USER_ID)
-
-        for attribute in attributes:
-            self.data[attribute].values[
-                self.data[attribute].values > 0] = 1
@@ -1,8 +1,13 @@
 import json
-from pandas import DataFrame, read_pickle, set_option, get_dummies
-from FeedRecommender.common.constants import REACTIONS, ML_LANGUAGE, \
-    ML_INTERESTS, SOURCE, TEXT_LANGUAGE, POST_ID, \
-    CONTENT, DESCRIPTION, CAPTION, TITLE, MERGED_TEXTS, CLUSTER
+from pandas import DataFrame, set_option
+from FeedRecommender.common.artifacts import Artifacts
+from FeedRecommender.common.binarize import GroupBinarizer
+from FeedRecommender.common.constants import REACTIONS, \
+    ML_INTERESTS, POST_ID, CLUSTER, USER_ID
+from FeedRecommender.common.id_dictionary import IdDictionary
+from FeedRecommender.common.instrumentation import RunReport
+from FeedRecommender.common.multi_hot import MultiHotEncoder
+from FeedRecommender.user.watermark import InteractionWatermark
 set_option("display.max_columns", None)
 
 class FetchInteractionAttributes:
@@ -10,20 +15,39 @@ class FetchInteractionAttributes:
     def __init__(
             self,
             interaction_path: str,
-            content_path: str
+            content_path: str,
+            user_ids: IdDictionary = None,
+            post_ids: IdDictionary = None,
+            records: list = None
     ):
         """
         Fetch required data from path to
         initialize the data members
         :param interaction_path: string value path to file
         :param content_path: string value path to file
-        """
-        with open(interaction_path) as json_file:
-            self.interaction_data = DataFrame(json.load(json_file))
+        :param user_ids: optional dictionary of user_ids
+        :param post_ids: optional dictionary of post_ids. If
+        both dictionaries are given, the interactions are keyed
+        by integer codes like the content profile
+        :param records: list of already decoded interaction
+        records, used instead of the interaction path if given
+        """
+        if records is None:
+            with open(interaction_path) as json_file:
+                records = json.load(json_file)
+        # Watermark of the events read, see InteractionWatermark
+        self.events = len(records)
+        self.last_event = InteractionWatermark.get_event_hash(
+            record=records[-1]) if records else None
+        self.interaction_data = DataFrame(records)
 
-        self.content_data = read_pickle(content_path)
+        self.content_data = Artifacts.load_table(
+            path=content_path,
+            columns=[POST_ID, ML_INTERESTS, CLUSTER])
         self.clusters = self.content_data[[POST_ID, CLUSTER]]
         self.content_data.drop(columns=[CLUSTER], inplace=True)
+        self.user_ids = user_ids
+        self.post_ids = post_ids
 
     def get_posts(
             self,
@@ -68,20 +92,6 @@ class FetchInteractionAttributes:
             columns=to_drop
         ).reset_index(drop=True)
 
-    def encode_attributes(
-            self,
-            features,
-            data: DataFrame
-    ) -> DataFrame:
-        """
-        Generate One-Hot encoded attributes out of a
-        single attribute
-        :param features: the features to be encoded
-        :param data: dataframe object pandas
-        :return: dataframe object pandas
-        """
-        return get_dummies(data=data, columns=features)
-
     def prepare_interaction_data(self):
         """
         Prepare user-post interaction data attributes
@@ -96,45 +106,32 @@ class FetchInteractionAttributes:
             data=self.interaction_data
         )
 
+        # Translating the ids to their integer codes, new
+        # ids being added to the dictionaries
+        if self.user_ids is not None and self.post_ids is not None:
+            self.interaction_data[USER_ID] = self.user_ids.encode(
+                values=self.interaction_data[USER_ID])
+            self.interaction_data[REACTIONS] = self.post_ids.encode(
+                values=self.interaction_data[REACTIONS])
+
     def prepare_content_data(self):
         """
-        Prepare content information data attributes.
-        The process includes the following sub-procedures:
-        1) Exploding attributes with a list of values in each record
-        2) One-hot encoding categorical attributes
-        3) Aggregating attributes to represent a single record per content
+        Prepare content information data attributes. Only the
+        required attributes are loaded from the content profile,
+        hence no attributes need to be filtered out.
+        The list valued attributes are multi-hot encoded without
+        exploding the records, and aggregated to represent a
+        single record per content
         :return: None, updates the data member of the class
         """
-        self.filter_attributes(
-            to_drop=[CONTENT, DESCRIPTION, CAPTION,
-                     TITLE, MERGED_TEXTS, ML_LANGUAGE,
-                     SOURCE, TEXT_LANGUAGE]
-        )
-
-        #Exploding attributes with a list of values in each record
-        self.content_data = self.explode_attribute(
-            data=self.content_data,
-            feature=ML_INTERESTS,
-            dropna=False
-        )
-
-        #One-hot encoding categorical attributes
-        self.content_data = self.encode_attributes(
-            features=[ML_INTERESTS],
-            data=self.content_data
-        )
-
-        # Aggregating attributes to represent a single
-        # record per content
-        attributes = self.content_data.columns.tolist()
-        attributes.remove(POST_ID)
-        self.content_data = self.content_data.\
-            groupby(POST_ID).sum().reset_index()
-
-        for attribute in attributes:
-            self.content_data[attribute].values[
-                self.content_data[attribute].values > 0] = 1
+        encoder = MultiHotEncoder(
+            features=[ML_INTERESTS]).fit(data=self.content_data)
+        self.content_data = GroupBinarizer.aggregate(
+            keys=self.content_data[POST_ID],
+            values=encoder.transform(data=self.content_data),
+            columns=encoder.get_feature_names())
 
+    @RunReport.instrument
     def controller(self):
         """
         Driver function to generate content information attributes
@@ -142,5 +139,7 @@ class FetchInteractionAttributes:
         to be used in downstream user profile creation
         :return: None, updates the data member of the class
         """
+        RunReport.set_rows(rows_in=len(self.interaction_data))
         self.prepare_interaction_data()
         self.prepare_content_data()
+        RunReport.set_rows(rows_out=len(self.interaction_data))
@@ -1,9 +1,29 @@
+import argparse
 import os
 from typing import Any
-from pandas import read_pickle, DataFrame
+from pandas import DataFrame, concat
+from FeedRecommender.common import id_dictionary
+from FeedRecommender.common.artifacts import Artifacts
+from FeedRecommender.common.config import USER_IDS_PATH, POST_IDS_PATH, \
+    USER_WATERMARK_PATH, USER_PREPARED_WATERMARK_PATH
+from FeedRecommender.common.constants import POST_ID, CLUSTER, USER_ID
+from FeedRecommender.common.id_dictionary import IdDictionary
+from FeedRecommender.common.instrumentation import RunReport
+from FeedRecommender.common.pipeline import PipelineRunner, Stage
+from FeedRecommender.user import fetch_info_attributes, \
+    fetch_interaction_attributes, prepare_feature_set, \
+    partitioned_feature_set, watermark
 from FeedRecommender.user.fetch_info_attributes import FetchUserInfoAttributes
 from FeedRecommender.user.fetch_interaction_attributes import FetchInteractionAttributes
+from FeedRecommender.user.partitioned_feature_set import \
+    PartitionedUserFeatureSet
 from FeedRecommender.user.prepare_feature_set import PrepareUserFeatureSet
+from FeedRecommender.user.watermark import InteractionWatermark
+
+USER_INFO_PATH = "../data/complete_user_info.pkl"
+USER_INTERACTION_PATH = "../data/raw/user_post_interaction.json"
+CONTENT_CLUSTERS_PATH = "../content/intermediates/all_cluster_labels.parquet"
+
 
 class userProfile:
     """
@@ -14,33 +34,52 @@ class userProfile:
     main function:
     if __name__ == '__main__':
         user_profile = userProfile.create_profile(save_results=False)
+    or run the module from the command line, optionally
+    selecting the stages to run using --from and --until
     """
 
+    @staticmethod
+    def get_user_ids() -> IdDictionary:
+        """
+        Open the persistent dictionary of user_ids shared
+        with the recommender
+        :return: id dictionary object
+        """
+        return IdDictionary(path=USER_IDS_PATH)
+
+    @staticmethod
+    def get_post_ids() -> IdDictionary:
+        """
+        Open the persistent dictionary of post_ids shared
+        with the content profile and the recommender
+        :return: id dictionary object
+        """
+        return IdDictionary(path=POST_IDS_PATH)
+
     @staticmethod
     def get_user_info():
         """
         Create instance to prepare user information
-        attributes
+        attributes, keyed by the user_id codes
         :return: user_info object
         """
         return FetchUserInfoAttributes(
-            data_path=os.getcwd() +
-            "/../data/complete_user_info.pkl"
+            data_path=USER_INFO_PATH,
+            user_ids=userProfile.get_user_ids()
         )
 
     @staticmethod
     def get_user_interaction():
         """
         Create instance to prepare user interaction
-        attributes
+        attributes, keyed by the user_id and post_id codes
         :return: user_interactions object
         """
         return FetchInteractionAttributes(
-            interaction_path=os.getcwd() +
-            "/../data/raw/user_post_interaction.json",
-
-            content_path=os.getcwd() +
-            "/../content/intermediates/all_cluster_labels.pkl"
+            interaction_path=USER_INTERACTION_PATH,
+            content_path=CONTENT_CLUSTERS_PATH,
+            user_ids=userProfile.get_user_ids(),
+            post_ids=userProfile.get_post_ids()
         )
 
     @staticmethod
@@ -50,21 +89,227 @@ class userProfile:
     ):
         """
         Create instance to consolidate all user_info,
-        user interaction and content info attributes
+        user interaction and content info attributes.
+        The users are partitioned into shards prepared in
+        parallel worker processes
         :return: user feature set object
         """
-        return PrepareUserFeatureSet(
+        return PartitionedUserFeatureSet(
             interaction_data=user_interaction.interaction_data,
             content_data=user_interaction.content_data,
             user_info=user_info.data,
-            clusters=read_pickle(
-                os.getcwd() +
-                "/../content/intermediates/all_cluster_labels.pkl")
+            clusters=Artifacts.load_table(
+                path=CONTENT_CLUSTERS_PATH,
+                columns=[POST_ID, CLUSTER])
+        )
+
+    @staticmethod
+    def prepare_user_info():
+        """
+        Prepare the user information attributes
+        :return: None, saves the results in directory
+        """
+        user_info = userProfile.get_user_info()
+        user_info.controller()
+        Artifacts.save_table(
+            data=user_info.data,
+            path="intermediates/user_info.parquet")
+
+    @staticmethod
+    def prepare_user_interaction():
+        """
+        Prepare the user interaction and content
+        information attributes, along with the watermark
+        of the interaction events they were prepared from
+        :return: None, saves the results in directory
+        """
+        user_interaction = userProfile.get_user_interaction()
+        user_interaction.controller()
+        Artifacts.save_table(
+            data=user_interaction.interaction_data,
+            path="intermediates/user_interaction.parquet")
+        Artifacts.save_table(
+            data=user_interaction.content_data,
+            path="intermediates/content_info.parquet")
+        InteractionWatermark(path=USER_PREPARED_WATERMARK_PATH).save(
+            events=user_interaction.events,
+            last_event=user_interaction.last_event,
+            rows=len(user_interaction.interaction_data))
+
+    @staticmethod
+    def prepare_feature_set():
+        """
+        Consolidate the saved user information, user
+        interaction and content information attributes
+        into a single user profile. The users are partitioned
+        into shards prepared in parallel worker processes
+        :return: None, saves the results in directory
+        """
+        user_features = PartitionedUserFeatureSet(
+            interaction_data=Artifacts.load_table(
+                path="intermediates/user_interaction.parquet"),
+            content_data=Artifacts.load_table(
+                path="intermediates/content_info.parquet"),
+            user_info=Artifacts.load_table(
+                path="intermediates/user_info.parquet"),
+            clusters=Artifacts.load_table(
+                path=CONTENT_CLUSTERS_PATH,
+                columns=[POST_ID, CLUSTER])
+        )
+        Artifacts.save_table(
+            data=user_features.controller(),
+            path="intermediates/input_features.parquet")
+
+    @staticmethod
+    def update_profile():
+        """
+        Incrementally update the user profile. Only the
+        interaction events appended to the interaction log since
+        the watermark of the previous run are processed. The
+        attributes and target labels of the users having new
+        interactions are prepared again from all their
+        interactions, and replace their records in the saved
+        profile. The watermark is moved past the processed events
+        once all the results are saved, so that running the update
+        again without new events leaves the profile unchanged, and
+        an update failing before completion is entirely run again.
+        Since the user information and the content information
+        attributes are not prepared again, changes of the user
+        languages or of the content profile are only taken into
+        account by the next complete run. If the interaction log
+        has been rewritten, the complete profile is rebuilt
+        :return: None, the results are saved in directory
+        """
+        interaction_watermark = InteractionWatermark(
+            path=USER_WATERMARK_PATH)
+        events, count, last_event = interaction_watermark.diff(
+            data_path=USER_INTERACTION_PATH)
+        if events is None:
+            userProfile.get_pipeline().run(force=True)
+            return
+        if not events:
+            return
+
+        # Preparing the new interactions only, the content
+        # information attributes are already saved
+        user_interaction = FetchInteractionAttributes(
+            interaction_path=USER_INTERACTION_PATH,
+            content_path=CONTENT_CLUSTERS_PATH,
+            user_ids=userProfile.get_user_ids(),
+            post_ids=userProfile.get_post_ids(),
+            records=events
+        )
+        user_interaction.prepare_interaction_data()
+        interaction_data = Artifacts.load_table(
+            path="intermediates/user_interaction.parquet")
+        # Dropping the records appended by an update which
+        # failed before moving the watermark
+        if interaction_watermark.rows is not None:
+            interaction_data = interaction_data.iloc[
+                :interaction_watermark.rows]
+        interaction_data = concat(
+            [interaction_data, user_interaction.interaction_data],
+            axis=0).reset_index(drop=True)
+
+        # Preparing the profile of the affected users
+        # from all of their interactions
+        users = user_interaction.interaction_data[USER_ID].unique()
+        user_info = Artifacts.load_table(
+            path="intermediates/user_info.parquet")
+        user_features = PrepareUserFeatureSet(
+            interaction_data=interaction_data[
+                interaction_data[USER_ID].isin(users)],
+            content_data=Artifacts.load_table(
+                path="intermediates/content_info.parquet"),
+            user_info=user_info[user_info[USER_ID].isin(users)],
+            clusters=Artifacts.load_table(
+                path=CONTENT_CLUSTERS_PATH,
+                columns=[POST_ID, CLUSTER])
+        )
+        input_features = Artifacts.load_table(
+            path="intermediates/input_features.parquet")
+        input_features = concat(
+            [input_features[~input_features[USER_ID].isin(users)],
+             user_features.controller()],
+            axis=0).sort_values(by=USER_ID).reset_index(drop=True)
+
+        Artifacts.save_table(
+            data=input_features,
+            path="intermediates/input_features.parquet")
+        Artifacts.save_table(
+            data=interaction_data,
+            path="intermediates/user_interaction.parquet")
+        interaction_watermark.save(events=count, last_event=last_event,
+                                   rows=len(interaction_data))
+
+    @staticmethod
+    def save_watermark():
+        """
+        Save the watermark of the interaction events included
+        in the profile, used by the incremental profile updates.
+        The watermark is the one of the events read when preparing
+        the user interaction attributes, events appended since
+        then being left to the next update
+        :return: None, saves the results in directory
+        """
+        prepared_watermark = InteractionWatermark(
+            path=USER_PREPARED_WATERMARK_PATH)
+        InteractionWatermark(path=USER_WATERMARK_PATH).save(
+            events=prepared_watermark.events,
+            last_event=prepared_watermark.last_event,
+            rows=prepared_watermark.rows)
+
+    @staticmethod
+    def get_pipeline() -> PipelineRunner:
+        """
+        Declare the user profile creation stages along with
+        the files they read and write. The user information and
+        user interaction attributes are prepared concurrently
+        :return: pipeline runner object
+        """
+        return PipelineRunner(
+            stages=[
+                Stage(name="prepare_user_info",
+                      function=userProfile.prepare_user_info,
+                      inputs=[USER_INFO_PATH],
+                      outputs=["intermediates/user_info.parquet"],
+                      code=[userProfile.get_user_info,
+                            fetch_info_attributes, id_dictionary]),
+                Stage(name="prepare_user_interaction",
+                      function=userProfile.prepare_user_interaction,
+                      inputs=[USER_INTERACTION_PATH,
+                              CONTENT_CLUSTERS_PATH],
+                      outputs=["intermediates/user_interaction.parquet",
+                               "intermediates/content_info.parquet",
+                               USER_PREPARED_WATERMARK_PATH],
+                      code=[userProfile.get_user_interaction,
+                            fetch_interaction_attributes, id_dictionary,
+                            watermark]),
+                Stage(name="prepare_feature_set",
+                      function=userProfile.prepare_feature_set,
+                      inputs=["intermediates/user_info.parquet",
+                              "intermediates/user_interaction.parquet",
+                              "intermediates/content_info.parquet",
+                              CONTENT_CLUSTERS_PATH],
+                      outputs=["intermediates/input_features.parquet"],
+                      code=[prepare_feature_set, partitioned_feature_set]),
+                Stage(name="save_watermark",
+                      function=userProfile.save_watermark,
+                      inputs=[USER_PREPARED_WATERMARK_PATH,
+                              "intermediates/input_features.parquet"],
+                      outputs=[USER_WATERMARK_PATH],
+                      code=[watermark]),
+            ],
+            state_path="intermediates/pipeline_state.json"
         )
 
     @staticmethod
     def create_profile(
-            save_results: bool = True
+            save_results: bool = True,
+            start: str = None,
+            until: str = None,
+            force: bool = False,
+            incremental: bool = False
     ) -> DataFrame:
         """
         Driver function to create user profile attributes to
@@ -76,11 +321,31 @@ class userProfile:
         posts_id viewed by every user
         3) Content Info: attributes particular to contents,
         including the obtained clustering results
+        When the results are stored, the stages whose outputs
+        are up to date are skipped.
         :param save_results: Boolean Indicator to check whether
         to store results or not
+        :param start: name of the first stage to run
+        :param until: name of the last stage to run
+        :param force: boolean indicator. If True, the selected
+        stages run even if they are up to date
+        :param incremental: boolean indicator. If True and a
+        previous run saved its results, only the new interaction
+        events are processed, else the complete profile is rebuilt
         :return: The consolidated user profile dataframe
         object pandas
         """
+        if save_results and incremental and \
+                os.path.exists(USER_WATERMARK_PATH):
+            userProfile.update_profile()
+            return Artifacts.load_table(
+                path="intermediates/input_features.parquet")
+
+        if save_results:
+            userProfile.get_pipeline().run(
+                start=start, until=until, force=force)
+            return Artifacts.load_table(
+                path="intermediates/input_features.parquet")
 
         #preparing the User Info attributes
         user_info = userProfile.get_user_info()
@@ -96,13 +361,35 @@ class userProfile:
             user_info=user_info,
             user_interaction=user_interaction
         )
-        user_profile = user_features.controller()
+        return user_features.controller()
 
-        if save_results:
-            user_profile.to_pickle(
-                "intermediates/input_features.pkl")
-            user_interaction.interaction_data.to_pickle(
-                "intermediates/user_interaction.pkl"
-            )
 
-        return user_profile
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(
+        description="Create the user profile")
+    parser.add_argument("--from", dest="start",
+                        help="name of the first stage to run")
+    parser.add_argument("--until",
+                        help="name of the last stage to run")
+    parser.add_argument("--force", action="store_true",
+                        help="run the stages even if up to date")
+    parser.add_argument("--report",
+                        help="path to the JSON run report, by default "
+                             "intermediates/run_report.json")
+    parser.add_argument("--profile", action="store_true",
+                        help="sample the call stacks during the run")
+    parser.add_argument("--incremental", action="store_true",
+                        help="only process new interaction events")
+    arguments = parser.parse_args()
+    report_path = os.path.abspath(arguments.report) \
+        if arguments.report else "intermediates/run_report.json"
+
+    # All the paths are relative to the user directory
+    os.chdir(os.path.dirname(os.path.abspath(__file__)))
+    with RunReport(name="user_profile", path=report_path,
+                   profile=arguments.profile):
+        userProfile.create_profile(
+            start=arguments.start,
+            until=arguments.until,
+            force=arguments.force,
+            incremental=arguments.incremental)
@@ -0,0 +1,205 @@
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+from math import ceil
+from numpy import ndarray, vstack
+from pandas import DataFrame, Series, concat
+from pandas.util import hash_pandas_object
+from scipy.sparse import csr_matrix
+from FeedRecommender.common.config import USER_PROFILE_SHARDS, \
+    USER_SHARD_MAX_INTERACTIONS, USER_PROFILE_PROCESSES
+from FeedRecommender.common.constants import USER_ID, CLUSTER
+from FeedRecommender.common.instrumentation import RunReport
+from FeedRecommender.user.prepare_feature_set import PrepareUserFeatureSet
+
+
+class PartitionedUserFeatureSet:
+    """
+    Sharded counterpart of PrepareUserFeatureSet. The users are
+    hash-partitioned into shards, and every shard is prepared in
+    a worker process seeing only the interactions and information
+    of its users. The content attributes and cluster labels are
+    handed over once to every worker when it starts, where the
+    processes are forked they are shared read-only with the parent
+    process instead of being copied. The number of shards grows
+    with the number of interactions, so that the memory required
+    per worker is bounded, and the shards run in parallel. A shard
+    is only sliced from the interactions once a worker is free to
+    prepare it, so that the parent process does not hold a second
+    copy of all the interactions.
+    The result is the same as the one of PrepareUserFeatureSet.
+    """
+
+    shared = {}
+
+    def __init__(
+            self,
+            interaction_data: DataFrame,
+            content_data: DataFrame,
+            user_info: DataFrame,
+            clusters: DataFrame,
+            shards: int = USER_PROFILE_SHARDS,
+            max_interactions: int = USER_SHARD_MAX_INTERACTIONS,
+            max_processes: int = USER_PROFILE_PROCESSES
+    ):
+        """
+        Initializing the data members
+        :param interaction_data: user content interaction
+        dataframe object pandas
+        :param content_data: content information dataframe
+        object pandas
+        :param user_info: user information dataframe
+        object pandas
+        :param clusters: content cluster labels dataframe
+        object pandas
+        :param shards: minimum number of shards
+        :param max_interactions: maximum average number of
+        interactions per shard, bounding the memory per worker
+        :param max_processes: maximum number of worker processes
+        """
+        self.interaction_data = interaction_data
+        self.content_data = content_data
+        self.user_info = user_info
+        self.clusters = clusters
+        self.shards = shards
+        self.max_interactions = max_interactions
+        self.max_processes = max_processes
+        self.Y = None
+
+    def get_shard_count(self) -> int:
+        """
+        Compute the number of shards
+        :return: number of shards
+        """
+        return max(self.shards, 1, ceil(
+            len(self.interaction_data) / self.max_interactions))
+
+    @staticmethod
+    def get_partitions(
+            users: Series,
+            shards: int
+    ) -> ndarray:
+        """
+        Hash-partition the records of users into shards
+        :param users: user_id attribute of the records
+        :param shards: number of shards
+        :return: array of the shard of every record
+        """
+        return (hash_pandas_object(users, index=False).values %
+                shards).astype(int)
+
+    @staticmethod
+    def initialize(
+            content_data: DataFrame,
+            content_matrix: csr_matrix,
+            clusters: DataFrame
+    ):
+        """
+        Keep the data shared by all the shards in the class,
+        once per worker process
+        :param content_data: content information dataframe
+        object pandas
+        :param content_matrix: sparse matrix of the
+        content attributes
+        :param clusters: content cluster labels dataframe
+        object pandas
+        :return: None, updates the class
+        """
+        PartitionedUserFeatureSet.shared = {
+            "content_data": content_data,
+            "content_matrix": content_matrix,
+            "clusters": clusters
+        }
+
+    @staticmethod
+    def prepare_shard(
+            name: str,
+            interaction_data: DataFrame,
+            user_info: DataFrame
+    ) -> tuple:
+        """
+        Prepare the attributes and target labels of the
+        users of a shard in a worker process, and measure it
+        :param name: name of the shard
+        :param interaction_data: interactions of the users
+        of the shard
+        :param user_info: user information of the users
+        of the shard
+        :return: tuple of the dataframe of the shard without the
+        target attribute, the matrix of its encoded labels and
+        the records measured
+        """
+        with RunReport(name=name) as report:
+            user_features = PrepareUserFeatureSet(
+                interaction_data=interaction_data,
+                user_info=user_info,
+                **PartitionedUserFeatureSet.shared)
+            X = user_features.controller()
+        # The target attribute is rebuilt from the encoded
+        # labels, which are much cheaper to hand over
+        return X.drop(columns=[CLUSTER]), user_features.Y, \
+            [report.summary] + report.records
+
+    @RunReport.instrument
+    def controller(self) -> DataFrame:
+        """
+        Driver function to create the input data attributes and
+        target attribute of every shard, and concatenate them.
+        A single shard is prepared in the calling process.
+        The encoded labels are also kept as the uint8 matrix
+        data member Y, aligned to the records of the result
+        :return: dataframe object pandas
+        """
+        RunReport.set_rows(rows_in=len(self.interaction_data))
+        content_matrix = PrepareUserFeatureSet.get_content_matrix(
+            content_data=self.content_data)
+        shards = self.get_shard_count()
+        if shards == 1:
+            user_features = PrepareUserFeatureSet(
+                interaction_data=self.interaction_data,
+                content_data=self.content_data,
+                user_info=self.user_info,
+                clusters=self.clusters,
+                content_matrix=content_matrix)
+            X = user_features.controller()
+            self.Y = user_features.Y
+            return X
+
+        interaction_shards = self.get_partitions(
+            users=self.interaction_data[USER_ID], shards=shards)
+        user_shards = self.get_partitions(
+            users=self.user_info[USER_ID], shards=shards)
+        workers = min(self.max_processes, shards)
+        results = [None] * shards
+        with ProcessPoolExecutor(
+                max_workers=workers,
+                initializer=PartitionedUserFeatureSet.initialize,
+                initargs=(self.content_data, content_matrix,
+                          self.clusters)) as executor:
+            # Submitting at most one shard per worker at a time
+            pending = {}
+            for shard in range(shards):
+                if len(pending) == workers:
+                    done, _ = wait(pending, return_when=FIRST_COMPLETED)
+                    for future in done:
+                        results[pending.pop(future)] = future.result()
+                pending[executor.submit(
+                    PartitionedUserFeatureSet.prepare_shard,
+                    "user_shard_{}".format(shard),
+                    self.interaction_data[interaction_shards == shard],
+                    self.user_info[user_shards == shard])] = shard
+            for future, shard in pending.items():
+                results[shard] = future.result()
+
+        if RunReport.active is not None:
+            for _, _, records in results:
+                RunReport.active.extend(
+                    records=records,
+                    parent="PartitionedUserFeatureSet.controller")
+
+        # Sorting the records of all the shards by user_id, which
+        # is the order of the records of PrepareUserFeatureSet
+        X = concat([X for X, _, _ in results], axis=0)
+        order = X[USER_ID].values.argsort(kind="stable")
+        self.Y = vstack([Y for _, Y, _ in results])[order]
+        X = X.iloc[order].reset_index(drop=True)
+        X[CLUSTER] = self.Y.tolist()
+        return X
@@ -1,8 +1,10 @@
-from pandas import DataFrame, merge, set_option
+from pandas import DataFrame, Index, merge, set_option, factorize
+from FeedRecommender.common.binarize import GroupBinarizer
 from FeedRecommender.common.config import CONTENT_CLUSTER_COUNT
 from FeedRecommender.common.constants import POST_ID, CLUSTER, REACTIONS, USER_ID
-from numpy import asarray, zeros, arange
-from tqdm import tqdm
+from FeedRecommender.common.instrumentation import RunReport
+from numpy import zeros, int64, uint8, ndarray, concatenate
+from scipy.sparse import csr_matrix, hstack
 set_option("display.max_columns", None)
 
 class PrepareUserFeatureSet:
@@ -12,7 +14,8 @@ class PrepareUserFeatureSet:
             interaction_data: DataFrame,
             content_data: DataFrame,
             user_info: DataFrame,
-            clusters: DataFrame
+            clusters: DataFrame,
+            content_matrix: csr_matrix = None
     ):
         """
         Initializing the data members
@@ -24,102 +27,141 @@ class PrepareUserFeatureSet:
         object pandas
         :param clusters: content cluster labels dataframe
         object pandas
+        :param content_matrix: optional sparse matrix of the
+        content attributes, with one row per record of the content
+        data. If None, it is built from the content data
         """
         self.interaction_data = interaction_data
         self.content_data = content_data
         self.user_info = user_info
         self.clusters = clusters[[POST_ID, CLUSTER]]
+        self.content_matrix = content_matrix
+        self.Y = None
 
     def get_index_encoded_vector(
             self,
-            df: DataFrame
-    ) -> list:
+            user_codes: ndarray,
+            cluster_codes: ndarray,
+            n_users: int
+    ) -> ndarray:
         """
-        Convert the cluster labels from a list of cluster
-        labels to a target variable format suitable for input
-        to multi-label classification model. The updated format
-        consists of a fixed length vector of K (number of clusters)
-        elements with value set to one for every value
-        in the original list
-        :param df: dataframe object pandas
-        :return: list of encoded labels
+        Convert the cluster labels of every interaction to a
+        target variable format suitable for input to multi-label
+        classification model. The updated format consists of a
+        fixed length vector of K (number of clusters) elements
+        per user, with value set to one for every cluster of the
+        contents the user interacted with. All the vectors are
+        set at once as a binary matrix
+        :param user_codes: array of the user row of every interaction
+        :param cluster_codes: array of the cluster of every interaction
+        :param n_users: number of users
+        :return: uint8 matrix of encoded labels, one row per user
         """
-        encoded_labels = []
-
-        for index in tqdm(range(len(df))):
-            clusters = asarray(df.loc[index, CLUSTER])
-            encoded_clusters = zeros(
-                (clusters.size, CONTENT_CLUSTER_COUNT)
-            )
-            encoded_clusters[arange(clusters.size), clusters] = 1
-
-            if len(encoded_clusters) == 1:
-                encoded_labels.append(encoded_clusters[0].tolist())
-                continue
-
-            encoded_vector = encoded_clusters.sum(axis=0).tolist()
-            encoded_vector = [1 if element > 0 else 0
-                              for element in encoded_vector]
-            encoded_labels.append(encoded_vector)
-
+        encoded_labels = zeros((n_users, CONTENT_CLUSTER_COUNT), dtype=uint8)
+        encoded_labels[user_codes, cluster_codes] = 1
         return encoded_labels
 
-    def prepare_Y(self) -> DataFrame:
+    def prepare_Y(self) -> tuple:
         """
         Prepare the target variable in appropriate
         multi-label classification format
-        :return: dataframe object pandas
+        :return: tuple of the index of the users having
+        interacted with clustered contents and the uint8
+        matrix of their encoded labels
         """
-        Y = merge(self.interaction_data,
+        Y = merge(self.interaction_data[[USER_ID, REACTIONS]],
                   self.clusters,
                   left_on=REACTIONS,
                   right_on=POST_ID)
-        Y = Y.groupby(USER_ID)[CLUSTER].apply(list).reset_index()
-        encoded_labels = self.get_index_encoded_vector(df=Y)
-        Y[CLUSTER] = encoded_labels
-        return Y
+        user_codes, users = factorize(Y[USER_ID])
+        encoded_labels = self.get_index_encoded_vector(
+            user_codes=user_codes,
+            cluster_codes=Y[CLUSTER].to_numpy(dtype=int64),
+            n_users=len(users))
+        return Index(users), encoded_labels
+
+    @staticmethod
+    def get_content_matrix(content_data: DataFrame) -> csr_matrix:
+        """
+        Convert the content attributes to a sparse matrix,
+        one attribute at a time so that no dense copy of
+        the content attributes is made
+        :param content_data: content information dataframe
+        object pandas
+        :return: sparse matrix with one row per content
+        and one column per attribute
+        """
+        attributes = content_data.columns.drop(POST_ID)
+        if attributes.empty:
+            return csr_matrix((len(content_data), 0), dtype=uint8)
+        return hstack(
+            [csr_matrix((content_data[attribute].to_numpy() > 0)[:, None],
+                        dtype=uint8)
+             for attribute in attributes],
+            format="csr", dtype=uint8)
 
     def prepare_X(self) -> DataFrame:
         """
-        Prepare the independent attribute set by merging
-        and aggregating user information and content
-        information attributes
+        Prepare the independent attribute set by aggregating
+        user information and content information attributes.
+        The content attributes of a user are aggregated from the
+        sparse content attributes of the contents the user
+        interacted with, so that the time and memory required
+        grow with the number of interactions rather than with
+        the number of interactions times attributes. All the
+        attributes are binary valued and stored as uint8
         :return: dataframe object pandas
         """
-        X = merge(self.user_info,
-                  self.interaction_data,
-                  on=USER_ID, how="left")
-        X = merge(X,
-                  self.content_data,
-                  left_on=REACTIONS,
-                  right_on=POST_ID, how="left")
+        user_codes, users = factorize(self.user_info[USER_ID], sort=True)
+        languages = self.user_info.columns.drop(USER_ID)
+        attributes = self.content_data.columns.drop(POST_ID)
 
-        X = X.fillna(0)
-        X.drop(columns=[POST_ID, REACTIONS], inplace=True)
-        X = X.groupby(USER_ID).sum().reset_index()
+        # User information aggregated per user
+        user_info = GroupBinarizer.transform(
+            codes=user_codes,
+            values=self.user_info[languages].to_numpy(),
+            n_groups=len(users))
 
-        attributes = X.columns.tolist()
-        attributes.remove(USER_ID)
-        for attribute in attributes:
-            X[attribute].values[X[attribute].values > 0] = 1
+        # Content information aggregated over the interactions
+        # of every user, interactions with unknown users or
+        # contents are ignored
+        if self.content_matrix is None:
+            self.content_matrix = self.get_content_matrix(
+                content_data=self.content_data)
+        posts = Index(self.content_data[POST_ID])
+        interaction_users = users.get_indexer(self.interaction_data[USER_ID])
+        interaction_posts = posts.get_indexer(self.interaction_data[REACTIONS])
+        known = (interaction_users >= 0) & (interaction_posts >= 0)
+        content_info = GroupBinarizer.transform(
+            codes=interaction_users[known],
+            values=self.content_matrix[interaction_posts[known]],
+            n_groups=len(users))
 
+        X = DataFrame(concatenate([user_info, content_info], axis=1),
+                      columns=languages.append(attributes))
+        X.insert(0, USER_ID, users)
         return X
 
+    @RunReport.instrument
     def controller(self) -> DataFrame:
         """
         Driver function to create input data attributes
         and target attribute for the downstream task
-        of multi-label classification
+        of multi-label classification. The encoded labels are
+        also kept as the uint8 matrix data member Y, aligned
+        to the records of the result
         :return: dataframe object pandas
         """
+        RunReport.set_rows(rows_in=len(self.interaction_data))
         X = self.prepare_X()
-        Y = self.prepare_Y()
-        print(X.shape)
-        print(Y.shape)
-        merged = merge(X, Y,
-                       on=USER_ID, how="left")
-        merged = merged.fillna(-1)
-        merged[CLUSTER] = [[0] * CONTENT_CLUSTER_COUNT
-                           if vector == -1 else vector
-                           for vector in merged[CLUSTER]]
-        return merged
+        users, Y = self.prepare_Y()
+
+        # Aligning the encoded labels to the users of the
+        # attribute set, users without interactions with
+        # clustered contents have no label set
+        positions = users.get_indexer(X[USER_ID])
+        self.Y = zeros((len(X), CONTENT_CLUSTER_COUNT), dtype=uint8)
+        self.Y[positions >= 0] = Y[positions[positions >= 0]]
+
+        X[CLUSTER] = self.Y.tolist()
+        return X
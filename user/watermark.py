@@ -0,0 +1,103 @@
+import json
+import os
+from hashlib import blake2b
+from FeedRecommender.common.json_stream import JsonArrayReader
+
+
+class InteractionWatermark:
+    """
+    Watermark of the user-content interaction events included
+    in the user profile. The interaction log is append-only, so
+    the watermark records the number of events processed along
+    with a hash of the last processed event. The events past the
+    watermark are the new batch of events to process. If the
+    last processed event is no longer found at its position, the
+    log has been rewritten and the complete profile is rebuilt.
+    The watermark also records the number of prepared interaction
+    records of the processed events, the records past it having
+    been appended by an update which failed before completion.
+    """
+
+    def __init__(
+            self,
+            path: str
+    ):
+        """
+        Load the watermark saved in directory, if any
+        :param path: string valued path to watermark file
+        """
+        self.path = path
+        self.events = 0
+        self.last_event = None
+        self.rows = None
+        if os.path.exists(path):
+            with open(path) as json_file:
+                watermark = json.load(json_file)
+            self.events = watermark["events"]
+            self.last_event = watermark["last_event"]
+            self.rows = watermark.get("rows")
+
+    @staticmethod
+    def get_event_hash(record: dict) -> str:
+        """
+        Compute the hash of a raw interaction event
+        :param record: decoded interaction record
+        :return: hexadecimal digest
+        """
+        return blake2b(
+            json.dumps(record, sort_keys=True).encode("utf-8"),
+            digest_size=16
+        ).hexdigest()
+
+    def diff(
+            self,
+            data_path: str
+    ) -> tuple:
+        """
+        Stream the interaction log and collect the events
+        past the watermark
+        :param data_path: string valued data path to file
+        :return: tuple of the list of new events, None if the
+        log has been rewritten, the updated number of events
+        and the hash of the updated last event
+        """
+        events = []
+        last_event = None
+        position = 0
+        for position, record in enumerate(
+                JsonArrayReader(data_path=data_path).iter_records(),
+                start=1):
+            if position == self.events:
+                last_event = self.get_event_hash(record=record)
+                if last_event != self.last_event:
+                    return None, position, last_event
+            elif position > self.events:
+                events.append(record)
+
+        if position < self.events:
+            return None, position, None
+        if events:
+            last_event = self.get_event_hash(record=events[-1])
+        return events, position, last_event or self.last_event
+
+    def save(
+            self,
+            events: int,
+            last_event: str,
+            rows: int = None
+    ):
+        """
+        Atomically replace the watermark
+        :param events: number of processed events
+        :param last_event: hash of the last processed event
+        :param rows: number of prepared interaction records
+        of the processed events
+        :return: None, the watermark is saved in directory
+        """
+        self.events = events
+        self.last_event = last_event
+        self.rows = rows
+        with open(self.path + ".tmp", "w") as json_file:
+            json.dump({"events": events, "last_event": last_event,
+                       "rows": rows}, json_file)
+        os.replace(self.path + ".tmp", self.path)